@@ -0,0 +1,59 @@
+# app/api/routers/jobs.py
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
+from sse_starlette.sse import EventSourceResponse
+from app.services import tutorial_service
+from app.services.jobs import get_job_manager
+from app.services.run_registry import RemoteRun, get_run_registry
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"])
+
+
+@router.post("/tutorial")
+async def submit_tutorial_job(request: Request):
+    """
+    Queues a tutorial generation and returns its job id right away.
+    Body: {"repo_url": str, "refresh": bool = false, "priority": int = 0 (higher runs first)}
+    """
+    body = await request.json()
+    repo_url = body.get("repo_url")
+    if not repo_url:
+        return JSONResponse(status_code=400, content={"error": "repo_url is required"})
+
+    job = tutorial_service.submit_tutorial_job(
+        repo_url,
+        refresh=bool(body.get("refresh", False)),
+        priority=int(body.get("priority", 0)),
+    )
+    return JSONResponse(status_code=202, content=job.to_dict())
+
+
+@router.get("")
+def list_jobs():
+    """Queued, running and recently finished jobs of this worker, newest first."""
+    manager = get_job_manager()
+    return {"stats": manager.stats(), "jobs": manager.list()}
+
+
+@router.get("/{job_id}")
+def get_job(job_id: str):
+    """Status and progress of one job (also jobs run by other worker processes)."""
+    job = get_job_manager().get(job_id)
+    if job is not None:
+        return job.to_dict()
+    info = get_run_registry().run_info(job_id)
+    if info is None:
+        return JSONResponse(status_code=404, content={"error": f"Job '{job_id}' not found"})
+    return info
+
+
+@router.get("/{job_id}/events")
+async def stream_job(job_id: str):
+    """SSE stream of the job's log lines and profile events (replayed from the start)."""
+    job = get_job_manager().get(job_id)
+    if job is None:
+        registry = get_run_registry()
+        if registry.run_info(job_id) is None:
+            return JSONResponse(status_code=404, content={"error": f"Job '{job_id}' not found"})
+        job = RemoteRun(registry, job_id)  # Owned by another worker: follow it through the registry
+    return EventSourceResponse(tutorial_service.stream_job_events(job))
@@ -1,20 +1,33 @@
 from fastapi import APIRouter, Body
 from pydantic import BaseModel
-from app.services.query_service import answer_query
+from sse_starlette.sse import EventSourceResponse
+from app.services.query_service import answer_query, stream_answer
 router = APIRouter(prefix="/query", tags=["Query"])
 
 class QueryRequest(BaseModel):
     question: str
-    repo_url: str 
+    repo_url: str
 
 
 @router.post("/getanswer")
-def query_llm(request: QueryRequest):
+async def query_llm(request: QueryRequest):
     """
     Answers a question based on the knowledge base of a specific repository.
     """
-    answer = answer_query(
+    answer = await answer_query(
         user_query=request.question,
         repo_url=request.repo_url
     )
     return {"question": request.question, "answer": answer}
+
+
+@router.post("/stream")
+async def query_llm_stream(request: QueryRequest):
+    """
+    Streaming variant of /getanswer (Server-Sent Events): retrieval results are sent
+    immediately, then the answer tokens as the model generates them.
+    """
+    return EventSourceResponse(stream_answer(
+        user_query=request.question,
+        repo_url=request.repo_url
+    ))
@@ -13,7 +13,11 @@ async def generate_tutorial_stream(request: Request):
     if not repo_url:
         return {"error": "repo_url is required"}
 
-    return EventSourceResponse(tutorial_service.run_pipeline_streaming(repo_url))
+    # "refresh": true updates an existing tutorial incrementally instead of returning it as-is
+    refresh = bool(body.get("refresh", False))
+    # Generation runs as a background job (see /jobs); this stream follows it
+    priority = int(body.get("priority", 0))
+    return EventSourceResponse(tutorial_service.run_pipeline_streaming(repo_url, refresh=refresh, priority=priority))
 
 @router.post("/get-tutorial")
 async def get_existing_tutorial(request: Request):
@@ -0,0 +1,134 @@
+# app/config.py
+"""
+Central place for environment-driven settings.
+Every value can be overridden through the environment (or the .env file).
+"""
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _get_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _get_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _get_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value not in (None, "") else default
+
+
+# --- LLM ---
+LLM_MODEL = os.getenv("LLM_MODEL", "o1")
+LLM_REASONING_EFFORT = os.getenv("LLM_REASONING_EFFORT", "medium")
+
+# --- LLM response cache ---
+LLM_CACHE_ENABLED = _get_bool("LLM_CACHE_ENABLED", True)
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(".cache", "llm_cache.sqlite3"))
+LLM_CACHE_MAX_ENTRIES = _get_int("LLM_CACHE_MAX_ENTRIES", 50_000)
+LLM_CACHE_MAX_BYTES = _get_int("LLM_CACHE_MAX_BYTES", 512 * 1024 * 1024)  # 512 MB
+LLM_CACHE_TTL_SECONDS = _get_float("LLM_CACHE_TTL_SECONDS", 30 * 24 * 3600)  # 30 days, 0 disables expiry
+
+# --- OpenAI HTTP clients (shared, long-lived) ---
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None  # None -> official endpoint
+OPENAI_MAX_CONNECTIONS = _get_int("OPENAI_MAX_CONNECTIONS", 100)
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = _get_int("OPENAI_MAX_KEEPALIVE_CONNECTIONS", 20)
+OPENAI_KEEPALIVE_EXPIRY = _get_float("OPENAI_KEEPALIVE_EXPIRY", 60.0)
+OPENAI_TIMEOUT = _get_float("OPENAI_TIMEOUT", 600.0)  # reasoning models can take minutes
+OPENAI_CONNECT_TIMEOUT = _get_float("OPENAI_CONNECT_TIMEOUT", 10.0)
+OPENAI_MAX_RETRIES = _get_int("OPENAI_MAX_RETRIES", 2)
+
+# --- Embeddings ---
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+# Query embeddings (the questions asked against a repository) are cached: an in-process LRU in front of a
+# SQLite store shared by all worker processes, keyed by model + normalized question text
+QUERY_EMBEDDING_CACHE_ENABLED = _get_bool("QUERY_EMBEDDING_CACHE_ENABLED", True)
+QUERY_EMBEDDING_CACHE_PATH = os.getenv("QUERY_EMBEDDING_CACHE_PATH", os.path.join(".cache", "query_embeddings.sqlite3"))
+QUERY_EMBEDDING_CACHE_MEMORY_ENTRIES = _get_int("QUERY_EMBEDDING_CACHE_MEMORY_ENTRIES", 2_000)
+QUERY_EMBEDDING_CACHE_MAX_ENTRIES = _get_int("QUERY_EMBEDDING_CACHE_MAX_ENTRIES", 20_000)
+QUERY_EMBEDDING_CACHE_MAX_BYTES = _get_int("QUERY_EMBEDDING_CACHE_MAX_BYTES", 256 * 1024 * 1024)  # 256 MB
+# Chunk embeddings, keyed by model + exact chunk text: re-indexing a repository (or a rebuilt vector store)
+# only sends chunks whose text was never embedded before
+DOCUMENT_EMBEDDING_CACHE_ENABLED = _get_bool("DOCUMENT_EMBEDDING_CACHE_ENABLED", True)
+DOCUMENT_EMBEDDING_CACHE_PATH = os.getenv("DOCUMENT_EMBEDDING_CACHE_PATH", os.path.join(".cache", "document_embeddings.sqlite3"))
+DOCUMENT_EMBEDDING_CACHE_MAX_ENTRIES = _get_int("DOCUMENT_EMBEDDING_CACHE_MAX_ENTRIES", 500_000)
+DOCUMENT_EMBEDDING_CACHE_MAX_BYTES = _get_int("DOCUMENT_EMBEDDING_CACHE_MAX_BYTES", 4 * 1024 * 1024 * 1024)  # 4 GB
+# Indexing: chunks per embeddings request, and requests in flight per indexing pass (code / chapters)
+EMBEDDING_BATCH_SIZE = _get_int("EMBEDDING_BATCH_SIZE", 256)
+EMBEDDING_CONCURRENCY = _get_int("EMBEDDING_CONCURRENCY", 4)
+
+# --- Vector stores (queries) ---
+VECTOR_STORE_MAX_OPEN = _get_int("VECTOR_STORE_MAX_OPEN", 16)  # Repositories whose store stays open between queries
+VECTOR_STORE_IDLE_SECONDS = _get_float("VECTOR_STORE_IDLE_SECONDS", 600.0)  # Unused stores are closed after this
+# "hybrid": vector search + BM25 over the same chunks (exact identifiers, config keys), merged by
+# reciprocal rank fusion; "vector": dense search only
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid").strip().lower()
+RETRIEVAL_CANDIDATES = _get_int("RETRIEVAL_CANDIDATES", 20)  # Results taken from each search before fusion
+# Rank constant of the fusion: lower favours each search's top hits (the candidate lists are short)
+RETRIEVAL_RRF_K = _get_float("RETRIEVAL_RRF_K", 10.0)
+# Weight of the BM25 ranking (vector: 1) when the question names a code identifier (`quoted`, snake_case, camelCase)
+RETRIEVAL_IDENTIFIER_LEXICAL_WEIGHT = _get_float("RETRIEVAL_IDENTIFIER_LEXICAL_WEIGHT", 2.0)
+# BM25 hits scoring below this share of the best hit's score are left out of the fusion
+RETRIEVAL_LEXICAL_MIN_SCORE_RATIO = _get_float("RETRIEVAL_LEXICAL_MIN_SCORE_RATIO", 0.3)
+
+# --- LLM scheduling (process-wide budgets shared by every tutorial run and query) ---
+LLM_REQUESTS_PER_MINUTE = _get_float("LLM_REQUESTS_PER_MINUTE", 500)
+LLM_TOKENS_PER_MINUTE = _get_float("LLM_TOKENS_PER_MINUTE", 800_000)
+LLM_MAX_CONCURRENCY = _get_int("LLM_MAX_CONCURRENCY", 16)
+LLM_EXPECTED_OUTPUT_TOKENS = _get_int("LLM_EXPECTED_OUTPUT_TOKENS", 4_000)  # reserved per call until usage is known
+LLM_RATE_LIMIT_RETRIES = _get_int("LLM_RATE_LIMIT_RETRIES", 3)
+LLM_RATE_LIMIT_BACKOFF = _get_float("LLM_RATE_LIMIT_BACKOFF", 10.0)  # seconds, when the API gives no Retry-After
+
+# --- Tutorial generation ---
+# Number of chapters written concurrently; 1 keeps the sequential mode where each chapter sees the previous ones.
+TUTORIAL_CHAPTER_CONCURRENCY = _get_int("TUTORIAL_CHAPTER_CONCURRENCY", 1)
+# Hard cap (estimated tokens) on the digest of earlier chapters included in each chapter prompt.
+TUTORIAL_PREVIOUS_CHAPTERS_TOKEN_BUDGET = _get_int("TUTORIAL_PREVIOUS_CHAPTERS_TOKEN_BUDGET", 2_000)
+# Above this many (estimated) tokens of file context, IdentifyAbstractions runs map-reduce over shards of
+# files instead of one prompt; keep it well below the model's context window.
+TUTORIAL_IDENTIFY_CONTEXT_TOKENS = _get_int("TUTORIAL_IDENTIFY_CONTEXT_TOKENS", 100_000)
+TUTORIAL_IDENTIFY_SHARD_CONCURRENCY = _get_int("TUTORIAL_IDENTIFY_SHARD_CONCURRENCY", 4)
+# "full" pastes whole files into the IdentifyAbstractions/AnalyzeRelationships prompts; "digest" uses a
+# compact per-file skeleton there instead (WriteChapters always gets the full source of its own files).
+TUTORIAL_FILE_CONTEXT = os.getenv("TUTORIAL_FILE_CONTEXT", "full").strip().lower()
+
+# --- File digests (cached by content hash) ---
+FILE_DIGEST_CACHE_PATH = os.getenv("FILE_DIGEST_CACHE_PATH", os.path.join(".cache", "file_digests.sqlite3"))
+FILE_DIGEST_CACHE_MAX_ENTRIES = _get_int("FILE_DIGEST_CACHE_MAX_ENTRIES", 200_000)
+FILE_DIGEST_MAX_CHARS = _get_int("FILE_DIGEST_MAX_CHARS", 3_000)
+
+# --- Background jobs (tutorial generation) ---
+JOB_MAX_CONCURRENCY = _get_int("JOB_MAX_CONCURRENCY", 2)  # Generations running at once per worker process; the rest queue
+JOB_HISTORY_SIZE = _get_int("JOB_HISTORY_SIZE", 100)  # Finished jobs kept for the status endpoints
+# "thread" runs flows on worker threads of the API process; "process" runs them in a pool of worker
+# processes, so CPU-heavy steps (chunking, YAML, prompt building) don't hold the API's GIL.
+# Either way the LLM_* rate limits and concurrency apply to all generations together.
+JOB_EXECUTION_MODE = os.getenv("JOB_EXECUTION_MODE", "thread").strip().lower()
+
+# --- Cross-worker run coordination (one generation per repo across all worker processes) ---
+RUN_REGISTRY_PATH = os.getenv("RUN_REGISTRY_PATH", os.path.join(".cache", "runs.sqlite3"))
+RUN_LEASE_TTL_SECONDS = _get_float("RUN_LEASE_TTL_SECONDS", 30.0)  # A crashed worker's runs can be taken over after this
+RUN_EVENTS_RING_SIZE = _get_int("RUN_EVENTS_RING_SIZE", 2_000)  # Events kept per run for replay to late subscribers
+RUN_HISTORY_SECONDS = _get_float("RUN_HISTORY_SECONDS", 24 * 3600)  # Finished runs are purged after this
+
+# --- GitHub crawling ---
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com").rstrip("/")  # GitHub Enterprise: https://<host>/api/v3
+# "tarball": one recursive tree listing + one streamed tarball download per repository;
+# "contents": one contents API call per directory + one GET per file (the original crawler)
+GITHUB_FETCH_MODE = os.getenv("GITHUB_FETCH_MODE", "tarball").strip().lower()
+GITHUB_DOWNLOAD_CONCURRENCY = _get_int("GITHUB_DOWNLOAD_CONCURRENCY", 8)  # Parallel file downloads in "contents" mode
+# Threads that stat/read the selected files of a local directory; >1 helps on network filesystems or
+# cold disks, not on page-cached local trees
+LOCAL_CRAWL_READ_WORKERS = _get_int("LOCAL_CRAWL_READ_WORKERS", 1)
+# Bare mirrors of SSH / .git repositories, reused across runs (fetch instead of a full clone); LRU-evicted
+# down to the quota. REPO_MIRROR_MAX_BYTES=0 disables the cache (temp-dir clone every run).
+REPO_MIRROR_DIR = os.getenv("REPO_MIRROR_DIR", os.path.join(".cache", "mirrors"))
+REPO_MIRROR_MAX_BYTES = _get_int("REPO_MIRROR_MAX_BYTES", 5 * 1024 * 1024 * 1024)  # 5 GB
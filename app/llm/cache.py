@@ -0,0 +1,299 @@
+# app/llm/cache.py
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+class PersistentCache:
+    """
+    Content-addressed key/value cache stored in a single SQLite file.
+
+    - Safe to share between threads and between gunicorn/uvicorn worker processes
+      (WAL journal, one connection per thread, busy timeout for writers).
+    - Bounded by entry count and total bytes; the least recently used entries are evicted first.
+      Entry count and bytes are kept in a one-row `totals` table (maintained by triggers, so every
+      process sees the same numbers); a write only evicts when they are over a limit, and then
+      drops the oldest entries in batches, via the accessed_at index, down to `low_water` of the limits.
+    - Entries older than `ttl_seconds` are treated as misses and purged.
+    - Values are stored as JSON, so anything json-serializable can be cached. The value is the
+      last column, so reading an entry's metadata never touches its (overflow) pages.
+    """
+
+    EVICT_BATCH = 500
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: int = 50_000,
+        max_bytes: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        evict_every: int = 100,
+        low_water: float = 0.9,
+    ):
+        self.path = os.path.abspath(path)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds if ttl_seconds and ttl_seconds > 0 else None
+        self.evict_every = max(1, evict_every)  # Writes between purges of expired entries
+        self.low_water = low_water
+
+        self._local = threading.local()
+        self._counter_lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._writes = 0
+        self._evictions = 0
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._transaction() as conn:  # Other processes may be creating (or migrating) it too
+            self._create_schema(conn)
+
+    ENTRIES_COLUMNS = ["key", "size", "created_at", "accessed_at", "value"]
+
+    def _create_schema(self, conn: sqlite3.Connection) -> None:
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(entries)")]
+        if columns and columns != self.ENTRIES_COLUMNS:
+            # Files from before the value moved to the last column: copied over once
+            conn.execute("DROP TABLE IF EXISTS totals")
+            conn.execute("ALTER TABLE entries RENAME TO entries_old")
+            conn.execute("DROP INDEX IF EXISTS idx_entries_accessed")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                value TEXT NOT NULL
+            )
+            """
+        )
+        if columns and columns != self.ENTRIES_COLUMNS:
+            conn.execute(
+                "INSERT INTO entries (key, size, created_at, accessed_at, value) "
+                "SELECT key, size, created_at, accessed_at, value FROM entries_old"
+            )
+            conn.execute("DROP TABLE entries_old")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries(accessed_at)")
+        if self.ttl_seconds:
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_created ON entries(created_at)")
+
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'totals'").fetchone()
+        if not exists:
+            conn.execute("CREATE TABLE totals (id INTEGER PRIMARY KEY CHECK (id = 0), entries INTEGER NOT NULL, bytes INTEGER NOT NULL)")
+            conn.execute("INSERT INTO totals (id, entries, bytes) SELECT 0, COUNT(*), COALESCE(SUM(size), 0) FROM entries")
+        triggers = {
+            "entries_insert": "AFTER INSERT ON entries BEGIN "
+            "UPDATE totals SET entries = entries + 1, bytes = bytes + new.size WHERE id = 0; END",
+            "entries_delete": "AFTER DELETE ON entries BEGIN "
+            "UPDATE totals SET entries = entries - 1, bytes = bytes - old.size WHERE id = 0; END",
+            "entries_resize": "AFTER UPDATE OF size ON entries BEGIN "
+            "UPDATE totals SET bytes = bytes + new.size - old.size WHERE id = 0; END",
+        }
+        for name, body in triggers.items():  # Not executescript(): it would commit the transaction
+            conn.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+
+    # --- Connection handling ---
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """One write transaction on this thread's connection (IMMEDIATE: takes the write lock up front)"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """Builds a stable hash key from any json-serializable parts (e.g. model, prompt, params)."""
+        payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    # --- Public API ---
+    def get(self, key: str) -> Optional[Any]:
+        """Returns the cached value or None on a miss (or expired entry)."""
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute("SELECT value, created_at FROM entries WHERE key = ?", (key,)).fetchone()
+
+        if row is not None and self.ttl_seconds and now - row[1] > self.ttl_seconds:
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            row = None
+
+        if row is None:
+            with self._counter_lock:
+                self._misses += 1
+            return None
+
+        conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+        with self._counter_lock:
+            self._hits += 1
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any) -> None:
+        """Stores a value, replacing any previous entry for the same key."""
+        conn = self._connect()
+        now = time.time()
+        encoded = json.dumps(value, ensure_ascii=False)
+        # An upsert, not INSERT OR REPLACE: the replaced row's size must go through the triggers
+        conn.execute(
+            "INSERT INTO entries (key, size, created_at, accessed_at, value) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET size = excluded.size, created_at = excluded.created_at, "
+            "accessed_at = excluded.accessed_at, value = excluded.value",
+            (key, len(encoded.encode("utf-8")), now, now, encoded),
+        )
+        self._after_writes(1)
+
+    # Keys per `IN (...)` statement, well under SQLite's bound-parameter limit
+    BATCH_KEYS = 500
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[Any]]:
+        """
+        Like get() for a batch of keys (values in the same order, None for misses): one select per
+        BATCH_KEYS keys and a single transaction to bump accessed_at on the hits.
+        """
+        now = time.time()
+        unique = list(dict.fromkeys(keys))
+        found: Dict[str, Any] = {}
+        expired: List[str] = []
+        with self._transaction() as conn:
+            for start in range(0, len(unique), self.BATCH_KEYS):
+                chunk = unique[start:start + self.BATCH_KEYS]
+                rows = conn.execute(
+                    f"SELECT key, value, created_at FROM entries WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                for key, value, created_at in rows:
+                    if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                        expired.append(key)
+                    else:
+                        found[key] = value
+            if expired:
+                conn.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key in expired])
+            hits = list(found)
+            for start in range(0, len(hits), self.BATCH_KEYS):
+                chunk = hits[start:start + self.BATCH_KEYS]
+                conn.execute(
+                    f"UPDATE entries SET accessed_at = ? WHERE key IN ({','.join('?' * len(chunk))})",
+                    [now, *chunk],
+                )
+
+        hits = sum(key in found for key in keys)
+        with self._counter_lock:
+            self._hits += hits
+            self._misses += len(keys) - hits
+        return [json.loads(found[key]) if key in found else None for key in keys]
+
+    def set_many(self, items: Iterable[Tuple[str, Any]]) -> None:
+        """Like set() for a batch of (key, value) pairs, written with one executemany in one transaction."""
+        now = time.time()
+        rows = []
+        for key, value in items:
+            encoded = json.dumps(value, ensure_ascii=False)
+            rows.append((key, len(encoded.encode("utf-8")), now, now, encoded))
+        if not rows:
+            return
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT INTO entries (key, size, created_at, accessed_at, value) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET size = excluded.size, created_at = excluded.created_at, "
+                "accessed_at = excluded.accessed_at, value = excluded.value",
+                rows,
+            )
+        self._after_writes(len(rows))
+
+    def _after_writes(self, count: int) -> None:
+        with self._counter_lock:
+            purge = self._writes // self.evict_every != (self._writes + count) // self.evict_every
+            self._writes += count
+        if purge and self.ttl_seconds:
+            self._purge_expired()
+        if self._over(1.0):
+            self.evict()
+
+    def delete(self, key: str) -> None:
+        self._connect().execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def _totals(self):
+        return self._connect().execute("SELECT entries, bytes FROM totals WHERE id = 0").fetchone()
+
+    def _excess(self, share: float) -> int:
+        """Roughly how many entries must go to get under `share` of the entry and byte limits"""
+        count, total_bytes = self._totals()
+        excess = 0
+        if self.max_entries and count > self.max_entries * share:
+            excess = count - int(self.max_entries * share)
+        if self.max_bytes and total_bytes > self.max_bytes * share and count:
+            average = total_bytes / count
+            excess = max(excess, int((total_bytes - self.max_bytes * share) / average) + 1)
+        return excess
+
+    def _over(self, share: float) -> bool:
+        return self._excess(share) > 0
+
+    def _purge_expired(self) -> int:
+        removed = self._connect().execute(
+            "DELETE FROM entries WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+        ).rowcount
+        with self._counter_lock:
+            self._evictions += removed
+        return removed
+
+    def evict(self) -> int:
+        """
+        Purges expired entries, then, if over a limit, drops the least recently used ones (in
+        batches, oldest first off the accessed_at index) until back under `low_water` of the limits.
+        """
+        conn = self._connect()
+        removed = self._purge_expired() if self.ttl_seconds else 0
+        if not self._over(1.0):
+            return removed
+        while True:
+            excess = self._excess(self.low_water)
+            if not excess:
+                break
+            deleted = conn.execute(
+                "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY accessed_at LIMIT ?)",
+                (min(excess, self.EVICT_BATCH),),
+            ).rowcount
+            if not deleted:
+                break
+            removed += deleted
+            with self._counter_lock:
+                self._evictions += deleted
+        return removed
+
+    def clear(self) -> None:
+        self._connect().execute("DELETE FROM entries")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for this process plus the current size of the shared store."""
+        count, total_bytes = self._totals()
+        with self._counter_lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": (self._hits / lookups) if lookups else 0.0,
+                "writes": self._writes,
+                "evictions": self._evictions,
+                "entries": count,
+                "bytes": total_bytes,
+            }
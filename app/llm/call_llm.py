@@ -1,9 +1,17 @@
 import os
+import time
+import asyncio
 import logging
 import json
 from datetime import datetime
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import RateLimitError
+from app import config
+from app.llm.cache import PersistentCache
+from app.llm.clients import get_openai_client, get_async_openai_client
+from app.llm.scheduler import get_scheduler
+from app.llm.tokens import estimate_tokens
+from app.utils.profiling import record_llm_call
 
 load_dotenv()  # Load .env file at the top of the script
 
@@ -24,8 +32,14 @@ file_handler.setFormatter(
 )
 logger.addHandler(file_handler)
 
-# Simple cache configuration
-cache_file = "llm_cache.json"
+# Persistent response cache shared by every worker process.
+# Keyed by a hash of (model, prompt, parameters), so changing the model or its settings never returns stale answers.
+llm_cache = PersistentCache(
+    config.LLM_CACHE_PATH,
+    max_entries=config.LLM_CACHE_MAX_ENTRIES,
+    max_bytes=config.LLM_CACHE_MAX_BYTES,
+    ttl_seconds=config.LLM_CACHE_TTL_SECONDS,
+)
 
 
 # # By default, we Google Gemini 2.5 pro, as it shows great performance for code understanding
@@ -138,18 +152,191 @@ cache_file = "llm_cache.json"
 #     return response.content[1].text
 
 #Use OpenAI o1
-def call_llm(prompt, use_cache: bool = True):
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-    r = client.chat.completions.create(
-        model="o1",
-        messages=[{"role": "user", "content": prompt}],
-        response_format={
-            "type": "text"
-        },
-        reasoning_effort="medium",
-        store=False
+def _request_params():
+    return {
+        "response_format": {"type": "text"},
+        "reasoning_effort": config.LLM_REASONING_EFFORT,
+        "store": False,
+    }
+
+
+def _cache_lookup(cache_key):
+    try:
+        cached = llm_cache.get(cache_key)
+    except Exception as e:
+        logger.warning(f"Failed to read cache, calling the model: {e}")
+        return None
+    if cached is not None:
+        logger.info(f"CACHE HIT ({cache_key[:12]})")
+    return cached
+
+
+def _cache_store(cache_key, response_text):
+    # Always write through (even when reading was skipped, e.g. on a retry),
+    # so a response that failed validation is replaced by the fresh one.
+    if config.LLM_CACHE_ENABLED and response_text:
+        try:
+            llm_cache.set(cache_key, response_text)
+        except Exception as e:
+            logger.error(f"Failed to save cache: {e}")
+
+
+def _retry_after(error):
+    """Seconds to pause after a 429, from the Retry-After header when the API sends one."""
+    try:
+        return float(error.response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return config.LLM_RATE_LIMIT_BACKOFF
+
+
+def _reserved_tokens(prompt):
+    return estimate_tokens(prompt) + config.LLM_EXPECTED_OUTPUT_TOKENS
+
+
+def _log_wait(usage):
+    wait = usage["ticket"].wait_time
+    if wait > 1:
+        logger.info(f"Waited {wait:.1f}s in the LLM queue")
+
+
+def _record_call(latency, prompt, response_text, api_usage=None, cached=False):
+    """Reports the call to the run profiler, preferring the API's token counts over estimates."""
+    prompt_tokens = getattr(api_usage, "prompt_tokens", None) or estimate_tokens(prompt)
+    response_tokens = getattr(api_usage, "completion_tokens", None) or estimate_tokens(response_text or "")
+    record_llm_call(
+        latency, prompt_tokens, response_tokens,
+        bytes_processed=len(prompt) + len(response_text or ""), cached=cached,
     )
-    return r.choices[0].message.content
+
+
+def call_llm(prompt, use_cache: bool = True):
+    model = config.LLM_MODEL
+    params = _request_params()
+    cache_key = PersistentCache.make_key(model, prompt, params)
+
+    # Return from cache if enabled and present
+    if use_cache and config.LLM_CACHE_ENABLED:
+        cached = _cache_lookup(cache_key)
+        if cached is not None:
+            _record_call(0.0, prompt, cached, cached=True)
+            return cached
+
+    client = get_openai_client()
+    scheduler = get_scheduler()
+    for attempt in range(config.LLM_RATE_LIMIT_RETRIES + 1):
+        with scheduler.slot(_reserved_tokens(prompt)) as usage:
+            _log_wait(usage)
+            started = time.perf_counter()
+            try:
+                r = client.chat.completions.create(
+                    model=model,
+                    messages=[{"role": "user", "content": prompt}],
+                    **params,
+                )
+            except RateLimitError as e:
+                if attempt == config.LLM_RATE_LIMIT_RETRIES:
+                    raise
+                # Pause every queued call, not just this one, then try again
+                scheduler.penalize(_retry_after(e))
+                continue
+            if r.usage is not None:
+                usage["used_tokens"] = r.usage.total_tokens
+        break
+
+    response_text = r.choices[0].message.content
+    _record_call(time.perf_counter() - started, prompt, response_text, r.usage)
+    _cache_store(cache_key, response_text)
+    return response_text
+
+
+async def acall_llm(prompt, use_cache: bool = True):
+    """Async variant of call_llm for use on the event loop; shares its cache and scheduler."""
+    model = config.LLM_MODEL
+    params = _request_params()
+    cache_key = PersistentCache.make_key(model, prompt, params)
+
+    if use_cache and config.LLM_CACHE_ENABLED:
+        cached = await asyncio.to_thread(_cache_lookup, cache_key)
+        if cached is not None:
+            _record_call(0.0, prompt, cached, cached=True)
+            return cached
+
+    client = get_async_openai_client()
+    scheduler = get_scheduler()
+    for attempt in range(config.LLM_RATE_LIMIT_RETRIES + 1):
+        async with scheduler.aslot(_reserved_tokens(prompt)) as usage:
+            _log_wait(usage)
+            started = time.perf_counter()
+            try:
+                r = await client.chat.completions.create(
+                    model=model,
+                    messages=[{"role": "user", "content": prompt}],
+                    **params,
+                )
+            except RateLimitError as e:
+                if attempt == config.LLM_RATE_LIMIT_RETRIES:
+                    raise
+                scheduler.penalize(_retry_after(e))
+                continue
+            if r.usage is not None:
+                usage["used_tokens"] = r.usage.total_tokens
+        break
+
+    response_text = r.choices[0].message.content
+    _record_call(time.perf_counter() - started, prompt, response_text, r.usage)
+    await asyncio.to_thread(_cache_store, cache_key, response_text)
+    return response_text
+
+async def astream_llm(prompt, use_cache: bool = True):
+    """
+    Streams the answer as it is generated (async generator of text deltas).
+    A cache hit is yielded as a single chunk; the full answer is cached once the stream completes.
+    """
+    model = config.LLM_MODEL
+    params = _request_params()
+    cache_key = PersistentCache.make_key(model, prompt, params)
+
+    if use_cache and config.LLM_CACHE_ENABLED:
+        cached = await asyncio.to_thread(_cache_lookup, cache_key)
+        if cached is not None:
+            _record_call(0.0, prompt, cached, cached=True)
+            yield cached
+            return
+
+    client = get_async_openai_client()
+    scheduler = get_scheduler()
+    parts = []
+    api_usage = None
+    for attempt in range(config.LLM_RATE_LIMIT_RETRIES + 1):
+        async with scheduler.aslot(_reserved_tokens(prompt)) as usage:
+            _log_wait(usage)
+            started = time.perf_counter()
+            try:
+                stream = await client.chat.completions.create(
+                    model=model,
+                    messages=[{"role": "user", "content": prompt}],
+                    stream=True,
+                    stream_options={"include_usage": True},
+                    **params,
+                )
+            except RateLimitError as e:
+                if attempt == config.LLM_RATE_LIMIT_RETRIES:
+                    raise
+                scheduler.penalize(_retry_after(e))
+                continue
+            async for chunk in stream:
+                if chunk.usage is not None:
+                    api_usage = chunk.usage
+                    usage["used_tokens"] = chunk.usage.total_tokens
+                if chunk.choices and chunk.choices[0].delta.content:
+                    delta = chunk.choices[0].delta.content
+                    parts.append(delta)
+                    yield delta
+        break
+
+    response_text = "".join(parts)
+    _record_call(time.perf_counter() - started, prompt, response_text, api_usage)
+    await asyncio.to_thread(_cache_store, cache_key, response_text)
 
 # Use OpenAI gpt-4o
 # def call_llm(prompt, use_cache: bool = True):
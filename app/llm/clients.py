@@ -0,0 +1,118 @@
+# app/llm/clients.py
+"""
+Process-wide registry of OpenAI clients.
+
+Creating an `OpenAI(...)` client per call means a new connection pool (and a new
+TLS handshake) every time. Instead, the clients below are created once (at app
+startup through the FastAPI lifespan, or lazily on first use in scripts/flows)
+and reused everywhere, sharing tuned httpx keep-alive pools.
+"""
+import os
+import threading
+from typing import Optional
+
+import httpx
+from openai import OpenAI, AsyncOpenAI
+from langchain_openai import OpenAIEmbeddings
+
+from app import config
+
+_lock = threading.Lock()
+_http_client: Optional[httpx.Client] = None
+_async_http_client: Optional[httpx.AsyncClient] = None
+_openai_client: Optional[OpenAI] = None
+_async_openai_client: Optional[AsyncOpenAI] = None
+_embeddings: Optional[OpenAIEmbeddings] = None
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=config.OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=config.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=config.OPENAI_KEEPALIVE_EXPIRY,
+    )
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(config.OPENAI_TIMEOUT, connect=config.OPENAI_CONNECT_TIMEOUT)
+
+
+def _get_http_client() -> httpx.Client:
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.Client(limits=_limits(), timeout=_timeout())
+    return _http_client
+
+
+def _get_async_http_client() -> httpx.AsyncClient:
+    global _async_http_client
+    if _async_http_client is None:
+        _async_http_client = httpx.AsyncClient(limits=_limits(), timeout=_timeout())
+    return _async_http_client
+
+
+def get_openai_client() -> OpenAI:
+    """Shared synchronous client (used by call_llm and embeddings)."""
+    global _openai_client
+    if _openai_client is None:
+        with _lock:
+            if _openai_client is None:
+                _openai_client = OpenAI(
+                    api_key=os.getenv("OPENAI_API_KEY"),
+                    base_url=config.OPENAI_BASE_URL,
+                    max_retries=config.OPENAI_MAX_RETRIES,
+                    http_client=_get_http_client(),
+                )
+    return _openai_client
+
+
+def get_async_openai_client() -> AsyncOpenAI:
+    """Shared asynchronous client (used from coroutines on the API event loop)."""
+    global _async_openai_client
+    if _async_openai_client is None:
+        with _lock:
+            if _async_openai_client is None:
+                _async_openai_client = AsyncOpenAI(
+                    api_key=os.getenv("OPENAI_API_KEY"),
+                    base_url=config.OPENAI_BASE_URL,
+                    max_retries=config.OPENAI_MAX_RETRIES,
+                    http_client=_get_async_http_client(),
+                )
+    return _async_openai_client
+
+
+def get_embeddings_client() -> OpenAIEmbeddings:
+    """Shared LangChain embeddings object, backed by the same connection pools."""
+    global _embeddings
+    if _embeddings is None:
+        with _lock:
+            if _embeddings is None:
+                _embeddings = OpenAIEmbeddings(
+                    model=config.EMBEDDING_MODEL,
+                    openai_api_key=os.getenv("OPENAI_API_KEY"),
+                    openai_api_base=config.OPENAI_BASE_URL,
+                    max_retries=config.OPENAI_MAX_RETRIES,
+                    http_client=_get_http_client(),
+                    http_async_client=_get_async_http_client(),
+                )
+    return _embeddings
+
+
+def init_clients() -> None:
+    """Eagerly creates every shared client (called once at app startup)."""
+    get_openai_client()
+    get_async_openai_client()
+    get_embeddings_client()
+
+
+async def close_clients() -> None:
+    """Closes the shared connection pools (called at app shutdown)."""
+    global _http_client, _async_http_client, _openai_client, _async_openai_client, _embeddings
+    with _lock:
+        http_client, async_http_client = _http_client, _async_http_client
+        _http_client = _async_http_client = None
+        _openai_client = _async_openai_client = _embeddings = None
+    if http_client is not None:
+        http_client.close()
+    if async_http_client is not None:
+        await async_http_client.aclose()
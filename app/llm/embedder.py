@@ -1,25 +1,154 @@
 # app/llm/embedder.py
-from openai import OpenAI
-import os
-from langchain_openai import OpenAIEmbeddings
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
 
+from langchain_core.embeddings import Embeddings
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+from app import config
+from app.llm.cache import PersistentCache
+from app.llm.clients import get_openai_client, get_embeddings_client
 
-def get_embedding(text: str, model="text-embedding-3-small"):
-    response = client.embeddings.create(
+
+def get_embedding(text: str, model=config.EMBEDDING_MODEL):
+    response = get_openai_client().embeddings.create(
         input=[text],
         model=model
     )
     return response.data[0].embedding
 
 
+def normalize_query(text: str) -> str:
+    # Questions differing only in case or spacing ("How do I run this?" / "how do i run this ?") share an entry
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text)).strip().casefold()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    The shared embeddings client with persistent caches in front of it:
+    - `embed_query`: a bounded in-process LRU, then a PersistentCache on disk shared by every
+      worker process (so a question asked once is not embedded again after a restart or on
+      another worker), keyed by the normalized question.
+    - `embed_documents`: a PersistentCache keyed by the exact chunk text; only the chunks that
+      were never embedded are sent, in one request.
+    Either store can be None (that tier disabled).
+    """
+
+    def __init__(self, get_client: Callable[[], Embeddings], model: str, query_store: Optional[PersistentCache],
+                 memory_entries: int, document_store: Optional[PersistentCache] = None):
+        self.get_client = get_client  # Looked up per call, so recreated clients (close_clients/init_clients) are picked up
+        self.model = model
+        self.query_store = query_store
+        self.document_store = document_store
+        self.memory_entries = max(0, memory_entries) if query_store is not None else 0
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._memory_hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._document_hits = 0
+        self._document_misses = 0
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.query_store is None:
+            return self.get_client().embed_query(text)
+        key = PersistentCache.make_key("query-embedding", self.model, normalize_query(text))
+        with self._lock:
+            embedding = self._memory.get(key)
+            if embedding is not None:
+                self._memory.move_to_end(key)
+                self._memory_hits += 1
+                return embedding
+
+        embedding = self.query_store.get(key)
+        if embedding is not None:
+            with self._lock:
+                self._disk_hits += 1
+        else:
+            embedding = self.get_client().embed_query(text)
+            self.query_store.set(key, embedding)
+            with self._lock:
+                self._misses += 1
+
+        with self._lock:
+            if self.memory_entries:
+                self._memory[key] = embedding
+                self._memory.move_to_end(key)
+                while len(self._memory) > self.memory_entries:
+                    self._memory.popitem(last=False)
+        return embedding
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.document_store is None:
+            return self.get_client().embed_documents(texts)
+        keys = [PersistentCache.make_key("document-embedding", self.model, text) for text in texts]
+        embeddings = self.document_store.get_many(keys)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            for i, embedding in zip(missing, self.get_client().embed_documents([texts[i] for i in missing])):
+                embeddings[i] = embedding
+            self.document_store.set_many((keys[i], embeddings[i]) for i in missing)
+        with self._lock:
+            self._document_hits += len(texts) - len(missing)
+            self._document_misses += len(missing)
+        return embeddings
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._memory_hits + self._disk_hits + self._misses
+            document_lookups = self._document_hits + self._document_misses
+            return {
+                "queries": {
+                    "memory_hits": self._memory_hits,
+                    "disk_hits": self._disk_hits,
+                    "misses": self._misses,
+                    "hit_rate": ((self._memory_hits + self._disk_hits) / lookups) if lookups else 0.0,
+                    "memory_entries": len(self._memory),
+                    "disk_entries": self.query_store.stats()["entries"] if self.query_store is not None else 0,
+                },
+                "documents": {
+                    "hits": self._document_hits,
+                    "misses": self._document_misses,
+                    "hit_rate": (self._document_hits / document_lookups) if document_lookups else 0.0,
+                    "disk_entries": self.document_store.stats()["entries"] if self.document_store is not None else 0,
+                },
+            }
+
+
+_cached_embeddings: Optional[CachedEmbeddings] = None
+_cached_embeddings_lock = threading.Lock()
+
 
 def get_embedding_vector():
-    return OpenAIEmbeddings(
-        model="text-embedding-3-small",
-        openai_api_key=os.getenv("OPENAI_API_KEY")
-    )
+    # Shared instance: reuses the pooled HTTP connections instead of building a new client per request,
+    # with the query / chunk embedding caches in front unless both are disabled
+    global _cached_embeddings
+    if not (config.QUERY_EMBEDDING_CACHE_ENABLED or config.DOCUMENT_EMBEDDING_CACHE_ENABLED):
+        return get_embeddings_client()
+    with _cached_embeddings_lock:
+        if _cached_embeddings is None:
+            query_store = PersistentCache(
+                config.QUERY_EMBEDDING_CACHE_PATH,
+                max_entries=config.QUERY_EMBEDDING_CACHE_MAX_ENTRIES,
+                max_bytes=config.QUERY_EMBEDDING_CACHE_MAX_BYTES,
+            ) if config.QUERY_EMBEDDING_CACHE_ENABLED else None
+            document_store = PersistentCache(
+                config.DOCUMENT_EMBEDDING_CACHE_PATH,
+                max_entries=config.DOCUMENT_EMBEDDING_CACHE_MAX_ENTRIES,
+                max_bytes=config.DOCUMENT_EMBEDDING_CACHE_MAX_BYTES,
+            ) if config.DOCUMENT_EMBEDDING_CACHE_ENABLED else None
+            _cached_embeddings = CachedEmbeddings(
+                get_embeddings_client, config.EMBEDDING_MODEL, query_store,
+                config.QUERY_EMBEDDING_CACHE_MEMORY_ENTRIES, document_store,
+            )
+        return _cached_embeddings
+
+
+def embedding_cache_stats() -> Dict[str, Any]:
+    """Hit-rate counters of the embedding caches in this process (empty when disabled or unused)"""
+    return _cached_embeddings.stats() if _cached_embeddings is not None else {}
 
 
 # # Local transformer model: all-MiniLM-L6-v2 (from HuggingFace/SBERT).
@@ -31,4 +160,3 @@ def get_embedding_vector():
 
 #     def embed(self, texts: list[str]) -> list[list[float]]:
 #         return self.model.encode(texts, convert_to_tensor=False)
-
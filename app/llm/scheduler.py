@@ -0,0 +1,426 @@
+# app/llm/scheduler.py
+"""
+Process-wide admission control for LLM calls.
+
+Every call (sync from flow threads, async from the API loop) asks the scheduler
+for a slot before hitting the API. A slot is granted when:
+  - the requests-per-minute and tokens-per-minute token buckets have capacity,
+  - fewer than `max_concurrency` calls are in flight,
+  - no rate-limit pause (after a 429) is active.
+Waiting calls are queued per run (tutorial generation, query, ...) and served
+round-robin across runs, so one large tutorial cannot starve the others.
+
+Job worker processes (JOB_EXECUTION_MODE=process) don't run a scheduler of their own: their
+RemoteScheduler asks the API process's scheduler for each slot (through SchedulerHost), so
+the limits hold for all processes together.
+"""
+import time
+import asyncio
+import logging
+import itertools
+import threading
+import contextvars
+from collections import OrderedDict, deque
+from contextlib import contextmanager, asynccontextmanager
+from typing import Any, Callable, Deque, Dict, Hashable, Optional, Tuple
+
+from app import config
+
+# Identifies the run an LLM call belongs to; propagated into worker threads by asyncio.to_thread.
+current_run_key: contextvars.ContextVar[str] = contextvars.ContextVar("llm_run_key", default="default")
+
+
+@contextmanager
+def llm_run_context(run_key: str):
+    """Tags every LLM call made inside the block (and in threads started from it) with `run_key`."""
+    token = current_run_key.set(run_key)
+    try:
+        yield
+    finally:
+        current_run_key.reset(token)
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `rate_per_minute`, holding at most one minute of budget."""
+
+    def __init__(self, rate_per_minute: float):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(rate_per_minute)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def time_until(self, amount: float, now: float) -> float:
+        """Seconds until `amount` can be consumed (requests larger than the bucket only need a full bucket)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+    def consume(self, amount: float, now: float) -> None:
+        self._refill(now)
+        self.tokens -= min(amount, self.capacity)
+
+    def refund(self, amount: float, now: float) -> None:
+        """Gives back (or, when negative, additionally charges) budget once the real usage is known."""
+        self._refill(now)
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class _Ticket:
+    __slots__ = ("run_key", "tokens", "enqueued_at", "granted_at", "event", "future", "loop", "callback", "request_id")
+
+    def __init__(self, run_key: str, tokens: int):
+        self.run_key = run_key
+        self.tokens = tokens
+        self.enqueued_at = time.monotonic()
+        self.granted_at: Optional[float] = None
+        self.event: Optional[threading.Event] = None
+        self.future: Optional[asyncio.Future] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.callback: Optional[Callable[["_Ticket"], None]] = None
+        self.request_id: Optional[int] = None  # RemoteScheduler: the id the grant comes back under
+
+    @property
+    def wait_time(self) -> float:
+        return (self.granted_at or time.monotonic()) - self.enqueued_at
+
+
+class LLMScheduler:
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float, max_concurrency: int):
+        self.max_concurrency = max(1, max_concurrency)
+        self._requests = TokenBucket(requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute)
+        self._cond = threading.Condition()
+        self._queues: "OrderedDict[str, Deque[_Ticket]]" = OrderedDict()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._dispatcher: Optional[threading.Thread] = None
+
+        # Metrics
+        self._granted = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._rate_limited = 0
+
+    # --- Queueing ---
+    def _enqueue(self, ticket: _Ticket) -> None:
+        with self._cond:
+            if self._dispatcher is None:
+                self._dispatcher = threading.Thread(target=self._dispatch_loop, name="llm-scheduler", daemon=True)
+                self._dispatcher.start()
+            self._queues.setdefault(ticket.run_key, deque()).append(ticket)
+            self._cond.notify_all()
+
+    def _dequeue(self, ticket: _Ticket) -> bool:
+        """Takes a ticket that was not granted yet out of the queue; False if it is not queued."""
+        with self._cond:
+            queue = self._queues.get(ticket.run_key)
+            if not queue or ticket not in queue:
+                return False
+            queue.remove(ticket)
+            if not queue:
+                del self._queues[ticket.run_key]
+            return True
+
+    def _next_ticket(self) -> Optional[_Ticket]:
+        """Head of the run that has waited longest for its turn (round-robin over runs)."""
+        for run_key, queue in self._queues.items():
+            if queue:
+                return queue[0]
+        return None
+
+    def _dispatch_loop(self) -> None:
+        with self._cond:
+            while True:
+                ticket = self._next_ticket()
+                if ticket is None or self._in_flight >= self.max_concurrency:
+                    self._cond.wait()
+                    continue
+
+                now = time.monotonic()
+                delay = max(
+                    self._paused_until - now,
+                    self._requests.time_until(1, now),
+                    self._tokens.time_until(ticket.tokens, now),
+                )
+                if delay > 0:
+                    self._cond.wait(timeout=delay)
+                    continue
+
+                # Grant: pop it and move its run to the back of the rotation
+                queue = self._queues[ticket.run_key]
+                queue.popleft()
+                if queue:
+                    self._queues.move_to_end(ticket.run_key)
+                else:
+                    del self._queues[ticket.run_key]
+
+                self._requests.consume(1, now)
+                self._tokens.consume(ticket.tokens, now)
+                self._in_flight += 1
+                ticket.granted_at = now
+                self._granted += 1
+                self._total_wait += ticket.wait_time
+                self._max_wait = max(self._max_wait, ticket.wait_time)
+
+                if ticket.event is not None:
+                    ticket.event.set()
+                    continue
+                if ticket.callback is not None:
+                    try:
+                        ticket.callback(ticket)
+                    except Exception as e:
+                        logging.warning(f"LLM slot callback failed, releasing the slot: {e}")
+                        self.release(ticket)
+                    continue
+                try:
+                    ticket.loop.call_soon_threadsafe(self._resolve_future, ticket)
+                except RuntimeError:
+                    # The waiter's event loop is closed: nobody will use (or release) the slot.
+                    # Hand it back here rather than let the exception kill the dispatcher.
+                    self.release(ticket)
+
+    def _resolve_future(self, ticket: _Ticket) -> None:
+        if ticket.future.done():
+            # The waiting coroutine was cancelled after we granted the slot: hand it back.
+            self.release(ticket)
+        else:
+            ticket.future.set_result(ticket)
+
+    # --- Public API ---
+    def acquire(self, tokens: int, run_key: Optional[str] = None) -> _Ticket:
+        """Blocks the calling thread until a slot is granted."""
+        ticket = _Ticket(run_key or current_run_key.get(), tokens)
+        ticket.event = threading.Event()
+        self._enqueue(ticket)
+        ticket.event.wait()
+        return ticket
+
+    async def acquire_async(self, tokens: int, run_key: Optional[str] = None) -> _Ticket:
+        """Awaits a slot without blocking the event loop."""
+        ticket = _Ticket(run_key or current_run_key.get(), tokens)
+        ticket.loop = asyncio.get_running_loop()
+        ticket.future = ticket.loop.create_future()
+        self._enqueue(ticket)
+        try:
+            return await ticket.future
+        except asyncio.CancelledError:
+            if ticket.future.done() and not ticket.future.cancelled():
+                # Granted (set_result ran) but cancelled before we resumed: nobody will release it
+                self.release(ticket)
+                raise
+            self._dequeue(ticket)
+            raise
+
+    def acquire_callback(self, tokens: int, run_key: str, callback: Callable[[_Ticket], None]) -> _Ticket:
+        """
+        Queues a request without waiting for it: `callback(ticket)` runs on the dispatcher thread
+        (holding the scheduler's lock, so it must not block) once the slot is granted.
+        """
+        ticket = _Ticket(run_key, tokens)
+        ticket.callback = callback
+        self._enqueue(ticket)
+        return ticket
+
+    def cancel(self, ticket: _Ticket) -> None:
+        """Gives up a request: taken out of the queue if still waiting, else its slot is released."""
+        with self._cond:
+            if not self._dequeue(ticket) and ticket.granted_at is not None:
+                self.release(ticket)
+
+    def release(self, ticket: _Ticket, used_tokens: Optional[int] = None) -> None:
+        """Frees the slot; `used_tokens` corrects the reservation with the real usage when known."""
+        with self._cond:
+            self._in_flight -= 1
+            if used_tokens is not None:
+                self._tokens.refund(ticket.tokens - used_tokens, time.monotonic())
+            self._cond.notify_all()
+
+    def penalize(self, seconds: float) -> None:
+        """Pauses all dispatching, e.g. after the API answered 429."""
+        with self._cond:
+            self._rate_limited += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, tokens: int):
+        ticket = self.acquire(tokens)
+        usage: Dict[str, Any] = {"ticket": ticket, "used_tokens": None}
+        try:
+            yield usage
+        finally:
+            self.release(ticket, usage["used_tokens"])
+
+    @asynccontextmanager
+    async def aslot(self, tokens: int):
+        ticket = await self.acquire_async(tokens)
+        usage: Dict[str, Any] = {"ticket": ticket, "used_tokens": None}
+        try:
+            yield usage
+        finally:
+            self.release(ticket, usage["used_tokens"])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            now = time.monotonic()
+            oldest_wait = max(
+                (now - q[0].enqueued_at for q in self._queues.values() if q),
+                default=0.0,
+            )
+            return {
+                "queue_depth": sum(len(q) for q in self._queues.values()),
+                "queue_depth_by_run": {key: len(q) for key, q in self._queues.items()},
+                "in_flight": self._in_flight,
+                "max_concurrency": self.max_concurrency,
+                "granted": self._granted,
+                "avg_wait_seconds": (self._total_wait / self._granted) if self._granted else 0.0,
+                "max_wait_seconds": self._max_wait,
+                "oldest_waiting_seconds": oldest_wait,
+                "rate_limited": self._rate_limited,
+                "paused_for_seconds": max(0.0, self._paused_until - now),
+            }
+
+
+class RemoteScheduler:
+    """
+    The scheduler as seen from a job worker process: same acquire/release/penalize/slot/aslot API,
+    but every request goes to the API process's scheduler. `send(kind, payload)` delivers a message
+    to the parent's SchedulerHost; grants come back on `replies` as request ids.
+    """
+
+    def __init__(self, send: Callable[[str, Any], None], replies):
+        self._send = send
+        self._replies = replies
+        self._waiting: Dict[int, _Ticket] = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._reader: Optional[threading.Thread] = None
+
+    def _read_grants(self) -> None:
+        while True:
+            request_id = self._replies.get()
+            with self._lock:
+                ticket = self._waiting.pop(request_id, None)
+            if ticket is not None:
+                ticket.granted_at = time.monotonic()
+                ticket.event.set()
+
+    def acquire(self, tokens: int, run_key: Optional[str] = None) -> _Ticket:
+        ticket = _Ticket(run_key or current_run_key.get(), tokens)
+        ticket.event = threading.Event()
+        ticket.request_id = next(self._ids)
+        with self._lock:
+            if self._reader is None:
+                self._reader = threading.Thread(target=self._read_grants, name="llm-scheduler-grants", daemon=True)
+                self._reader.start()
+            self._waiting[ticket.request_id] = ticket
+        self._send("llm_acquire", (ticket.request_id, tokens, ticket.run_key))
+        ticket.event.wait()
+        return ticket
+
+    async def acquire_async(self, tokens: int, run_key: Optional[str] = None) -> _Ticket:
+        waiter = asyncio.ensure_future(asyncio.to_thread(self.acquire, tokens, run_key or current_run_key.get()))
+        try:
+            return await asyncio.shield(waiter)
+        except asyncio.CancelledError:
+            # The request can't be withdrawn from here: hand the slot back as soon as it is granted
+            waiter.add_done_callback(lambda f: f.cancelled() or f.exception() or self.release(f.result()))
+            raise
+
+    def release(self, ticket: _Ticket, used_tokens: Optional[int] = None) -> None:
+        self._send("llm_release", (ticket.request_id, used_tokens))
+
+    def penalize(self, seconds: float) -> None:
+        self._send("llm_penalize", seconds)
+
+    slot = LLMScheduler.slot
+    aslot = LLMScheduler.aslot
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"remote": True, "waiting": len(self._waiting)}
+
+
+class SchedulerHost:
+    """
+    API process side of RemoteScheduler: turns the worker processes' messages into requests on
+    the local scheduler and sends the grants back. Workers are identified by (generation, index):
+    a new pool of workers opens a new generation, and close() gives back everything the previous
+    one still held or waited for (e.g. after a worker process died).
+    """
+
+    def __init__(self, scheduler: LLMScheduler):
+        self.scheduler = scheduler
+        self._lock = threading.Lock()
+        self._generation: Optional[Hashable] = None
+        self._replies: list = []
+        self._tickets: Dict[Tuple[Hashable, int, int], _Ticket] = {}
+
+    def open(self, generation: Hashable, replies: list) -> None:
+        with self._lock:
+            self._generation = generation
+            self._replies = replies
+
+    def close(self, generation: Hashable) -> None:
+        with self._lock:
+            stale = [key for key in self._tickets if key[0] == generation]
+            for key in stale:
+                self.scheduler.cancel(self._tickets.pop(key))
+            if self._generation == generation:
+                self._generation = None
+
+    def handle(self, sender: Tuple[Hashable, int], kind: str, payload: Any) -> None:
+        generation, index = sender
+        with self._lock:
+            if generation != self._generation:
+                return  # From a pool that was already closed (and cleaned up)
+            if kind == "llm_acquire":
+                request_id, tokens, run_key = payload
+                replies = self._replies[index]
+                self._tickets[(generation, index, request_id)] = self.scheduler.acquire_callback(
+                    tokens, run_key, lambda ticket: replies.put(request_id),
+                )
+            elif kind == "llm_release":
+                request_id, used_tokens = payload
+                ticket = self._tickets.pop((generation, index, request_id), None)
+                if ticket is not None:
+                    self.scheduler.release(ticket, used_tokens)
+            elif kind == "llm_penalize":
+                self.scheduler.penalize(payload)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            tickets = list(self._tickets.values())
+        held = sum(ticket.granted_at is not None for ticket in tickets)
+        return {"worker_slots_held": held, "worker_requests_waiting": len(tickets) - held}
+
+
+_scheduler: Optional[LLMScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> LLMScheduler:
+    """The process-wide scheduler (created on first use from app.config)."""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = LLMScheduler(
+                    requests_per_minute=config.LLM_REQUESTS_PER_MINUTE,
+                    tokens_per_minute=config.LLM_TOKENS_PER_MINUTE,
+                    max_concurrency=config.LLM_MAX_CONCURRENCY,
+                )
+    return _scheduler
+
+
+def set_scheduler(scheduler) -> None:
+    """Replaces the process-wide scheduler (job worker processes install a RemoteScheduler)."""
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = scheduler
@@ -0,0 +1,11 @@
+# app/llm/tokens.py
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate (~4 characters per token for English text and code).
+    Good enough for budgeting and reporting; not meant to match the tokenizer exactly.
+    """
+    if not text:
+        return 0
+    return max(1, len(text) // 4)
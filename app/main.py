@@ -1,9 +1,27 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.routers import tutorial,query_router  # , query
+from app.api.routers import tutorial,query_router,jobs  # , query
 #from app.api.routers import query_router
+from app.llm.clients import init_clients, close_clients
+from app.llm.scheduler import get_scheduler
+from app.llm.call_llm import llm_cache
+from app.llm.embedder import embedding_cache_stats
+from app.services.jobs import get_job_manager
+from app.repositories.vector_store import get_vector_store_registry
 
-app = FastAPI(title="KT Assistant")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create the shared OpenAI clients once per worker and reuse them for every request
+    init_clients()
+    yield
+    get_job_manager().shutdown()
+    get_vector_store_registry().close_all()
+    await close_clients()
+
+
+app = FastAPI(title="KT Assistant", lifespan=lifespan)
 
 # Add CORS middleware BEFORE registering routers
 app.add_middleware(
@@ -19,8 +37,21 @@ app.add_middleware(
 def read_root():
     """A simple endpoint to confirm the API is running."""
     return {"status": "ok", "message": "KT Assistant API is running!"}
+
+
+@app.get("/stats")
+def read_stats():
+    """LLM queue depth / wait times, response and embedding cache counters, background jobs and open vector stores for this worker."""
+    return {
+        "llm_scheduler": get_scheduler().stats(),
+        "llm_cache": llm_cache.stats(),
+        "embedding_cache": embedding_cache_stats(),
+        "jobs": get_job_manager().stats(),
+        "vector_stores": get_vector_store_registry().stats(),
+    }
 # =============================
 # Register your API routers
 app.include_router(tutorial.router)
 app.include_router(query_router.router)
+app.include_router(jobs.router)
 # app.include_router(query.router)
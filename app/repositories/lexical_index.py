@@ -0,0 +1,170 @@
+# app/repositories/lexical_index.py
+"""
+BM25 index over a repository's chunks (SQLite FTS5), kept next to its Chroma store, for the
+exact identifier / config key lookups dense vectors are bad at ("what does `sanitize_filename`
+do", "where is RUN_LEASE_TTL_SECONDS used").
+
+Code text is indexed as terms: every identifier whole (lowercased) plus its snake_case /
+camelCase parts, so `sanitize_filename`, "sanitize" and "filename" all match. Chunks are keyed
+by the same deterministic ids as in Chroma; ChunkIngestor adds them and prune_chunks removes
+them alongside the vector store.
+
+An index is only searched once it is marked complete (a full run has put every code and
+documentation chunk through it); until then - e.g. a store built before the index existed and
+only refreshed since - it holds a subset of the chunks and queries use vector search alone.
+"""
+import os
+import re
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+LEXICAL_INDEX_FILE = "lexical.sqlite3"
+
+_WORD = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|[0-9]+")
+_PARTS = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+")
+# Question words that would match nearly every chunk
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "how", "i", "in",
+    "is", "it", "of", "on", "or", "the", "this", "to", "use", "used", "what", "when", "where", "which",
+    "who", "why", "with", "work", "works",
+}
+
+
+# `quoted`, snake_case / UPPER_CASE, camelCase / PascalCase or dotted.names: the question names a code identifier
+_IDENTIFIER_LIKE = re.compile(r"`[^`]+`|\b\w+_\w+\b|\b[A-Za-z][a-z0-9]+[A-Z]\w*\b|\b[A-Za-z_]\w*\.[A-Za-z_]\w*\b")
+
+
+def mentions_identifier(text: str) -> bool:
+    return bool(_IDENTIFIER_LIKE.search(text))
+
+
+def lexical_terms(text: str) -> List[str]:
+    terms = []
+    for word in _WORD.findall(text):
+        terms.append(word.lower())
+        parts = _PARTS.findall(word)
+        if len(parts) > 1:
+            terms.extend(part.lower() for part in parts)
+    return terms
+
+
+def query_terms(text: str, limit: int = 32) -> List[str]:
+    terms = []
+    for term in lexical_terms(text):
+        if term not in STOPWORDS and term not in terms:
+            terms.append(term)
+    return terms[:limit]
+
+
+class LexicalIndex:
+    def __init__(self, directory: str):
+        self.path = os.path.join(directory, LEXICAL_INDEX_FILE)
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []  # Of every thread, for close()
+        self._connections_lock = threading.Lock()
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks (rowid INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, "
+            "source TEXT NOT NULL, type TEXT NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_source ON chunks(type, source)")
+        # Same rowid as in `chunks`; underscores are token characters, so identifiers stay whole
+        conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS chunk_terms USING fts5(terms, tokenize=\"unicode61 tokenchars '_'\")")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        return os.path.exists(os.path.join(directory, LEXICAL_INDEX_FILE))
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    # --- Completeness ---
+    def is_complete(self) -> bool:
+        row = self._connect().execute("SELECT value FROM meta WHERE key = 'complete'").fetchone()
+        return row is not None
+
+    def mark_complete(self) -> None:
+        self._connect().execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('complete', '1')")
+
+    # --- Writing (indexing) ---
+    def add(self, chunks: Iterable[Tuple[str, Dict[str, Any], str]]) -> int:
+        """Adds (id, metadata, text) chunks not indexed yet (an id implies its content); returns how many"""
+        conn = self._connect()
+        added = 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for chunk_id, metadata, text in chunks:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO chunks (id, source, type) VALUES (?, ?, ?)",
+                    (chunk_id, metadata.get("source", ""), metadata.get("type", "")),
+                )
+                if cursor.rowcount:
+                    conn.execute("INSERT INTO chunk_terms (rowid, terms) VALUES (?, ?)",
+                                 (cursor.lastrowid, " ".join(lexical_terms(text))))
+                    added += 1
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return added
+
+    def prune(self, doc_type: str, keep_ids: Set[str], sources: Optional[Iterable[str]] = None) -> int:
+        """Deletes the `doc_type` chunks (of `sources`, if given) not in `keep_ids`; returns how many"""
+        conn = self._connect()
+        if sources is None:
+            rows = conn.execute("SELECT rowid, id FROM chunks WHERE type = ?", (doc_type,)).fetchall()
+        else:
+            sources = list(sources)
+            rows = []
+            for start in range(0, len(sources), 500):  # SQLite's variable limit
+                part = sources[start:start + 500]
+                rows += conn.execute(
+                    f"SELECT rowid, id FROM chunks WHERE type = ? AND source IN ({','.join('?' * len(part))})",
+                    (doc_type, *part),
+                ).fetchall()
+        stale = [(rowid,) for rowid, chunk_id in rows if chunk_id not in keep_ids]
+        if stale:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany("DELETE FROM chunk_terms WHERE rowid = ?", stale)
+                conn.executemany("DELETE FROM chunks WHERE rowid = ?", stale)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return len(stale)
+
+    # --- Reading (queries) ---
+    def search(self, query_text: str, top_k: int = 20) -> List[Tuple[str, float]]:
+        """(chunk id, BM25 score) of the best matches, best first; any query term may match"""
+        terms = query_terms(query_text)
+        if not terms:
+            return []
+        match = " OR ".join(f'"{term}"' for term in terms)
+        rows = self._connect().execute(
+            "SELECT c.id, bm25(chunk_terms) AS score FROM chunk_terms JOIN chunks c ON c.rowid = chunk_terms.rowid "
+            "WHERE chunk_terms MATCH ? ORDER BY score LIMIT ?",
+            (match, top_k),
+        ).fetchall()
+        return [(chunk_id, -score) for chunk_id, score in rows]  # FTS5's bm25() is lower-is-better
+
+    def count(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def close(self) -> None:
+        """Closes the connections of every thread that used the index"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
@@ -1,7 +1,20 @@
 import chromadb
 import re
 import os
-from typing import List, Dict, Any
+import time
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+
+from app import config
+from app.repositories.lexical_index import LexicalIndex, mentions_identifier
+
+# Runs the BM25 lookups of hybrid searches while the calling thread embeds the query and searches Chroma
+_lexical_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="lexical-search")
 
 def sanitize_filename(url: str) -> str:
     """
@@ -41,7 +54,72 @@ class ChromaVectorStore:
         # Now, this will get the collection created by the embedding script
         self.collection = self.client.get_collection(name=collection_name)
 
-    def search(self, query_text: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        # BM25 index over the same chunks. Stores built before it existed have none, or a partial one
+        # until their next full run marks it complete: vector search only
+        self.lexical = None
+        if LexicalIndex.exists(persist_directory):
+            lexical = LexicalIndex(persist_directory)
+            if lexical.is_complete():
+                self.lexical = lexical
+            else:
+                lexical.close()
+
+    def close(self) -> None:
+        # Chroma shares one in-memory system (with the loaded index) between all clients of a
+        # path; it is dropped, and reloaded from disk by the next client, once the last one closes
+        self.client.close()
+        if self.lexical is not None:
+            self.lexical.close()  # Also the connections opened by the lexical-search threads
+
+    def search(self, query_text: str, top_k: int = 5, mode: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        The `top_k` best chunks for the query. In "hybrid" mode (RETRIEVAL_MODE) the vector search
+        and a BM25 search of the lexical index run in parallel and their rankings are merged by
+        reciprocal rank fusion; "vector" and "lexical" use one of them alone.
+        """
+        mode = mode or config.RETRIEVAL_MODE
+        if mode == "vector" or self.lexical is None:
+            return self._vector_search(query_text, top_k)
+        if mode == "lexical":
+            hits = self._lexical_search(query_text, top_k)
+            return self._with_documents([(chunk_id, score) for chunk_id, score in hits], {})
+
+        candidates = max(top_k, config.RETRIEVAL_CANDIDATES)
+        lexical_job = _lexical_pool.submit(self._lexical_search, query_text, candidates)
+        vector_results = self._vector_search(query_text, candidates)
+        lexical_hits = lexical_job.result()
+
+        # Exact matches decide identifier lookups ("what does `sanitize_filename` do"), so the BM25
+        # ranking counts more when the question names one
+        lexical_weight = config.RETRIEVAL_IDENTIFIER_LEXICAL_WEIGHT if mentions_identifier(query_text) else 1.0
+        fused = reciprocal_rank_fusion(
+            [[result["id"] for result in vector_results], [chunk_id for chunk_id, _ in lexical_hits]],
+            config.RETRIEVAL_RRF_K, weights=[1.0, lexical_weight],
+        )[:top_k]
+        return self._with_documents(fused, {result["id"]: result for result in vector_results})
+
+    def _lexical_search(self, query_text: str, top_k: int) -> List[Tuple[str, float]]:
+        try:
+            hits = self.lexical.search(query_text, top_k)
+        except sqlite3.Error as e:  # A damaged or locked index must not fail the query
+            logging.warning(f"Lexical search failed, using vector results only: {e}")
+            return []
+        # Chunks matching only terms that are in nearly every chunk ("func", "helper" of
+        # `func_42_helper`) score ~0 but would still get full rank credit in the fusion
+        floor = hits[0][1] * config.RETRIEVAL_LEXICAL_MIN_SCORE_RATIO if hits else 0.0
+        return [(chunk_id, score) for chunk_id, score in hits if score >= floor]
+
+    def _with_documents(self, ranked: List[Tuple[str, float]], known: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Result dicts for the ranked ids, fetching the chunks that only the lexical search found"""
+        missing = [chunk_id for chunk_id, _ in ranked if chunk_id not in known]
+        if missing:
+            fetched = self.collection.get(ids=missing, include=["metadatas", "documents"])
+            for chunk_id, metadata, document in zip(fetched["ids"], fetched["metadatas"], fetched["documents"]):
+                known[chunk_id] = {"id": chunk_id, "metadata": metadata, "distance": None, "document": document}
+        # Ids the lexical index still has but Chroma no longer does are skipped
+        return [dict(known[chunk_id], score=score) for chunk_id, score in ranked if chunk_id in known]
+
+    def _vector_search(self, query_text: str, top_k: int) -> List[Dict[str, Any]]:
         """
         Embeds the query text and searches the collection, returning the document content.
         """
@@ -71,4 +149,145 @@ class ChromaVectorStore:
                 "document": results['documents'][0][i]
             })
         
-        return combined_results
\ No newline at end of file
+        return combined_results
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: float = 60,
+                           weights: Optional[List[float]] = None) -> List[Tuple[str, float]]:
+    """Merges rankings (ids, best first): each id scores sum(weight / (k + rank)) over the rankings it is in"""
+    scores: Dict[str, float] = {}
+    for ranking, weight in zip(rankings, weights or [1.0] * len(rankings)):
+        for rank, chunk_id in enumerate(ranking, 1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + weight / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+STORE_UPDATED_FILE = ".updated"  # Touched after every write, so every process's registry reopens the store
+
+
+def store_directory(repo_url: str) -> str:
+    return os.path.abspath(os.path.join("./vector_stores", sanitize_filename(repo_url)))
+
+
+def _updated_stamp(directory: str) -> Optional[int]:
+    try:
+        return os.stat(os.path.join(directory, STORE_UPDATED_FILE)).st_mtime_ns
+    except OSError:
+        return None
+
+
+class _PooledStore:
+    def __init__(self, store: ChromaVectorStore, stamp: Optional[int]):
+        self.store = store
+        self.stamp = stamp
+        self.last_used = time.monotonic()
+        self.users = 0  # Searches in progress; a retired store is closed when the last one ends
+        self.retired = False
+        self.stale = False  # Opened while an older client of the same path was still open (shares its old index)
+
+
+class VectorStoreRegistry:
+    """
+    Process-wide pool of opened ChromaVectorStores, keyed by sanitized repo name, so queries
+    reuse the client and the collection's loaded index instead of reopening them from disk.
+
+    - At most `max_open` stores stay open (least recently used closed first); stores not used
+      for `idle_seconds` are closed on the next access.
+    - `invalidate(repo_url)` after writing to a store: the pooled one is closed and the next
+      query reopens it with the new content. Writes also touch a marker file in the store, so
+      registries of other worker processes notice them too (one stat per query).
+    """
+
+    def __init__(self, max_open: int, idle_seconds: float):
+        self.max_open = max(1, max_open)
+        self.idle_seconds = idle_seconds
+        self._stores: "OrderedDict[str, _PooledStore]" = OrderedDict()
+        self._retiring: Dict[str, int] = {}  # key -> retired stores still in use
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def acquire(self, repo_url: str, embedder: Any) -> Iterator[ChromaVectorStore]:
+        """Yields the pooled store of `repo_url` (opening it if needed); it is not closed while in use"""
+        key = sanitize_filename(repo_url)
+        stamp = _updated_stamp(store_directory(repo_url))
+        with self._lock:
+            self._evict_idle()
+            entry = self._stores.get(key)
+            if entry is not None and (entry.stamp != stamp or (entry.stale and key not in self._retiring)):
+                self._retire(key)
+                entry = None
+            if entry is None:
+                # Opened under the lock: concurrent first queries of a repo share one client
+                entry = _PooledStore(ChromaVectorStore(repo_url=repo_url, embedder=embedder), stamp)
+                entry.stale = key in self._retiring
+                self._stores[key] = entry
+                while len(self._stores) > self.max_open:
+                    self._retire(next(iter(self._stores)))
+            self._stores.move_to_end(key)
+            entry.store.embedder = embedder
+            entry.users += 1
+        try:
+            yield entry.store
+        finally:
+            with self._lock:
+                entry.users -= 1
+                entry.last_used = time.monotonic()
+                if entry.retired and entry.users == 0:
+                    self._close(key, entry)
+                    self._retiring[key] -= 1
+                    if not self._retiring[key]:
+                        del self._retiring[key]
+
+    def invalidate(self, repo_url: str) -> None:
+        """Marks the store of `repo_url` as written to; it is reopened on its next query in every process"""
+        directory = store_directory(repo_url)
+        if os.path.isdir(directory):
+            with open(os.path.join(directory, STORE_UPDATED_FILE), "a"):
+                pass
+            os.utime(os.path.join(directory, STORE_UPDATED_FILE))
+        with self._lock:
+            self._retire(sanitize_filename(repo_url))
+
+    def close_all(self) -> None:
+        with self._lock:
+            for key in list(self._stores):
+                self._retire(key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"open": len(self._stores), "max_open": self.max_open, "repos": list(self._stores)}
+
+    # --- Under self._lock ---
+    def _evict_idle(self) -> None:
+        now = time.monotonic()
+        for key, entry in list(self._stores.items()):
+            if entry.users == 0 and now - entry.last_used > self.idle_seconds:
+                self._retire(key)
+
+    def _retire(self, key: str) -> None:
+        entry = self._stores.pop(key, None)
+        if entry is None:
+            return
+        entry.retired = True
+        if entry.users == 0:
+            self._close(key, entry)
+        else:
+            self._retiring[key] = self._retiring.get(key, 0) + 1
+
+    def _close(self, key: str, entry: _PooledStore) -> None:
+        try:
+            entry.store.close()
+        except Exception as e:
+            logging.warning(f"Closing the vector store of {key} failed: {e}")
+
+
+_registry: Optional[VectorStoreRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_vector_store_registry() -> VectorStoreRegistry:
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = VectorStoreRegistry(config.VECTOR_STORE_MAX_OPEN, config.VECTOR_STORE_IDLE_SECONDS)
+        return _registry
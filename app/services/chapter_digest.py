@@ -0,0 +1,100 @@
+# app/services/chapter_digest.py
+import re
+from typing import Dict, List
+
+from app.llm.tokens import estimate_tokens
+
+
+class ChapterDigest:
+    """
+    Compact recap of the chapters written so far, used as "context from previous chapters"
+    in WriteChapters prompts instead of the full text of every earlier chapter.
+
+    Each chapter is reduced once (when it is added) to its title, the key terms it introduced
+    and a one-paragraph recap. `render()` always fits in `token_budget`: the oldest chapters
+    lose their recap first, then their key terms, and are finally folded into a count.
+    """
+
+    def __init__(self, token_budget: int = 2000, recap_chars: int = 600, max_terms: int = 12):
+        self.token_budget = token_budget
+        self.recap_chars = recap_chars
+        self.max_terms = max_terms
+        self.entries: List[Dict] = []
+
+    # --- Extraction ---
+    def _key_terms(self, content: str) -> List[str]:
+        """Section headings, bold terms and inline code identifiers, in order of appearance."""
+        body = re.sub(r"```.*?```", "", content, flags=re.DOTALL)  # Ignore code blocks
+        candidates = []
+        candidates += re.findall(r"^#{2,3}\s+(.+)$", body, flags=re.MULTILINE)
+        candidates += re.findall(r"\*\*([^*\n]{2,60})\*\*", body)
+        candidates += re.findall(r"`([A-Za-z_][\w.]{2,60})`", body)
+
+        terms, seen = [], set()
+        for term in candidates:
+            term = term.strip().rstrip(":")
+            if term and term.lower() not in seen:
+                seen.add(term.lower())
+                terms.append(term)
+            if len(terms) >= self.max_terms:
+                break
+        return terms
+
+    def _recap(self, content: str) -> str:
+        """First prose paragraphs of the chapter (no headings, code, diagrams or lists), trimmed."""
+        body = re.sub(r"```.*?```", "", content, flags=re.DOTALL)
+        paragraphs = []
+        for block in re.split(r"\n\s*\n", body):
+            block = block.strip()
+            if not block or block.startswith(("#", "|", "-", "*", ">", "1.")):
+                continue
+            paragraphs.append(" ".join(block.split()))
+            if sum(len(p) for p in paragraphs) >= self.recap_chars:
+                break
+        recap = " ".join(paragraphs)
+        recap = re.sub(r"\[([^\]]+)\]\([^)]+\)", r"\1", recap)  # Keep link text only
+        if len(recap) > self.recap_chars:
+            recap = recap[: self.recap_chars].rsplit(" ", 1)[0] + "..."
+        return recap
+
+    # --- Public API ---
+    def add(self, chapter_num: int, title: str, content: str) -> None:
+        self.entries.append({
+            "num": chapter_num,
+            "title": title.strip(),
+            "terms": self._key_terms(content),
+            "recap": self._recap(content),
+        })
+
+    def _format(self, entry: Dict, level: int) -> str:
+        # level 0: full, 1: without recap, 2: title only
+        line = f"Chapter {entry['num']}: {entry['title']}"
+        if level <= 1 and entry["terms"]:
+            line += f"\nKey terms: {', '.join(entry['terms'])}"
+        if level == 0 and entry["recap"]:
+            line += f"\nRecap: {entry['recap']}"
+        return line
+
+    def render(self) -> str:
+        if not self.entries:
+            return ""
+
+        levels = [0] * len(self.entries)
+        omitted = 0
+
+        def text():
+            parts = []
+            if omitted:
+                parts.append(f"({omitted} earlier chapters omitted)")
+            parts += [self._format(e, lvl) for e, lvl in zip(self.entries[omitted:], levels[omitted:])]
+            return "\n---\n".join(parts)
+
+        # Degrade the oldest chapters first; the most recent one keeps its recap as long as possible
+        for level in (1, 2):
+            for i in range(len(self.entries)):
+                if estimate_tokens(text()) <= self.token_budget:
+                    return text()
+                levels[i] = max(levels[i], level)
+        while estimate_tokens(text()) > self.token_budget and omitted < len(self.entries) - 1:
+            omitted += 1
+        return text()
@@ -0,0 +1,107 @@
+# app/services/checkpoint.py
+import os
+import json
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+from app.services.file_corpus import FileCorpus
+
+
+class FlowCheckpoint:
+    """
+    Persists the tutorial flow's `shared` state after every completed node (and after every
+    written chapter) so a failed run can resume from its last completed step instead of
+    re-crawling the repository and re-paying every LLM stage.
+    """
+
+    # Keys of `shared` produced by the nodes; config, logger and other runtime objects are not persisted.
+    STATE_KEYS = (
+        "project_name",
+        "files",
+        "file_hashes",
+        "file_digests",
+        "refresh_plan",
+        "abstractions",
+        "relationships",
+        "chapter_order",
+        "chapters",
+        "chapter_prompt_tokens",
+        "final_output_dir",
+        "code_index_built",
+        "rag_db_built",
+    )
+
+    def __init__(self, path: str, data: Optional[Dict[str, Any]] = None):
+        self.path = path
+        self._lock = threading.Lock()
+        self.data = data or {"completed_nodes": {}, "state": {}, "chapters": {}}
+
+    @classmethod
+    def load(cls, path: str) -> "FlowCheckpoint":
+        """Loads an existing checkpoint, or starts an empty one if it is missing or unreadable."""
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    return cls(path, json.load(f))
+            except (OSError, ValueError) as e:
+                logging.warning(f"Ignoring unreadable checkpoint {path}: {e}")
+        return cls(path)
+
+    def _save(self) -> None:
+        # Write to a temp file and swap it in, so a crash never leaves a truncated checkpoint
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f)
+        os.replace(tmp_path, self.path)
+
+    # --- Node level ---
+    @property
+    def completed_nodes(self):
+        return list(self.data["completed_nodes"])
+
+    def is_completed(self, node_name: str) -> bool:
+        return node_name in self.data["completed_nodes"]
+
+    def action_for(self, node_name: str) -> Optional[str]:
+        """The action the node returned when it completed (drives the flow's next transition)."""
+        return self.data["completed_nodes"].get(node_name)
+
+    def mark_completed(self, node_name: str, shared: Dict[str, Any], action: Optional[str] = None) -> None:
+        with self._lock:
+            # A FileCorpus is saved as a reference to its directory, not its contents
+            self.data["state"] = {
+                k: shared[k].to_state() if isinstance(shared[k], FileCorpus) else shared[k]
+                for k in self.STATE_KEYS if k in shared
+            }
+            self.data["completed_nodes"][node_name] = action
+            self._save()
+
+    def restore(self, shared: Dict[str, Any]) -> None:
+        """Copies the persisted state back into `shared`."""
+        state = dict(self.data["state"])
+        if FileCorpus.is_state(state.get("files")):
+            try:
+                state["files"] = FileCorpus.open(state["files"]["file_corpus"])
+            except (OSError, ValueError) as e:
+                # Without the crawled files nothing can be resumed; start over
+                logging.warning(f"Checkpoint's file corpus is unusable ({e}); starting from scratch.")
+                self.data = {"completed_nodes": {}, "state": {}, "chapters": {}}
+                return
+        elif "files" in state:
+            state["files"] = [tuple(item) for item in state["files"]]  # JSON turns tuples into lists
+        shared.update(state)
+
+    # --- Chapter level (WriteChapters) ---
+    def save_chapter(self, chapter_num: int, content: str) -> None:
+        with self._lock:
+            self.data["chapters"][str(chapter_num)] = content
+            self._save()
+
+    def completed_chapters(self) -> Dict[int, str]:
+        return {int(num): content for num, content in self.data["chapters"].items()}
+
+    def clear(self) -> None:
+        with self._lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
@@ -0,0 +1,147 @@
+# app/services/file_corpus.py
+"""
+On-disk corpus of a crawled repository's files, so a run does not keep every file's content
+in memory for its whole duration.
+
+The crawlers write into it file by file (it accepts `corpus[path] = content` like the dict they
+used to fill); the contents are appended to one store file and only a small index stays in
+memory (path, offset, length, content hash). Nodes read it like the previous list of
+(path, content) tuples: `len(files)`, `files[i]`, `for path, content in files` - each content is
+read from the store (page cache) when accessed and can be freed right after.
+
+The index is saved next to the store, so a checkpointed run resumes with the same corpus.
+"""
+import os
+import json
+import shutil
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.services.manifest import hash_content
+
+STORE_FILE = "contents.bin"
+INDEX_FILE = "index.json"
+
+
+class FileCorpus:
+    def __init__(self, directory: str, entries: Optional[List[list]] = None):
+        self.directory = os.path.abspath(directory)
+        self._entries: List[list] = entries or []  # [path, offset, length (bytes), content hash]
+        self._positions: Dict[str, int] = {entry[0]: i for i, entry in enumerate(self._entries)}
+        self._lock = threading.Lock()
+        self._fd = os.open(os.path.join(self.directory, STORE_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+        self._end = os.fstat(self._fd).st_size
+
+    @classmethod
+    def create(cls, directory: str) -> "FileCorpus":
+        """An empty corpus in `directory` (replacing whatever was there)"""
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory, exist_ok=True)
+        return cls(directory)
+
+    @classmethod
+    def open(cls, directory: str) -> "FileCorpus":
+        """Reopens a saved corpus (raises OSError/ValueError if it is missing or damaged)"""
+        with open(os.path.join(directory, INDEX_FILE), "r", encoding="utf-8") as f:
+            entries = json.load(f)["entries"]
+        corpus = cls(directory, entries)
+        if any(offset + length > corpus._end for _, offset, length, _ in entries):
+            corpus.close()
+            raise ValueError(f"The store of the file corpus in {directory} is truncated")
+        return corpus
+
+    # --- Writing (crawlers) ---
+    def add(self, path: str, content: str) -> None:
+        data = content.encode("utf-8", errors="surrogatepass")
+        with self._lock:
+            offset = self._end
+            os.pwrite(self._fd, data, offset)
+            self._end += len(data)
+            entry = [path, offset, len(data), hash_content(content)]
+            if path in self._positions:  # Re-added: the new content, in the old position
+                self._entries[self._positions[path]] = entry
+            else:
+                self._positions[path] = len(self._entries)
+                self._entries.append(entry)
+
+    def __setitem__(self, path: str, content: str) -> None:
+        self.add(path, content)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries, self._positions = [], {}
+            os.ftruncate(self._fd, 0)
+            self._end = 0
+
+    def reorder(self, paths: Iterable[str]) -> None:
+        """Puts the files in the order of `paths` (files not listed are dropped)"""
+        with self._lock:
+            self._entries = [self._entries[self._positions[p]] for p in paths if p in self._positions]
+            self._positions = {entry[0]: i for i, entry in enumerate(self._entries)}
+
+    def save(self) -> None:
+        """Writes the index next to the store, so the corpus can be reopened after a restart"""
+        os.fsync(self._fd)
+        tmp_path = os.path.join(self.directory, INDEX_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"entries": self._entries}, f)
+        os.replace(tmp_path, os.path.join(self.directory, INDEX_FILE))
+
+    def close(self) -> None:
+        if getattr(self, "_fd", None) is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __del__(self):
+        # Readers (e.g. the background code indexing) may outlive the run, so the store is
+        # closed when the last reference goes rather than at the end of the flow
+        self.close()
+
+    # --- Reading (nodes): a sequence of (path, content) ---
+    def _read(self, entry: list) -> str:
+        _, offset, length, _ = entry
+        return os.pread(self._fd, length, offset).decode("utf-8", errors="surrogatepass")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [(entry[0], self._read(entry)) for entry in self._entries[i]]
+        entry = self._entries[i]
+        return entry[0], self._read(entry)
+
+    def __iter__(self) -> Iterator[Tuple[str, str]]:
+        for entry in list(self._entries):
+            yield entry[0], self._read(entry)
+
+    def items(self) -> Iterator[Tuple[str, str]]:
+        return iter(self)
+
+    def __contains__(self, path: str) -> bool:
+        return path in self._positions
+
+    def paths(self) -> List[str]:
+        return [entry[0] for entry in self._entries]
+
+    def read(self, path: str) -> str:
+        return self._read(self._entries[self._positions[path]])
+
+    def hashes(self) -> Dict[str, str]:
+        """path -> content hash, computed while the files were added (no re-read)"""
+        return {entry[0]: entry[3] for entry in self._entries}
+
+    def content_lengths(self) -> List[int]:
+        """Byte length of each file's content, in order (no re-read)"""
+        return [entry[2] for entry in self._entries]
+
+    def total_bytes(self) -> int:
+        return sum(entry[2] for entry in self._entries)
+
+    # --- Checkpointing ---
+    def to_state(self) -> Dict[str, Any]:
+        return {"file_corpus": self.directory}
+
+    @staticmethod
+    def is_state(value: Any) -> bool:
+        return isinstance(value, dict) and "file_corpus" in value
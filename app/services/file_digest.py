@@ -0,0 +1,161 @@
+# app/services/file_digest.py
+import os
+import re
+import ast
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from app import config
+from app.llm.cache import PersistentCache
+from app.llm.tokens import estimate_tokens
+from app.services.manifest import hash_content
+
+# Bump when the digest format changes, so cached digests of the old format are not reused
+DIGEST_VERSION = 1
+
+_cache: Optional[PersistentCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_digest_cache() -> PersistentCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = PersistentCache(config.FILE_DIGEST_CACHE_PATH, max_entries=config.FILE_DIGEST_CACHE_MAX_ENTRIES)
+        return _cache
+
+
+def _first_line(docstring: Optional[str]) -> str:
+    return docstring.strip().splitlines()[0].strip() if docstring and docstring.strip() else ""
+
+
+def _python_skeleton(content: str) -> List[str]:
+    """Imports, constants, classes and function signatures with the first line of their docstrings."""
+    tree = ast.parse(content)
+    lines = []
+    doc = _first_line(ast.get_docstring(tree))
+    if doc:
+        lines.append(f'"""{doc}"""')
+
+    imports = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            imports += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            names = ", ".join(alias.name for alias in node.names)
+            imports.append(f"{'.' * node.level}{node.module or ''} ({names})")
+    if imports:
+        lines.append(f"imports: {'; '.join(imports)}")
+
+    def signature(node, indent=""):
+        prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+        returns = f" -> {ast.unparse(node.returns)}" if node.returns else ""
+        lines.append(f"{indent}{prefix} {node.name}({ast.unparse(node.args)}){returns}")
+        doc = _first_line(ast.get_docstring(node))
+        if doc:
+            lines.append(f'{indent}    """{doc}"""')
+
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            signature(node)
+        elif isinstance(node, ast.ClassDef):
+            bases = ", ".join(ast.unparse(base) for base in node.bases)
+            lines.append(f"class {node.name}({bases}):" if bases else f"class {node.name}:")
+            doc = _first_line(ast.get_docstring(node))
+            if doc:
+                lines.append(f'    """{doc}"""')
+            for child in node.body:
+                if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    signature(child, indent="    ")
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            names = [t.id for t in targets if isinstance(t, ast.Name)]
+            if names:
+                lines.append(f"{', '.join(names)} = ...")
+    return lines
+
+
+# Declarations worth keeping in C-like / JS / Go / Java sources
+_DECLARATION = re.compile(
+    r"^\s*(export\s+)?(default\s+)?(abstract\s+)?(async\s+)?"
+    r"(import|from|package|#include|using|module|function|class|interface|type|enum|struct|func|def|"
+    r"public|private|protected|internal|static|const\s+\w+\s*=\s*(async\s*)?\(|(let|var|const)\s+\w+\s*=\s*require)\b"
+)
+
+
+def _generic_skeleton(content: str) -> List[str]:
+    lines = []
+    for line in content.splitlines():
+        if _DECLARATION.match(line):
+            lines.append(line.rstrip().rstrip("{").rstrip())
+    return lines
+
+
+def _markdown_outline(content: str) -> List[str]:
+    """Headings, each with the first line of text under it."""
+    lines, want_text = [], False
+    for line in content.splitlines():
+        stripped = line.strip()
+        if stripped.startswith("#"):
+            lines.append(stripped)
+            want_text = True
+        elif want_text and stripped and not stripped.startswith(("```", "|", "<")):
+            lines.append(f"  {stripped}")
+            want_text = False
+    return lines
+
+
+def _config_outline(content: str) -> List[str]:
+    """Top-level keys (YAML), instructions (Dockerfile) or targets (Makefile)."""
+    pattern = re.compile(r"^([A-Za-z_][\w.\-]*\s*:|[A-Z]+\s|[\w.\-/]+\s*:(?!=))")
+    return [line.rstrip() for line in content.splitlines() if pattern.match(line)]
+
+
+def digest_file(path: str, content: str, max_chars: Optional[int] = None) -> str:
+    """
+    Compact skeleton of a file for LLM context: signatures and docstrings for code,
+    headings for docs, top-level keys for config. Falls back to the head of the file, and
+    returns the content itself when the digest would not be shorter.
+    """
+    max_chars = max_chars or config.FILE_DIGEST_MAX_CHARS
+    ext = os.path.splitext(path)[1].lower()
+    name = os.path.basename(path)
+    try:
+        if ext in (".py", ".pyi"):
+            lines = _python_skeleton(content)
+        elif ext in (".md", ".rst"):
+            lines = _markdown_outline(content)
+        elif ext in (".yaml", ".yml") or name.endswith(("Dockerfile", "Makefile")):
+            lines = _config_outline(content)
+        else:
+            lines = _generic_skeleton(content)
+    except (SyntaxError, ValueError):
+        lines = _generic_skeleton(content)
+    if not lines:
+        lines = content.splitlines()[:20]
+
+    total_lines = content.count("\n") + 1
+    digest = f"[digest of {total_lines} lines]\n" + "\n".join(line[:200] for line in lines)
+    if len(digest) > max_chars:
+        digest = digest[:max_chars].rsplit("\n", 1)[0] + "\n..."
+    return digest if len(digest) < len(content) else content
+
+
+def digest_files(files: List[Tuple[str, str]], file_hashes: Optional[Dict[str, str]] = None) -> List[str]:
+    """Digests for `files` (in the same order), reusing cached digests of unchanged contents."""
+    cache = get_digest_cache()
+    digests = []
+    for path, content in files:
+        content_hash = (file_hashes or {}).get(path) or hash_content(content)
+        kind = os.path.splitext(path)[1] or os.path.basename(path)  # The digest format depends on the file type
+        key = PersistentCache.make_key("file_digest", DIGEST_VERSION, config.FILE_DIGEST_MAX_CHARS, kind, content_hash)
+        digest = cache.get(key)
+        if digest is None:
+            digest = digest_file(path, content)
+            cache.set(key, digest)
+        digests.append(digest)
+    return digests
+
+
+def context_tokens(files: List[Tuple[str, str]]) -> int:
+    return sum(estimate_tokens(content) for _, content in files)
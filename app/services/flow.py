@@ -1,37 +1,100 @@
+import copy
+import logging
+from contextlib import nullcontext
 from pocketflow import Flow
 # Import all node classes from nodes.py
 from app.services.nodes import (
     FetchRepo,
+    DigestFiles,
+    PlanRefresh,
+    IndexCode,
     IdentifyAbstractions,
     AnalyzeRelationships,
     OrderChapters,
     WriteChapters,
     CombineTutorial,
-    EmbedAndStore
+    EmbedAndStore,
+    stop_code_indexing,
 )
 
+class ResumableFlow(Flow):
+    """
+    Flow that records each completed node in `shared["checkpoint"]` (a FlowCheckpoint, if present)
+    and, on a re-run, restores the saved state and skips the nodes that already completed.
+    Each node also runs as a stage of `shared["profiler"]` (a RunProfiler, if present).
+    """
+
+    def _orch(self, shared, params=None):
+        checkpoint = shared.get("checkpoint")
+        profiler = shared.get("profiler")
+        logger = shared.get("logger", logging.getLogger(__name__))
+        if checkpoint is not None and checkpoint.completed_nodes:
+            checkpoint.restore(shared)
+            if checkpoint.completed_nodes:  # Empty if the saved state could not be restored
+                logger.info(f"Resuming from checkpoint; completed steps: {', '.join(checkpoint.completed_nodes)}")
+
+        curr, p, last_action = copy.copy(self.start_node), (params or {**self.params}), None
+        try:
+            while curr:
+                curr.set_params(p)
+                node_name = type(curr).__name__
+                if checkpoint is not None and checkpoint.is_completed(node_name) and self._can_skip(curr, shared):
+                    logger.info(f"Skipping {node_name}: already completed in a previous attempt.")
+                    last_action = checkpoint.action_for(node_name)
+                    if profiler is not None:
+                        profiler.skipped(node_name)
+                else:
+                    with profiler.stage(node_name) if profiler is not None else nullcontext():
+                        last_action = curr._run(shared)
+                    if checkpoint is not None:
+                        checkpoint.mark_completed(node_name, shared, last_action)
+                curr = copy.copy(self.get_next_node(curr, last_action))
+        except BaseException:
+            stop_code_indexing(shared, logger)  # Not left writing to the vector store behind the retry
+            raise
+        return last_action
+
+    @staticmethod
+    def _can_skip(node, shared):
+        # A node may depend on work that outlives it (IndexCode's background job) and only be
+        # skippable once that work is done
+        completed_in = getattr(node, "completed_in", None)
+        return completed_in is None or completed_in(shared)
+
+
 def create_tutorial_flow():
     """Creates and returns the codebase tutorial generation flow."""
 
     # Instantiate nodes
     fetch_repo = FetchRepo()
+    digest_files = DigestFiles()
+    plan_refresh = PlanRefresh()
+    index_code = IndexCode()  # Embeds code in the background while the LLM stages run
     
-    identify_abstractions = IdentifyAbstractions(max_retries=5, wait=20)
-    analyze_relationships = AnalyzeRelationships(max_retries=5, wait=20)
-    order_chapters = OrderChapters(max_retries=5, wait=20)
-    write_chapters = WriteChapters(max_retries=5, wait=20) # This is a BatchNode
+    # Rate limits (429) are absorbed by the LLM scheduler, so node retries only
+    # need a short pause for transient errors and invalid LLM output.
+    identify_abstractions = IdentifyAbstractions(max_retries=5, wait=5)
+    analyze_relationships = AnalyzeRelationships(max_retries=5, wait=5)
+    order_chapters = OrderChapters(max_retries=5, wait=5)
+    write_chapters = WriteChapters(max_retries=5, wait=5) # This is a BatchNode
     combine_tutorial = CombineTutorial()
     embed_and_store = EmbedAndStore() 
 
     # Connect nodes in sequence based on the design
-    fetch_repo >> identify_abstractions
+    fetch_repo >> digest_files
+    digest_files >> plan_refresh
+    plan_refresh >> index_code
+    plan_refresh - "refresh" >> index_code
+    index_code >> identify_abstractions
+    # Refresh mode reuses the previous abstractions/relationships/order and only rewrites affected chapters
+    index_code - "refresh" >> write_chapters
     identify_abstractions >> analyze_relationships
     analyze_relationships >> order_chapters
     order_chapters >> write_chapters
     write_chapters >> combine_tutorial
-    combine_tutorial >> embed_and_store 
+    combine_tutorial >> embed_and_store  # Joins the code indexing branch and embeds the chapters
 
     # Create the flow starting with FetchRepo
-    tutorial_flow = Flow(start=fetch_repo)
+    tutorial_flow = ResumableFlow(start=fetch_repo)
 
     return tutorial_flow
@@ -0,0 +1,157 @@
+# app/services/ingestion.py
+"""
+Streaming ingestion of chunks into a repository's Chroma collection.
+
+Chunks are added as they are produced (file by file). Every `batch_size` of them form a batch
+that a pool of `concurrency` threads checks against the collection (chunks already stored under
+their deterministic id are skipped), embeds in one request and upserts right away, so the first
+chunks are searchable while the rest are still being embedded. The batch also goes into the
+repository's lexical (BM25) index.
+
+- Backpressure: at most 2 x concurrency batches are pending; beyond that `add` blocks, so the
+  chunking never runs far ahead of the embedding (and memory stays bounded on large repositories).
+- Progress: chunks/sec is logged every PROGRESS_SECONDS through the run's logger.
+- The first failed batch stops the rest; its exception is raised by `add` or `close`.
+"""
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, List, Optional, Tuple
+
+from app.utils.profiling import add_bytes
+
+PROGRESS_SECONDS = 5.0
+
+
+class ChunkIngestor:
+    def __init__(
+        self,
+        collection: Any,
+        embedder: Any,
+        logger: Any,
+        batch_size: int = 256,
+        concurrency: int = 4,
+        label: str = "chunks",
+        on_write: Optional[Callable[[], None]] = None,
+        lexical: Optional[Any] = None,
+    ):
+        self.collection = collection  # A chromadb Collection
+        self.lexical = lexical  # A LexicalIndex kept in step with the collection; closed with the ingestor
+        self.embedder = embedder
+        self.logger = logger
+        self.batch_size = max(1, batch_size)
+        self.label = label
+        self.on_write = on_write  # Called (throttled) after writes, e.g. to invalidate pooled query-side stores
+        self.ids: List[str] = []
+        self.chunks = 0  # Chunks processed
+        self.embedded = 0  # ... of which were not stored yet and got embedded
+        self._embedded_bytes = 0
+        self._pending: List[Tuple[str, Any]] = []
+        self._futures = []
+        self._pool = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="embed")
+        self._slots = threading.BoundedSemaphore(2 * max(1, concurrency))
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._error: Optional[BaseException] = None
+        self._unreported_writes = False
+        self._started = self._last_report = time.perf_counter()
+
+    def __enter__(self) -> "ChunkIngestor":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:  # The producer failed: drop what is pending, let running batches end
+            with self._lock:
+                self._error = self._error or exc
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._close_lexical()
+
+    # --- Producer side ---
+    def add(self, ids: List[str], docs: List[Any]) -> None:
+        self._raise_error()
+        for chunk_id, doc in zip(ids, docs):
+            self._pending.append((chunk_id, doc))
+            self.ids.append(chunk_id)
+            if len(self._pending) >= self.batch_size:
+                self._submit()
+
+    def close(self) -> Tuple[List[str], int]:
+        """Embeds and writes what is left, waits for every batch; returns (ids, number of chunks embedded)"""
+        try:
+            if self._pending and self._error is None:
+                self._submit()
+            wait(self._futures)
+        finally:
+            self._pool.shutdown(wait=True)
+            self._close_lexical()
+        self._raise_error()
+        add_bytes(self._embedded_bytes)  # In the caller's thread, so it counts for the current profiling stage
+        if self._unreported_writes and self.on_write:
+            self.on_write()
+        elapsed = time.perf_counter() - self._started
+        if self.chunks:
+            self.logger.info(
+                f"Stored {self.chunks} {self.label} chunks in {elapsed:.1f}s ({self.chunks / max(elapsed, 1e-6):.0f} chunks/s): "
+                f"{self.embedded} embedded, {self.chunks - self.embedded} already stored."
+            )
+        return self.ids, self.embedded
+
+    def _close_lexical(self) -> None:
+        if self.lexical is not None:
+            self.lexical.close()  # Its connections belong to the (finished) embed threads
+
+    def _submit(self) -> None:
+        batch, self._pending = self._pending, []
+        self._slots.acquire()  # Blocks while too many batches are pending
+        self._futures = [f for f in self._futures if not f.done()]
+        self._futures.append(self._pool.submit(self._run, batch))
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            raise self._error
+
+    # --- Worker side ---
+    def _run(self, batch: List[Tuple[str, Any]]) -> None:
+        try:
+            if self._error is not None:
+                return
+            stored = set(self.collection.get(ids=[chunk_id for chunk_id, _ in batch], include=[])["ids"])
+            new = [(chunk_id, doc) for chunk_id, doc in batch if chunk_id not in stored]
+            if new:
+                embeddings = self.embedder.embed_documents([doc.page_content for _, doc in new])
+                with self._write_lock:
+                    self.collection.upsert(
+                        ids=[chunk_id for chunk_id, _ in new],
+                        embeddings=embeddings,
+                        documents=[doc.page_content for _, doc in new],
+                        metadatas=[doc.metadata for _, doc in new],
+                    )
+            if self.lexical is not None:
+                # Every chunk, not only the new ones: fills the index of stores built before it existed
+                with self._write_lock:
+                    self.lexical.add((chunk_id, doc.metadata, doc.page_content) for chunk_id, doc in batch)
+            with self._lock:
+                self.chunks += len(batch)
+                self.embedded += len(new)
+                self._embedded_bytes += sum(len(doc.page_content) for _, doc in new)
+                self._unreported_writes = self._unreported_writes or bool(new)
+                report = time.perf_counter() - self._last_report >= PROGRESS_SECONDS
+                if report:
+                    self._last_report = time.perf_counter()
+                    chunks, embedded, writes = self.chunks, self.embedded, self._unreported_writes
+                    self._unreported_writes = False
+            if report:
+                elapsed = time.perf_counter() - self._started
+                self.logger.info(
+                    f"Embedding {self.label}: {chunks} chunks done ({embedded} embedded), "
+                    f"{chunks / elapsed:.0f} chunks/s."
+                )
+                if writes and self.on_write:
+                    self.on_write()
+        except BaseException as e:
+            with self._lock:
+                self._error = self._error or e
+        finally:
+            self._slots.release()
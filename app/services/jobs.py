@@ -0,0 +1,418 @@
+# app/services/jobs.py
+"""
+Bounded background job scheduler for long-running work (tutorial generation).
+
+Jobs are queued by priority and run on a fixed pool of dedicated worker threads, so a burst
+of generation requests neither spawns unbounded threads nor occupies the default executor
+that request handlers (e.g. /query) use for `asyncio.to_thread`.
+
+A job publishes events (log lines as strings, structured events as dicts); any number of
+subscribers can follow a job, and late subscribers get the history replayed first. The jobs'
+`on_event` callbacks (the run registry's SQLite writes) run in order on one writer thread, so a
+slow write never holds up publishers or the event loop's subscribers.
+
+In "process" mode the job targets run in a pool of worker processes instead (one per worker
+thread), so CPU-heavy flow steps don't compete with request handling for the GIL. Their
+events are sent back over a multiprocessing queue and published from the API process. Their
+LLM calls take their slots from the API process's scheduler over the same queue (grants come
+back on a queue per worker), so the rate limits and concurrency cap are shared, not multiplied.
+"""
+import time
+import uuid
+import heapq
+import asyncio
+import logging
+import threading
+import contextvars
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from collections import OrderedDict, deque
+from queue import SimpleQueue
+from typing import Any, AsyncGenerator, Callable, Deque, Dict, List, Optional, Tuple, Union
+
+from app import config
+from app.llm.scheduler import RemoteScheduler, SchedulerHost, get_scheduler, set_scheduler
+
+Event = Union[str, Dict[str, Any]]
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+FINISHED_STATES = (SUCCEEDED, FAILED)
+
+_END = object()  # Sentinel closing subscriber streams
+
+
+class _EventWriter:
+    """Calls the jobs' `on_event` callbacks, in publishing order, on a single background thread."""
+
+    def __init__(self):
+        self._queue: "SimpleQueue[Tuple[Any, int, Any]]" = SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def put(self, job: "Job", seq: int, event: Event) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="job-event-writer", daemon=True)
+                self._thread.start()
+        self._queue.put((job, seq, event))
+
+    def flush(self) -> None:
+        """Blocks until every event queued so far has been written."""
+        written = threading.Event()
+        self.put(None, -1, written)
+        written.wait()
+
+    def _loop(self) -> None:
+        while True:
+            job, seq, event = self._queue.get()
+            if job is None:
+                event.set()  # A flush marker
+                continue
+            try:
+                job.on_event(seq, event)
+            except Exception as e:
+                logging.warning(f"Could not record event of job {job.id}: {e}")
+
+
+_event_writer = _EventWriter()
+
+
+class Job:
+    def __init__(self, kind: str, key: str, target: Callable[["Job"], Any], priority: int = 0,
+                 params: Optional[Dict[str, Any]] = None, history_limit: int = 5000,
+                 job_id: Optional[str] = None, on_event: Optional[Callable[[int, Event], None]] = None,
+                 on_finish: Optional[Callable[["Job"], None]] = None):
+        self.id = job_id or uuid.uuid4().hex
+        self.kind = kind
+        self.key = key  # Jobs with the same key are not run twice concurrently (e.g. one per repo)
+        self.priority = priority  # Higher runs first
+        self.params = params or {}
+        self.target = target
+        self.status = QUEUED
+        self.error: Optional[str] = None
+        self.result: Any = None
+        self.progress: Dict[str, Any] = {"last_message": None}
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+        self.on_event = on_event  # Called with (sequence number, event) for every published event
+        self.on_finish = on_finish  # Called once the job has finished, before its streams close
+
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._history: Deque[Event] = deque(maxlen=history_limit)
+        self._subscribers: List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = []
+
+    # --- Events ---
+    def publish(self, event: Event) -> None:
+        """Records an event and forwards it to every subscriber (callable from any thread)."""
+        with self._lock:
+            self._history.append(event)
+            if isinstance(event, str):
+                self.progress["last_message"] = event
+            subscribers = list(self._subscribers)
+            seq, self._seq = self._seq, self._seq + 1
+            if self.on_event is not None:
+                # Queued under the lock, so events are recorded in order; written by the writer thread
+                _event_writer.put(self, seq, event)
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+
+    def update_progress(self, **fields: Any) -> None:
+        with self._lock:
+            self.progress.update(fields)
+
+    def _close(self) -> None:
+        with self._lock:
+            subscribers, self._subscribers = self._subscribers, []
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(queue.put_nowait, _END)
+
+    async def subscribe(self) -> AsyncGenerator[Event, None]:
+        """Yields the job's events so far, then live events until the job finishes."""
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        with self._lock:
+            history = list(self._history)
+            finished = self.status in FINISHED_STATES
+            if not finished:
+                self._subscribers.append((loop, queue))
+        for event in history:
+            yield event
+        if finished:
+            return
+        try:
+            while True:
+                event = await queue.get()
+                if event is _END:
+                    return
+                yield event
+        finally:
+            with self._lock:
+                if (loop, queue) in self._subscribers:
+                    self._subscribers.remove((loop, queue))
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            progress = dict(self.progress)
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "key": self.key,
+            "priority": self.priority,
+            "params": self.params,
+            "status": self.status,
+            "error": self.error,
+            "progress": progress,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class _ChildJob:
+    """Stand-in for a Job inside a pool process: same id and params; events go back over a queue."""
+
+    def __init__(self, job_id: str, params: Dict[str, Any], events):
+        self.id = job_id
+        self.params = params
+        self._events = events
+
+    def publish(self, event: Event) -> None:
+        self._events.put((self.id, "event", event))
+
+    def update_progress(self, **fields: Any) -> None:
+        self._events.put((self.id, "progress", fields))
+
+
+_child_events = None  # The event queue, inherited by each pool process at startup
+
+
+def _init_child(events, replies, free_indices, generation) -> None:
+    global _child_events
+    _child_events = events
+    # Each worker claims its own queue for slot grants, then routes its LLM calls to the parent
+    index = free_indices.get()
+    set_scheduler(RemoteScheduler(
+        lambda kind, payload: events.put(((generation, index), kind, payload)), replies[index],
+    ))
+
+
+def _run_in_child(target: Callable, job_id: str, params: Dict[str, Any]) -> Any:
+    job = _ChildJob(job_id, params, _child_events)
+    try:
+        return target(job)
+    except Exception as e:
+        # Re-raise as a plain error: arbitrary exceptions may not survive pickling back to the parent
+        raise RuntimeError(f"{type(e).__name__}: {e}") from None
+    finally:
+        _child_events.put((job_id, "done", None))
+
+
+class JobManager:
+    """Priority queue + fixed pool of worker threads; keeps the most recent finished jobs for inspection."""
+
+    def __init__(self, max_workers: int = 2, history_size: int = 100, mode: str = "thread"):
+        self.max_workers = max(1, max_workers)
+        self.history_size = history_size
+        self.mode = mode  # "thread": run targets on the worker threads; "process": in a process pool
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._events = None
+        self._pool_generation = 0
+        self._scheduler_host: Optional[SchedulerHost] = None  # Serves the worker processes' LLM slots
+        self._child_done: Dict[str, threading.Event] = {}
+        self._cond = threading.Condition()
+        self._queue: List[Tuple[int, int, Job]] = []  # (-priority, sequence, job)
+        self._sequence = 0
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._active_by_key: Dict[str, Job] = {}
+        self._running = 0
+        self._threads: List[threading.Thread] = []
+
+    def _ensure_workers(self) -> None:
+        # Started on first use, so importing the module has no side effects
+        if self._threads:
+            return
+        for i in range(self.max_workers):
+            thread = threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, kind: str, key: str, target: Callable[[Job], Any], priority: int = 0,
+               params: Optional[Dict[str, Any]] = None, **job_options: Any) -> Tuple[Job, bool]:
+        """
+        Queues `target(job)` to run on a worker thread. If a job with the same key is already
+        queued or running, returns that job instead. Returns (job, created).
+        `job_options` (job_id, on_event, on_finish) are passed to the Job.
+        """
+        with self._cond:
+            existing = self._active_by_key.get(key)
+            if existing is not None:
+                return existing, False
+            job = Job(kind, key, target, priority, params, **job_options)
+            self._jobs[job.id] = job
+            self._active_by_key[key] = job
+            heapq.heappush(self._queue, (-priority, self._sequence, job))
+            self._sequence += 1
+            self._trim_history()
+            self._ensure_workers()
+            self._cond.notify()
+        logging.info(f"Queued {kind} job {job.id} for {key} (priority {priority}, {len(self._queue)} queued).")
+        return job, True
+
+    def _trim_history(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in FINISHED_STATES]
+        for job_id in finished[: max(0, len(finished) - self.history_size)]:
+            del self._jobs[job_id]
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                _, _, job = heapq.heappop(self._queue)
+                self._running += 1
+                job.status = RUNNING
+                job.started_at = time.time()
+            try:
+                if self.mode == "process":
+                    job.result = self._run_in_process(job)
+                else:
+                    # A fresh context per job, so contextvars set by one job never leak into the next
+                    job.result = contextvars.Context().run(job.target, job)
+                job.status = SUCCEEDED
+            except Exception as e:
+                logging.error(f"{job.kind} job {job.id} for {job.key} failed: {e}", exc_info=True)
+                job.error = str(e)
+                job.status = FAILED
+            finally:
+                job.finished_at = time.time()
+                with self._cond:
+                    self._running -= 1
+                    if self._active_by_key.get(job.key) is job:
+                        del self._active_by_key[job.key]
+                if job.on_event is not None:
+                    _event_writer.flush()  # Every event is recorded before the run is marked finished
+                if job.on_finish is not None:
+                    try:
+                        job.on_finish(job)
+                    except Exception as e:
+                        logging.warning(f"on_finish of job {job.id} failed: {e}")
+                job._close()
+
+    # --- Process mode ---
+    def _get_pool(self) -> Tuple[ProcessPoolExecutor, int]:
+        with self._cond:
+            if self._pool is None:
+                # "spawn": forking a process that runs threads (uvicorn, LLM scheduler) is unsafe
+                ctx = multiprocessing.get_context("spawn")
+                if self._events is None:
+                    self._events = ctx.Queue()
+                    self._scheduler_host = SchedulerHost(get_scheduler())
+                    threading.Thread(target=self._pump_events, name="job-events", daemon=True).start()
+                self._pool_generation += 1
+                replies = [ctx.Queue() for _ in range(self.max_workers)]
+                free_indices = ctx.Queue()
+                for index in range(self.max_workers):
+                    free_indices.put(index)
+                self._scheduler_host.open(self._pool_generation, replies)
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=ctx, initializer=_init_child,
+                    initargs=(self._events, replies, free_indices, self._pool_generation),
+                )
+            return self._pool, self._pool_generation
+
+    def _close_pool(self, pool: ProcessPoolExecutor, generation: int, **shutdown: Any) -> None:
+        pool.shutdown(**shutdown)
+        # Slots its workers held (or were waiting for) would otherwise never be released
+        self._scheduler_host.close(generation)
+
+    def _run_in_process(self, job: Job) -> Any:
+        pool, generation = self._get_pool()
+        done = threading.Event()
+        self._child_done[job.id] = done
+        try:
+            return pool.submit(_run_in_child, job.target, job.id, job.params).result()
+        except BrokenProcessPool:
+            # A worker process died (e.g. killed for memory); start a fresh pool for the next jobs
+            with self._cond:
+                if self._pool is pool:
+                    self._pool = None
+            self._close_pool(pool, generation, wait=False)
+            done.set()
+            raise
+        finally:
+            # Let the pump forward the job's last events before the job (and its streams) are closed
+            done.wait(timeout=10)
+            self._child_done.pop(job.id, None)
+
+    def _pump_events(self) -> None:
+        while True:
+            job_id, kind, payload = self._events.get()
+            if kind.startswith("llm_"):
+                self._scheduler_host.handle(job_id, kind, payload)  # job_id: the sending worker
+                continue
+            if kind == "done":
+                done = self._child_done.get(job_id)
+                if done is not None:
+                    done.set()
+                continue
+            job = self.get(job_id)
+            if job is None:
+                continue
+            if kind == "event":
+                job.publish(payload)
+            elif kind == "progress":
+                job.update_progress(**payload)
+
+    def shutdown(self) -> None:
+        """Stops the worker processes (process mode); queued jobs are dropped with the process."""
+        with self._cond:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            self._close_pool(pool, self._pool_generation, wait=False, cancel_futures=True)
+
+    # --- Inspection ---
+    def find_active(self, key: str) -> Optional[Job]:
+        """The queued or running job for `key`, if any."""
+        with self._cond:
+            return self._active_by_key.get(key)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._cond:
+            jobs = list(self._jobs.values())
+        return [job.to_dict() for job in reversed(jobs)]  # Newest first
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            stats = {
+                "mode": self.mode,
+                "max_workers": self.max_workers,
+                "running": self._running,
+                "queued": len(self._queue),
+            }
+        if self._scheduler_host is not None:
+            # The worker processes' calls also show up in the LLM scheduler's own stats
+            stats.update(self._scheduler_host.stats())
+        return stats
+
+
+_manager: Optional[JobManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager(config.JOB_MAX_CONCURRENCY, config.JOB_HISTORY_SIZE, config.JOB_EXECUTION_MODE)
+        return _manager
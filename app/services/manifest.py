@@ -0,0 +1,96 @@
+# app/services/manifest.py
+import os
+import json
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def hash_content(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8", errors="surrogatepass")).hexdigest()
+
+
+def file_paths(files) -> List[str]:
+    """Paths of a list of (path, content) pairs or a FileCorpus, without reading any content"""
+    if hasattr(files, "paths"):
+        return files.paths()
+    return [path for path, _ in files]
+
+
+def save_manifest(path: str, shared: Dict[str, Any]) -> None:
+    """
+    Records what a successful run was built from (file hashes) and what it produced,
+    so a later refresh can regenerate only the parts whose inputs changed.
+    """
+    manifest = {
+        "file_hashes": shared.get("file_hashes", {}),
+        "files": file_paths(shared.get("files", [])),
+        "abstractions": shared.get("abstractions", []),
+        "relationships": shared.get("relationships", {}),
+        "chapter_order": shared.get("chapter_order", []),
+        "chapters": shared.get("chapters", []),
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+
+def load_manifest(path: str) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring unreadable manifest {path}: {e}")
+        return None
+
+
+def plan_refresh(manifest: Dict[str, Any], files: List[Tuple[str, str]], file_hashes: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Diffs the current crawl against the previous run's manifest.
+
+    Returns the previous abstractions with `files` re-pointed at the new file indices
+    (deleted files dropped), the unchanged chapters that can be reused as-is
+    (keyed by chapter number, as strings so the plan survives JSON checkpoints),
+    and the changed/added/deleted paths for the vector store update.
+    """
+    old_hashes = manifest.get("file_hashes", {})
+    changed = sorted(p for p, h in file_hashes.items() if p in old_hashes and old_hashes[p] != h)
+    added = sorted(p for p in file_hashes if p not in old_hashes)
+    deleted = sorted(p for p in old_hashes if p not in file_hashes)
+    touched = set(changed) | set(deleted)
+
+    old_paths = manifest.get("files", [])
+    new_index = {path: i for i, path in enumerate(file_paths(files))}
+
+    abstractions = []
+    affected = set()
+    for a_idx, abstraction in enumerate(manifest.get("abstractions", [])):
+        paths = [old_paths[i] for i in abstraction["files"] if 0 <= i < len(old_paths)]
+        if touched.intersection(paths):
+            affected.add(a_idx)
+        abstractions.append({
+            **abstraction,
+            "files": sorted(new_index[p] for p in paths if p in new_index),
+        })
+
+    chapter_order = manifest.get("chapter_order", [])
+    chapters = manifest.get("chapters", [])
+    reuse_chapters = {
+        str(num + 1): chapters[num]
+        for num, a_idx in enumerate(chapter_order)
+        if a_idx not in affected and num < len(chapters)
+    }
+
+    return {
+        "changed_paths": changed,
+        "added_paths": added,
+        "deleted_paths": deleted,
+        "affected_abstractions": sorted(affected),
+        "abstractions": abstractions,
+        "relationships": manifest.get("relationships", {}),
+        "chapter_order": chapter_order,
+        "reuse_chapters": reuse_chapters,
+    }
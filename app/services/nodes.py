@@ -1,13 +1,27 @@
 import os
 import re
+import copy
+import time
 import yaml
 import asyncio
+import threading
+import contextvars
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, wait
 from pocketflow import Node, BatchNode
 from app.utils.crawl_github_files import crawl_github_files
 from app.utils.crawl_local_files import crawl_local_files
 from app.llm.call_llm import call_llm
+from app.llm.tokens import estimate_tokens
 from app.llm.embedder import get_embedding,get_embedding_vector
-from app.repositories.vector_store import ChromaVectorStore  
+from app.repositories.vector_store import ChromaVectorStore, get_vector_store_registry
+from app.repositories.lexical_index import LexicalIndex
+from app.services.chapter_digest import ChapterDigest
+from app.services.manifest import hash_content, plan_refresh, file_paths
+from app.services.file_corpus import FileCorpus
+from app.services.file_digest import digest_files, context_tokens
+from app.services.ingestion import ChunkIngestor
+from app.utils.profiling import add_bytes
 
 from langchain.text_splitter import RecursiveCharacterTextSplitter, MarkdownTextSplitter, Language
 from langchain_community.vectorstores import Chroma
@@ -31,6 +45,17 @@ def get_content_for_indices(files_data, indices):
     return content_map
 
 
+def get_context_files(shared):
+    """
+    Files as they should appear in overview prompts: (path, digest) pairs when digests were built
+    (file_context == "digest"), otherwise the full (path, content) pairs. Indices are the same.
+    """
+    digests = shared.get("file_digests")
+    if not digests:
+        return shared["files"]
+    return list(zip(file_paths(shared["files"]), digests))
+
+
 class FetchRepo(Node):
     def prep(self, shared):
         self.logger = shared.get("logger", logging.getLogger(__name__)) 
@@ -59,9 +84,26 @@ class FetchRepo(Node):
             "exclude_patterns": exclude_patterns,
             "max_file_size": max_file_size,
             "use_relative_paths": True,
+            "github_api_url": shared.get("github_api_url", "https://api.github.com"),
+            "github_fetch_mode": shared.get("github_fetch_mode", "tarball"),
+            "github_download_concurrency": shared.get("github_download_concurrency", 8),
+            "mirror_cache": shared.get("mirror_cache"),
+            "local_crawl_workers": shared.get("local_crawl_workers", 1),
+            "corpus_dir": shared.get("corpus_dir"),
         }
 
     def exec(self, prep_res):
+        # With a corpus directory, the crawlers write each file to an on-disk FileCorpus as they
+        # go, instead of the whole repository staying in memory for the rest of the run
+        corpus = FileCorpus.create(prep_res["corpus_dir"]) if prep_res["corpus_dir"] else None
+        try:
+            return self._crawl(prep_res, corpus)
+        except Exception:
+            if corpus is not None:
+                corpus.close()
+            raise
+
+    def _crawl(self, prep_res, corpus):
         if prep_res["repo_url"]:
             self.logger.info(f"Crawling repository: {prep_res['repo_url']}...")
             result = crawl_github_files(
@@ -71,6 +113,11 @@ class FetchRepo(Node):
                 exclude_patterns=prep_res["exclude_patterns"],
                 max_file_size=prep_res["max_file_size"],
                 use_relative_paths=prep_res["use_relative_paths"],
+                api_url=prep_res["github_api_url"],
+                fetch_mode=prep_res["github_fetch_mode"],
+                max_workers=prep_res["github_download_concurrency"],
+                mirror_cache=prep_res["mirror_cache"],
+                sink=corpus,
             )
         else:
             self.logger.info(f"Crawling directory: {prep_res['local_dir']}...")
@@ -80,67 +127,197 @@ class FetchRepo(Node):
                 include_patterns=prep_res["include_patterns"],
                 exclude_patterns=prep_res["exclude_patterns"],
                 max_file_size=prep_res["max_file_size"],
-                use_relative_paths=prep_res["use_relative_paths"]
+                use_relative_paths=prep_res["use_relative_paths"],
+                max_workers=prep_res["local_crawl_workers"],
+                sink=corpus,
             )
 
+        if corpus is not None:
+            if len(corpus) == 0:
+                raise (ValueError("Failed to fetch files"))
+            self.logger.info(f"Fetched {len(corpus)} files ({corpus.total_bytes()} bytes, stored in {corpus.directory}).")
+            add_bytes(corpus.total_bytes())
+            corpus.save()  # So a checkpointed run can reopen it
+            return corpus
+
         # Convert dict to list of tuples: [(path, content), ...]
         files_list = list(result.get("files", {}).items())
         if len(files_list) == 0:
             raise (ValueError("Failed to fetch files"))
         self.logger.info(f"Fetched {len(files_list)} files.")
+        add_bytes(sum(len(content) for _, content in files_list))
         return files_list
 
     def post(self, shared, prep_res, exec_res):
-        shared["files"] = exec_res  # List of (path, content) tuples
+        shared["files"] = exec_res  # FileCorpus, or a list of (path, content) tuples
+        if isinstance(exec_res, FileCorpus):
+            shared["file_hashes"] = exec_res.hashes()  # Hashed while crawling
+        else:
+            shared["file_hashes"] = {path: hash_content(content) for path, content in exec_res}
+
+
+class DigestFiles(Node):
+    """
+    Digest mode only (shared["file_context"] == "digest"): builds a compact skeleton of every file once,
+    cached by content hash across runs, so IdentifyAbstractions and AnalyzeRelationships don't
+    paste whole files into their prompts.
+    """
+
+    def prep(self, shared):
+        self.logger = shared.get("logger", logging.getLogger(__name__))
+        if shared.get("file_context", "full") != "digest":
+            return None
+        return shared["files"], shared.get("file_hashes")
+
+    def exec(self, prep_res):
+        if prep_res is None:
+            return None
+        return digest_files(*prep_res)
+
+    def post(self, shared, prep_res, exec_res):
+        if exec_res is None:
+            return
+        shared["file_digests"] = exec_res
+        full_tokens = context_tokens(shared["files"])
+        digest_tokens = context_tokens(get_context_files(shared))
+        self.logger.info(f"File digests: ~{digest_tokens} tokens instead of ~{full_tokens} for the full sources.")
+
+
+class PlanRefresh(Node):
+    """
+    Refresh mode only (shared["refresh_manifest"] set): diffs the fresh crawl against the previous
+    run's manifest, reuses its abstractions/relationships/order and every chapter whose files did not
+    change, and routes straight to WriteChapters. Otherwise the full pipeline runs.
+    """
+
+    def prep(self, shared):
+        self.logger = shared.get("logger", logging.getLogger(__name__))
+        manifest = shared.get("refresh_manifest")
+        if not manifest:
+            return None
+        return manifest, shared["files"], shared["file_hashes"]
+
+    def exec(self, prep_res):
+        if prep_res is None:
+            return None
+        return plan_refresh(*prep_res)
+
+    def post(self, shared, prep_res, exec_res):
+        if exec_res is None:
+            return "default"
+
+        self.logger.info(
+            f"Refresh: {len(exec_res['changed_paths'])} changed, {len(exec_res['added_paths'])} added, "
+            f"{len(exec_res['deleted_paths'])} deleted files; "
+            f"{len(exec_res['chapter_order']) - len(exec_res['reuse_chapters'])} of {len(exec_res['chapter_order'])} chapters to rewrite."
+        )
+        shared["abstractions"] = exec_res["abstractions"]
+        shared["relationships"] = exec_res["relationships"]
+        shared["chapter_order"] = exec_res["chapter_order"]
+        shared["refresh_plan"] = exec_res
+        return "refresh"
+
+
+def file_tokens(files_data):
+    """
+    Estimated tokens of each file's content. A FileCorpus answers from its index (byte lengths;
+    ~4 per token like estimate_tokens, a little over for non-ASCII text) without reading any file.
+    """
+    if hasattr(files_data, "content_lengths"):
+        return [length // 4 for length in files_data.content_lengths()]
+    return [estimate_tokens(content) for _, content in files_data]
+
+
+def shard_files(files_data, token_budget, tokens=None):
+    """
+    Splits file indices into shards whose context fits `token_budget` (estimated tokens).
+    Files are grouped by directory (sorted), so related files tend to land in the same shard.
+    `tokens`: file_tokens(files_data), if already computed.
+    """
+    paths = file_paths(files_data)
+    tokens = tokens if tokens is not None else file_tokens(files_data)
+    by_dir = {}
+    for i, path in enumerate(paths):
+        by_dir.setdefault(os.path.dirname(path), []).append(i)
+
+    shards, current, size = [], [], 0
+    for directory in sorted(by_dir):
+        for i in by_dir[directory]:
+            cost = min(tokens[i], token_budget) + estimate_tokens(paths[i]) + 10
+            if current and size + cost > token_budget:
+                shards.append(current)
+                current, size = [], 0
+            current.append(i)
+            size += cost
+    if current:
+        shards.append(current)
+    return shards
 
 
 class IdentifyAbstractions(Node):
+    """
+    Asks the LLM for the core abstractions of the codebase. When all files don't fit in
+    `identify_context_tokens`, runs map-reduce instead: candidates are identified per shard of
+    files (in parallel), then merged and deduplicated down to `max_abstraction_num`.
+    """
+
     def prep(self, shared):
         self.logger = shared.get("logger", logging.getLogger(__name__)) 
-        files_data = shared["files"]
+        files_data = get_context_files(shared)  # Full sources, or their digests in digest mode
         project_name = shared["project_name"]  # Get project name
         language = shared.get("language", "english")  # Get language
         use_cache = shared.get("use_cache", True)  # Get use_cache flag, default to True
         max_abstraction_num = shared.get("max_abstraction_num", 10)  # Get max_abstraction_num, default to 10
-
-        # Helper to create context from files, respecting limits (basic example)
-        def create_llm_context(files_data):
-            context = ""
-            file_info = []  # Store tuples of (index, path)
-            for i, (path, content) in enumerate(files_data):
-                entry = f"--- File Index {i}: {path} ---\n{content}\n\n"
-                context += entry
-                file_info.append((i, path))
-
-            return context, file_info  # file_info is list of (index, path)
-
-        context, file_info = create_llm_context(files_data)
-        # Format file info for the prompt (comment is just a hint for LLM)
-        file_listing_for_prompt = "\n".join(
-            [f"- {idx} # {path}" for idx, path in file_info]
-        )
+        context_budget = shared.get("identify_context_tokens", 100_000)
+        self.shard_concurrency = max(1, int(shared.get("identify_shard_concurrency", 4)))
+
+        # Sized from per-file estimates: the codebase is never concatenated just to measure it
+        paths = file_paths(files_data)
+        tokens = file_tokens(files_data)
+        context_size = sum(tokens[i] + estimate_tokens(path) + 10 for i, path in enumerate(paths))
+
+        context, file_listing_for_prompt, shards = None, None, None
+        if context_size > context_budget:
+            # Too big for one prompt: file indices per shard (global indices); each shard's context
+            # is built by the worker that sends it, so only a few are in memory at a time
+            shards = shard_files(files_data, context_budget, tokens)
+            self.logger.info(
+                f"Codebase context exceeds ~{context_budget} tokens; identifying abstractions in {len(shards)} shards."
+            )
+        else:
+            context, file_info = self._llm_context(files_data)
+            file_listing_for_prompt = self._format_listing(file_info)
         return (
             context,
             file_listing_for_prompt,
-            len(files_data),
+            files_data,
             project_name,
             language,
             use_cache,
             max_abstraction_num,
+            shards,
+            context_budget,
         )  # Return all parameters
 
-    def exec(self, prep_res):
-        (
-            context,
-            file_listing_for_prompt,
-            file_count,
-            project_name,
-            language,
-            use_cache,
-            max_abstraction_num,
-        ) = prep_res  # Unpack all parameters
-        self.logger.info(f"Identifying abstractions using LLM...")
+    @staticmethod
+    def _llm_context(files_data, indices=None, max_file_tokens=None):
+        """Context of the files (all, or `indices`), and the (index, path) of each"""
+        parts = []
+        file_info = []  # Store tuples of (index, path)
+        for i in indices if indices is not None else range(len(files_data)):
+            path, content = files_data[i]
+            if max_file_tokens and estimate_tokens(content) > max_file_tokens:
+                content = content[: max_file_tokens * 4] + "\n... (truncated)"
+            parts.append(f"--- File Index {i}: {path} ---\n{content}\n\n")
+            file_info.append((i, path))
+        return "".join(parts), file_info
+
+    @staticmethod
+    def _format_listing(file_info):
+        # Format file info for the prompt (comment is just a hint for LLM)
+        return "\n".join([f"- {idx} # {path}" for idx, path in file_info])
 
+    def _language_hints(self, language):
         # Add language instruction and hints only if not English
         language_instruction = ""
         name_lang_hint = ""
@@ -150,14 +327,17 @@ class IdentifyAbstractions(Node):
             # Keep specific hints here as name/description are primary targets
             name_lang_hint = f" (value in {language.capitalize()})"
             desc_lang_hint = f" (value in {language.capitalize()})"
+        return language_instruction, name_lang_hint, desc_lang_hint
 
-        prompt = f"""
+    def _identify_prompt(self, context, file_listing_for_prompt, project_name, language, max_abstraction_num, shard_note=""):
+        language_instruction, name_lang_hint, desc_lang_hint = self._language_hints(language)
+        return f"""
 For the project `{project_name}`:
 
 Codebase Context:
 {context}
 
-{language_instruction}Analyze the codebase context.
+{shard_note}{language_instruction}Analyze the codebase context.
 Identify the top 7-{max_abstraction_num} core most important abstractions to help those new to the codebase.
 
 For each abstraction, provide:
@@ -187,9 +367,34 @@ Format the output as a YAML list of dictionaries:
     - 5 # path/to/another.js
 # ... up to {max_abstraction_num} abstractions
 ```"""
-        response = call_llm(prompt, use_cache=(use_cache and self.cur_retry == 0))  # Use cache only if enabled and not retrying
 
-        # --- Validation ---
+    def _parse_indices(self, entries, count, key, item_name):
+        """Parses `idx # comment` entries and checks they are within range(count)."""
+        if not isinstance(entries, list):
+            raise ValueError(f"{key} is not a list in item: {item_name}")
+        validated_indices = []
+        for idx_entry in entries:
+            try:
+                if isinstance(idx_entry, int):
+                    idx = idx_entry
+                elif isinstance(idx_entry, str) and "#" in idx_entry:
+                    idx = int(idx_entry.split("#")[0].strip())
+                else:
+                    idx = int(str(idx_entry).strip())
+
+                if not (0 <= idx < count):
+                    raise ValueError(
+                        f"Invalid index {idx} in {key} of item {item_name}. Max index is {count - 1}."
+                    )
+                validated_indices.append(idx)
+            except (ValueError, TypeError):
+                raise ValueError(
+                    f"Could not parse index from entry: {idx_entry} in item {item_name}"
+                )
+        return sorted(list(set(validated_indices)))
+
+    def _parse_response(self, response, list_key, count):
+        """Validates the YAML list of {name, description, <list_key>} returned by the LLM."""
         yaml_str = response.strip().split("```yaml")[1].split("```")[0].strip()
         abstractions = yaml.safe_load(yaml_str)
 
@@ -199,38 +404,14 @@ Format the output as a YAML list of dictionaries:
         validated_abstractions = []
         for item in abstractions:
             if not isinstance(item, dict) or not all(
-                k in item for k in ["name", "description", "file_indices"]
+                k in item for k in ["name", "description", list_key]
             ):
                 raise ValueError(f"Missing keys in abstraction item: {item}")
             if not isinstance(item["name"], str):
                 raise ValueError(f"Name is not a string in item: {item}")
             if not isinstance(item["description"], str):
                 raise ValueError(f"Description is not a string in item: {item}")
-            if not isinstance(item["file_indices"], list):
-                raise ValueError(f"file_indices is not a list in item: {item}")
 
-            # Validate indices
-            validated_indices = []
-            for idx_entry in item["file_indices"]:
-                try:
-                    if isinstance(idx_entry, int):
-                        idx = idx_entry
-                    elif isinstance(idx_entry, str) and "#" in idx_entry:
-                        idx = int(idx_entry.split("#")[0].strip())
-                    else:
-                        idx = int(str(idx_entry).strip())
-
-                    if not (0 <= idx < file_count):
-                        raise ValueError(
-                            f"Invalid file index {idx} found in item {item['name']}. Max index is {file_count - 1}."
-                        )
-                    validated_indices.append(idx)
-                except (ValueError, TypeError):
-                    raise ValueError(
-                        f"Could not parse index from entry: {idx_entry} in item {item['name']}"
-                    )
-
-            item["files"] = sorted(list(set(validated_indices)))
             # Store only the required fields
             validated_abstractions.append(
                 {
@@ -238,13 +419,165 @@ Format the output as a YAML list of dictionaries:
                     "description": item[
                         "description"
                     ],  # Potentially translated description
-                    "files": item["files"],
+                    list_key: self._parse_indices(item[list_key], count, list_key, item["name"]),
                 }
             )
+        return validated_abstractions
+
+    def _call_with_retries(self, prompt, parse, use_cache):
+        """One map/reduce LLM call with its own retries, so one bad shard doesn't re-run the others."""
+        for attempt in range(self.max_retries):
+            try:
+                response = call_llm(prompt, use_cache=(use_cache and self.cur_retry == 0 and attempt == 0))
+                return parse(response)
+            except Exception as e:
+                if attempt == self.max_retries - 1:
+                    raise
+                self.logger.warning(f"Retrying invalid or failed LLM answer ({e})")
+                if self.wait > 0:
+                    time.sleep(self.wait)
+
+    def exec(self, prep_res):
+        (
+            context,
+            file_listing_for_prompt,
+            files_data,
+            project_name,
+            language,
+            use_cache,
+            max_abstraction_num,
+            shards,
+            context_budget,
+        ) = prep_res  # Unpack all parameters
+        file_count = len(files_data)
+        self.logger.info(f"Identifying abstractions using LLM...")
+
+        if shards:
+            validated_abstractions = self._map_reduce(
+                files_data, shards, project_name, language, use_cache, max_abstraction_num, context_budget
+            )
+            self.logger.info(f"Identified {len(validated_abstractions)} abstractions.")
+            return validated_abstractions
+
+        prompt = self._identify_prompt(context, file_listing_for_prompt, project_name, language, max_abstraction_num)
+        response = call_llm(prompt, use_cache=(use_cache and self.cur_retry == 0))  # Use cache only if enabled and not retrying
+
+        # --- Validation ---
+        validated_abstractions = [
+            {"name": a["name"], "description": a["description"], "files": a["file_indices"]}
+            for a in self._parse_response(response, "file_indices", file_count)
+        ]
 
         self.logger.info(f"Identified {len(validated_abstractions)} abstractions.")
         return validated_abstractions
 
+    # --- Sharded mode ---
+    def _map_reduce(self, files_data, shards, project_name, language, use_cache, max_abstraction_num, context_budget):
+        file_count = len(files_data)
+
+        def identify_shard(shard_num):
+            shard_context, shard_info = self._llm_context(files_data, shards[shard_num], max_file_tokens=context_budget)
+            shard_listing = self._format_listing(shard_info)
+            shard_note = (
+                f"NOTE: The codebase is too large to show at once; this is part {shard_num + 1} of {len(shards)}. "
+                f"Only consider the files shown here; candidates from all parts are merged afterwards.\n\n"
+            )
+            prompt = self._identify_prompt(shard_context, shard_listing, project_name, language, max_abstraction_num, shard_note)
+            return [
+                {"name": a["name"], "description": a["description"], "files": a["file_indices"]}
+                for a in self._call_with_retries(
+                    prompt, lambda r: self._parse_response(r, "file_indices", file_count), use_cache
+                )
+            ]
+
+        # Map: candidates per shard, in parallel (copy_context keeps the LLM run tag and profiling stage)
+        with ThreadPoolExecutor(max_workers=self.shard_concurrency) as pool:
+            futures = [
+                pool.submit(contextvars.copy_context().run, identify_shard, n) for n in range(len(shards))
+            ]
+            candidates = [candidate for future in futures for candidate in future.result()]
+        self.logger.info(f"Found {len(candidates)} candidate abstractions in {len(shards)} shards; merging...")
+
+        # Reduce: merge groups of candidates that fit in one prompt until a single group is left
+        while True:
+            groups = self._candidate_groups(candidates, context_budget, max_abstraction_num)
+            merged = [
+                abstraction
+                for group in groups
+                for abstraction in self._reduce(group, len(shards), project_name, language, use_cache, max_abstraction_num)
+            ]
+            if len(groups) == 1:
+                return merged
+            candidates = merged
+
+    def _format_candidate(self, i, candidate):
+        paths = ", ".join(str(idx) for idx in candidate["files"][:20])
+        more = f" (+{len(candidate['files']) - 20} more)" if len(candidate["files"]) > 20 else ""
+        return f"- {i} # {candidate['name'].strip()} (file indices: [{paths}]{more})\n  {' '.join(candidate['description'].split())}"
+
+    def _candidate_groups(self, candidates, context_budget, max_abstraction_num):
+        # Each group must be large enough to actually shrink when reduced to max_abstraction_num
+        min_group = 2 * max_abstraction_num
+        groups, current, size = [], [], 0
+        for candidate in candidates:
+            cost = estimate_tokens(self._format_candidate(0, candidate))
+            if len(current) >= min_group and size + cost > context_budget:
+                groups.append(current)
+                current, size = [], 0
+            current.append(candidate)
+            size += cost
+        if current:
+            if groups and len(current) < min_group:
+                groups[-1].extend(current)  # Too small to stand on its own
+            else:
+                groups.append(current)
+        return groups
+
+    def _reduce(self, candidates, shard_count, project_name, language, use_cache, max_abstraction_num):
+        language_instruction, name_lang_hint, desc_lang_hint = self._language_hints(language)
+        candidate_listing = "\n".join(self._format_candidate(i, c) for i, c in enumerate(candidates))
+        prompt = f"""
+For the project `{project_name}`:
+
+The codebase was too large to analyze at once, so candidate abstractions were identified separately in {shard_count} parts of it.
+Candidates from different parts may describe the same concept under different names.
+
+Candidate abstractions (index # name, file indices, description):
+{candidate_listing}
+
+{language_instruction}Merge candidates that describe the same concept and select the top 7-{max_abstraction_num} core most important abstractions to help those new to the codebase.
+
+For each abstraction, provide:
+1. A concise `name`{name_lang_hint}.
+2. A beginner-friendly `description` explaining what it is with a simple analogy, in around 100 words{desc_lang_hint}.
+3. The list of `candidates` (integers) merged into it, using the format `idx # candidate name`.
+
+Format the output as a YAML list of dictionaries:
+
+```yaml
+- name: |
+    Query Processing{name_lang_hint}
+  description: |
+    Explains what the abstraction does.
+    It's like a central dispatcher routing requests.{desc_lang_hint}
+  candidates:
+    - 0 # Query Handler
+    - 7 # Request Dispatcher
+# ... up to {max_abstraction_num} abstractions
+```"""
+        merged = self._call_with_retries(
+            prompt, lambda r: self._parse_response(r, "candidates", len(candidates)), use_cache
+        )
+        # The files of an abstraction are the union of the files of the candidates merged into it
+        return [
+            {
+                "name": m["name"],
+                "description": m["description"],
+                "files": sorted({idx for c in m["candidates"] for idx in candidates[c]["files"]}),
+            }
+            for m in merged[:max_abstraction_num]
+        ]
+
     def post(self, shared, prep_res, exec_res):
         shared["abstractions"] = (
             exec_res  # List of {"name": str, "description": str, "files": [int]}
@@ -257,7 +590,7 @@ class AnalyzeRelationships(Node):
         abstractions = shared[
             "abstractions"
         ]  # Now contains 'files' list of indices, name/description potentially translated
-        files_data = shared["files"]
+        files_data = get_context_files(shared)  # Full sources, or their digests in digest mode
         project_name = shared["project_name"]  # Get project name
         language = shared.get("language", "english")  # Get language
         use_cache = shared.get("use_cache", True)  # Get use_cache flag, default to True
@@ -561,13 +894,26 @@ class WriteChapters(BatchNode):
         project_name = shared["project_name"]
         language = shared.get("language", "english")
         use_cache = shared.get("use_cache", True)  # Get use_cache flag, default to True
+        relationships = shared.get("relationships") or {}
+        # > 1 writes chapters concurrently from the chapter plan instead of the prose of earlier chapters
+        self.concurrency = max(1, int(shared.get("chapter_concurrency", 1)))
 
         # Get already written chapters to provide context
-        # We store them temporarily during the batch run, not in shared memory yet
-        # The 'previous_chapters_summary' will be built progressively in the exec context
-        self.chapters_written_so_far = (
-            []
+        # We keep a bounded digest of them during the batch run, not in shared memory
+        # The 'previous_chapters_summary' is rendered from it in the exec context
+        self.digest = ChapterDigest(
+            token_budget=shared.get("previous_chapters_token_budget", 2000)
         )  # Use instance variable for temporary storage across exec calls
+        self.prompt_tokens = {}  # chapter_num -> estimated prompt tokens, for instrumentation
+        # Chapters already written by a previous (failed) attempt of this run
+        self.checkpoint = shared.get("checkpoint")
+        self.restored_chapters = self.checkpoint.completed_chapters() if self.checkpoint else {}
+        self.profiler = shared.get("profiler")
+        # In refresh mode, unchanged chapters are reused from the previous run
+        refresh_plan = shared.get("refresh_plan")
+        if refresh_plan:
+            reused = {int(num): content for num, content in refresh_plan["reuse_chapters"].items()}
+            self.restored_chapters = {**reused, **self.restored_chapters}
 
         # Create a complete list of all chapters
         all_chapters = []
@@ -620,6 +966,23 @@ class WriteChapters(BatchNode):
                     next_idx = chapter_order[i + 1]
                     next_chapter = chapter_filenames[next_idx]
 
+                # Outline of the chapters before this one plus how this abstraction relates to the others.
+                # Used instead of the previous chapters' text when chapters are written in parallel.
+                plan_lines = [f"Project Summary:\n{relationships.get('summary', '')}", "", "Earlier chapters:"]
+                for j, prev_idx in enumerate(chapter_order[:i]):
+                    if 0 <= prev_idx < len(abstractions):
+                        plan_lines.append(
+                            f"- Chapter {j + 1}: {abstractions[prev_idx]['name'].strip()}\n  {abstractions[prev_idx]['description'].strip()}"
+                        )
+                if i == 0:
+                    plan_lines.append("- None, this is the first chapter.")
+                plan_lines += ["", "Relationships of this concept:"]
+                for rel in relationships.get("details", []):
+                    if abstraction_index in (rel["from"], rel["to"]):
+                        from_name = abstractions[rel["from"]]["name"].strip()
+                        to_name = abstractions[rel["to"]]["name"].strip()
+                        plan_lines.append(f"- {from_name} -> {to_name}: {rel['label']}")
+
                 items_to_process.append(
                     {
                         "chapter_num": i + 1,
@@ -633,6 +996,7 @@ class WriteChapters(BatchNode):
                         "next_chapter": next_chapter,  # Add next chapter info (uses potentially translated name)
                         "language": language,  # Add language for multi-language support
                         "use_cache": use_cache, # Pass use_cache flag
+                        "plan_context": "\n".join(plan_lines),  # Used in parallel mode
                         # previous_chapters_summary will be added dynamically in exec
                     }
                 )
@@ -642,8 +1006,32 @@ class WriteChapters(BatchNode):
                 )
 
         self.logger.info(f"Preparing to write {len(items_to_process)} chapters...")
+        if self.concurrency > 1:
+            self.logger.info(f"Writing chapters in parallel (concurrency={self.concurrency}).")
         return items_to_process  # Iterable for BatchNode
 
+    def _exec(self, items):
+        def write_one(item, worker):
+            # Profile each chapter (including its retries) as a sub-stage of WriteChapters
+            stage = (
+                self.profiler.stage(f"WriteChapters/chapter_{item['chapter_num']}", kind="chapter")
+                if self.profiler is not None else nullcontext()
+            )
+            with stage:
+                return super(BatchNode, worker)._exec(item)
+
+        if self.concurrency <= 1:
+            return [write_one(item, self) for item in items]
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            # Each chapter runs on its own shallow copy so retry counters don't clash between threads;
+            # copy_context keeps the LLM run tag and the profiling stage inside the worker threads
+            futures = [
+                pool.submit(contextvars.copy_context().run, write_one, item, copy.copy(self))
+                for item in items
+            ]
+            return [future.result() for future in futures]  # Keep chapter order
+
     def exec(self, item):
         # This runs for each item prepared above
         abstraction_name = item["abstraction_details"][
@@ -656,6 +1044,12 @@ class WriteChapters(BatchNode):
         project_name = item.get("project_name")
         language = item.get("language", "english")
         use_cache = item.get("use_cache", True) # Read use_cache from item
+        if chapter_num in self.restored_chapters:
+            self.logger.info(f"Chapter {chapter_num} ({abstraction_name}) reused from a previous attempt or run.")
+            chapter_content = self.restored_chapters[chapter_num]
+            if self.concurrency <= 1:
+                self.digest.add(chapter_num, abstraction_name, chapter_content)
+            return chapter_content
         logger.info(f"Writing chapter {chapter_num} for: {abstraction_name} using LLM...")
 
         # Prepare file context string from the map
@@ -665,8 +1059,11 @@ class WriteChapters(BatchNode):
         )
 
         # Get summary of chapters written *before* this one
-        # Use the temporary instance variable
-        previous_chapters_summary = "\n---\n".join(self.chapters_written_so_far)
+        # Use the rolling digest (sequential mode) or the chapter plan (parallel mode)
+        if self.concurrency > 1:
+            previous_chapters_summary = item["plan_context"]
+        else:
+            previous_chapters_summary = self.digest.render()
 
         # Add language instruction and context notes only if not English
         language_instruction = ""
@@ -740,6 +1137,12 @@ Instructions for the chapter (Generate content in {language.capitalize()} unless
 
 Now, directly provide a super beginner-friendly Markdown output (DON'T need ```markdown``` tags):
 """
+        prompt_tokens = estimate_tokens(prompt)
+        self.prompt_tokens[chapter_num] = prompt_tokens
+        self.logger.info(
+            f"Chapter {chapter_num} prompt: ~{prompt_tokens} tokens "
+            f"(~{estimate_tokens(previous_chapters_summary)} from previous chapters)"
+        )
         chapter_content = call_llm(prompt, use_cache=(use_cache and self.cur_retry == 0)) # Use cache only if enabled and not retrying
         # Basic validation/cleanup
         actual_heading = f"# Chapter {chapter_num}: {abstraction_name}"  # Use potentially translated name
@@ -754,16 +1157,23 @@ Now, directly provide a super beginner-friendly Markdown output (DON'T need ```m
             else:  # Otherwise, prepend it
                 chapter_content = f"{actual_heading}\n\n{chapter_content}"
 
-        # Add the generated content to our temporary list for the next iteration's context
-        self.chapters_written_so_far.append(chapter_content)
+        # Add the generated content to the digest for the next iteration's context
+        if self.concurrency <= 1:
+            self.digest.add(chapter_num, abstraction_name, chapter_content)
+        if self.checkpoint is not None:
+            self.checkpoint.save_chapter(chapter_num, chapter_content)
 
         return chapter_content  # Return the Markdown string (potentially translated)
 
     def post(self, shared, prep_res, exec_res_list):
         # exec_res_list contains the generated Markdown for each chapter, in order
         shared["chapters"] = exec_res_list
-        # Clean up the temporary instance variable
-        del self.chapters_written_so_far
+        shared["chapter_prompt_tokens"] = [self.prompt_tokens.get(n, 0) for n in range(1, len(exec_res_list) + 1)]
+        self.logger.info(f"Estimated prompt tokens per chapter: {shared['chapter_prompt_tokens']}")
+        # Clean up the temporary instance variables
+        del self.digest
+        del self.prompt_tokens
+        del self.restored_chapters
         self.logger.info(f"Finished writing {len(exec_res_list)} chapters.")
 
 
@@ -867,12 +1277,20 @@ class CombineTutorial(Node):
             "output_path": output_path,
             "index_content": index_content,
             "chapter_files": chapter_files,  # List of {"filename": str, "content": str}
+            "completion_marker": shared.get("completion_marker"),
         }
 
     def exec(self, prep_res):
         output_path = prep_res["output_path"]
         index_content = prep_res["index_content"]
         chapter_files = prep_res["chapter_files"]
+        completion_marker = prep_res["completion_marker"]
+
+        # A refresh rewrites a tutorial that is marked complete: take the marker down first, so it is
+        # never served half old / half new (or left looking complete if the run fails from here on).
+        # The caller recreates it once the whole flow has finished.
+        if completion_marker and os.path.exists(completion_marker):
+            os.remove(completion_marker)
 
         self.logger.info(f"Combining tutorial into directory: {output_path}")
         # Rely on Node's built-in retry/fallback
@@ -913,102 +1331,346 @@ def sanitize_filename(url: str) -> str:
     return sanitized
 
 
+COLLECTION_NAME = "code_and_docs_collection"  # One consistent collection per repository store
+
+
+def vector_db_path(repo_url: str) -> str:
+    return os.path.join("./vector_stores", sanitize_filename(repo_url))
+
+
+def split_documents(docs):
+    """Chunks code files with a language-aware splitter; documentation docs are expected to be chunked already."""
+    language_splitter_map = {
+        '.py': RecursiveCharacterTextSplitter.from_language(language=Language.PYTHON, chunk_size=2000, chunk_overlap=200),
+        '.js': RecursiveCharacterTextSplitter.from_language(language=Language.JS, chunk_size=2000, chunk_overlap=200),
+        '.ts': RecursiveCharacterTextSplitter.from_language(language=Language.TS, chunk_size=2000, chunk_overlap=200),
+        '.java': RecursiveCharacterTextSplitter.from_language(language=Language.JAVA, chunk_size=2000, chunk_overlap=200),
+        '.cs': RecursiveCharacterTextSplitter.from_language(language=Language.CSHARP, chunk_size=2000, chunk_overlap=200),
+        '.go': RecursiveCharacterTextSplitter.from_language(language=Language.GO, chunk_size=2000, chunk_overlap=200),
+        '.c': RecursiveCharacterTextSplitter.from_language(language=Language.C, chunk_size=2000, chunk_overlap=200),
+        '.cpp': RecursiveCharacterTextSplitter.from_language(language=Language.CPP, chunk_size=2000, chunk_overlap=200),
+    }
+    fallback_splitter = RecursiveCharacterTextSplitter(chunk_size=2000, chunk_overlap=200)
+
+    chunked_docs = []
+    for doc in docs:
+        if doc.metadata["type"] == "code":
+            ext = os.path.splitext(doc.metadata["source"])[1]
+            splitter = language_splitter_map.get(ext, fallback_splitter)
+            chunked_docs.extend(splitter.split_documents([doc]))
+        else:
+            # Markdown is already chunked, so just add it
+            chunked_docs.append(doc)
+    return chunked_docs
+
+
+def open_collection(repo_url):
+    return Chroma(
+        collection_name=COLLECTION_NAME,
+        embedding_function=get_embedding_vector(),
+        persist_directory=vector_db_path(repo_url),
+    )
+
+
+def chunk_ids(chunked_docs, repo_url):
+    """
+    Deterministic ids (repo + type + source + content hash): the same chunk of the same file
+    always gets the same id, so writing it again is a no-op instead of a duplicate vector.
+    Identical chunks within one file get an occurrence suffix.
+    """
+    ids, seen = [], {}
+    for doc in chunked_docs:
+        key = "\0".join([repo_url, doc.metadata["type"], doc.metadata["source"], hash_content(doc.page_content)])
+        base = hash_content(key)[:40]
+        occurrence = seen.get(base, 0)
+        seen[base] = occurrence + 1
+        ids.append(base if occurrence == 0 else f"{base}-{occurrence}")
+    return ids
+
+
+def chunk_ingestor(repo_url, logger, label, ingest=None):
+    """A ChunkIngestor writing into the repository's collection (`ingest`: batch_size / concurrency)"""
+    logger.info(f"Writing {label} chunks to vector store at: {vector_db_path(repo_url)} in collection: '{COLLECTION_NAME}'")
+    collection = open_collection(repo_url)._collection  # Creates the store directory
+    return ChunkIngestor(
+        collection, get_embedding_vector(), logger, label=label,
+        # Pooled query-side clients keep the index they loaded; they reopen the store on their next query
+        on_write=lambda: get_vector_store_registry().invalidate(repo_url),
+        lexical=LexicalIndex(vector_db_path(repo_url)),
+        **(ingest or {}),
+    )
+
+
+def store_chunks(chunked_docs, repo_url, logger, label="chunks", ingest=None):
+    """
+    Upserts chunks into the repository's collection under their deterministic ids; chunks
+    already stored are skipped without being embedded. Returns (ids, number of chunks embedded).
+    """
+    with chunk_ingestor(repo_url, logger, label, ingest) as ingestor:
+        ingestor.add(chunk_ids(chunked_docs, repo_url), chunked_docs)
+    return ingestor.ids, ingestor.embedded
+
+
+def prune_chunks(repo_url, doc_type, keep_ids, sources, logger):
+    """
+    Deletes the collection's (and the lexical index's) `doc_type` chunks that are not in `keep_ids` -
+    all of them, or only those of `sources` (refresh mode) - so it converges to the current chunk set.
+    Returns the number deleted from the collection.
+    """
+    if sources is not None and not sources:
+        return 0
+    where = {"type": doc_type} if sources is None else {"$and": [{"type": doc_type}, {"source": {"$in": list(sources)}}]}
+    vectordb = open_collection(repo_url)
+    stale_ids = [chunk_id for chunk_id in vectordb.get(where=where, include=[])["ids"] if chunk_id not in keep_ids]
+    if stale_ids:
+        vectordb.delete(ids=stale_ids)
+        get_vector_store_registry().invalidate(repo_url)
+        logger.info(f"Removed {len(stale_ids)} stale {doc_type} chunks from the vector store.")
+    if LexicalIndex.exists(vector_db_path(repo_url)):
+        lexical = LexicalIndex(vector_db_path(repo_url))
+        try:
+            lexical.prune(doc_type, keep_ids, sources)
+        finally:
+            lexical.close()
+    return len(stale_ids)
+
+
+def mark_lexical_index_complete(repo_url):
+    """
+    After a full run (every code file and chapter went through the ingestor): the lexical index
+    holds all chunks, so queries may use it from now on.
+    """
+    directory = vector_db_path(repo_url)
+    if not LexicalIndex.exists(directory):
+        return
+    lexical = LexicalIndex(directory)
+    try:
+        if not lexical.is_complete():
+            lexical.mark_complete()
+            get_vector_store_registry().invalidate(repo_url)  # Pooled stores reopen with it
+    finally:
+        lexical.close()
+
+
+class CodeIndexCancelled(Exception):
+    """index_code_files was stopped through its `cancel` flag (the run failed meanwhile)"""
+
+
+def index_code_files(files, repo_url, refresh, logger, ingest=None, cancel=None):
+    """
+    Chunks and embeds the crawled code files, then removes the code chunks that are no longer
+    current. In refresh mode only changed/added files are chunked, and only the old chunks of
+    changed/deleted files are removed.
+    `cancel` (a threading.Event) is checked between files: once set, the batches in flight are
+    finished, nothing is pruned (the chunk set is incomplete) and CodeIndexCancelled is raised.
+    """
+    total_docs = 0
+    # File by file: the ingestor embeds and writes batches while the next files are read and
+    # chunked, and blocks the loop when it falls behind - so only a few batches of file contents
+    # (from a FileCorpus) and their chunks are in memory at a time
+    with chunk_ingestor(repo_url, logger, "code", ingest) as ingestor:
+        for i, path in enumerate(file_paths(files)):
+            if cancel is not None and cancel.is_set():
+                raise CodeIndexCancelled(f"Code indexing stopped after {total_docs} files.")
+            if refresh and path not in refresh["embed_paths"]:
+                continue  # Unchanged file: its content is not even read
+            chunked_docs = split_documents([Document(page_content=files[i][1], metadata={"source": path, "type": "code"})])
+            ingestor.add(chunk_ids(chunked_docs, repo_url), chunked_docs)
+            total_docs += 1
+    removed = prune_chunks(repo_url, "code", set(ingestor.ids), refresh["remove_paths"] if refresh else None, logger)
+    logger.info(
+        f"✅ Code indexed: {ingestor.chunks} chunks from {total_docs} files, {ingestor.embedded} embedded, "
+        f"{ingestor.chunks - ingestor.embedded} already stored ({removed} stale chunks removed)."
+    )
+
+
+def embedding_ingest_options(shared):
+    return {
+        "batch_size": shared.get("embedding_batch_size", 256),
+        "concurrency": shared.get("embedding_concurrency", 4),
+    }
+
+
+def code_refresh_plan(refresh_plan):
+    """Which code files to (re-)embed and which files' old chunks to drop, or None for a full index."""
+    if not refresh_plan:
+        return None
+    return {
+        "embed_paths": set(refresh_plan["changed_paths"]) | set(refresh_plan["added_paths"]),
+        "remove_paths": sorted(set(refresh_plan["changed_paths"]) | set(refresh_plan["deleted_paths"])),
+    }
+
+
+class BackgroundCodeIndex:
+    """IndexCode's background job: its Future and the cancel flag index_code_files checks between files"""
+
+    def __init__(self):
+        self.cancel_event = threading.Event()
+        self.future = None
+
+    def result(self):
+        return self.future.result()
+
+    def cancel_and_wait(self):
+        """Stops the job at the next file and waits for the batches it has in flight"""
+        self.cancel_event.set()
+        wait([self.future])
+
+
+def stop_code_indexing(shared, logger):
+    """
+    Called when the flow fails: the background indexing must not keep writing to (and pruning)
+    the vector store while the retry indexes the same repository again.
+    """
+    job = shared.get("code_index_job")
+    if job is not None and not job.future.done():
+        logger.info("Stopping background code indexing...")
+        job.cancel_and_wait()
+
+
+class IndexCode(Node):
+    """
+    Starts embedding the code files in a background thread right after the crawl, so the vector
+    store can answer code questions while the LLM stages are still running. EmbedAndStore waits
+    for it at the end and only adds the chapters. Passes PlanRefresh's action through.
+    On a resumed run it is only skipped once the background job has succeeded (`code_index_built`);
+    otherwise it starts the job again.
+    """
+
+    def completed_in(self, shared):
+        """Whether a checkpoint that recorded this node as completed can skip it (see ResumableFlow)"""
+        return bool(shared.get("code_index_built"))
+
+    def prep(self, shared):
+        self.logger = shared.get("logger", logging.getLogger(__name__))
+        if shared.get("code_index_built"):
+            self.logger.info("Code already indexed in a previous attempt.")
+            return None
+        if not shared.get("repo_url"):
+            raise ValueError("repo_url is required to create a unique vector store.")
+        return {
+            "files": shared["files"],
+            "repo_url": shared["repo_url"],
+            "refresh": code_refresh_plan(shared.get("refresh_plan")),
+            "ingest": embedding_ingest_options(shared),
+            "profiler": shared.get("profiler"),
+        }
+
+    def _index(self, prep_res, cancel):
+        profiler = prep_res["profiler"]
+        with profiler.stage("IndexCode/background", kind="background") if profiler is not None else nullcontext():
+            index_code_files(
+                prep_res["files"], prep_res["repo_url"], prep_res["refresh"], self.logger, prep_res["ingest"], cancel
+            )
+
+    def exec(self, prep_res):
+        if prep_res is None:
+            return None
+        self.logger.info("Indexing code files in the background...")
+        job = BackgroundCodeIndex()
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="index-code")
+        job.future = executor.submit(self._index, prep_res, job.cancel_event)
+        executor.shutdown(wait=False)  # The thread exits once the job is done
+        return job
+
+    def post(self, shared, prep_res, exec_res):
+        if exec_res is not None:
+            shared["code_index_job"] = exec_res  # A BackgroundCodeIndex; not checkpointed
+
+            def mark_built(future):
+                # Recorded in shared (and so in later checkpoints) once the background job succeeds
+                if not future.cancelled() and future.exception() is None:
+                    shared["code_index_built"] = True
+
+            exec_res.future.add_done_callback(mark_built)
+        return "refresh" if shared.get("refresh_plan") else "default"
+
+
 class EmbedAndStore(Node):
+    """
+    Final step: waits for the background code indexing started by IndexCode (or indexes the code
+    here if that did not happen in this attempt) and embeds the generated chapters.
+    """
+
     def prep(self, shared):
         self.logger = shared.get("logger", logging.getLogger(__name__))
-        self.logger.info("Preparing to embed and store code + docs in Chroma vector DB...")
-        
-        files = shared.get("files", [])
-        output_dir = shared.get("final_output_dir")
-        repo_url = shared.get("repo_url")
-        
+        self.logger.info("Preparing to embed and store docs in Chroma vector DB...")
+
+        # In refresh mode only the chunks of rewritten chapters are replaced
+        chapter_prefixes = None
+        refresh_plan = shared.get("refresh_plan")
+        if refresh_plan:
+            rewritten = [
+                n for n in range(1, len(shared.get("chapters", [])) + 1)
+                if str(n) not in refresh_plan["reuse_chapters"]
+            ]
+            chapter_prefixes = tuple(f"{n:02d}_" for n in rewritten)
+
         return {
-            "files": files, 
-            "output_dir": output_dir, 
-            "repo_url": repo_url
+            "files": shared.get("files", []),
+            "output_dir": shared.get("final_output_dir"),
+            "repo_url": shared.get("repo_url"),
+            "code_index_job": shared.get("code_index_job"),
+            "code_index_built": shared.get("code_index_built", False),
+            "code_refresh": code_refresh_plan(refresh_plan),
+            "chapter_prefixes": chapter_prefixes,
+            "ingest": embedding_ingest_options(shared),
         }
 
     def exec(self, prep_res):
-        files = prep_res["files"]
         output_dir = prep_res["output_dir"]
         repo_url = prep_res["repo_url"]
+        chapter_prefixes = prep_res["chapter_prefixes"]
 
         if not repo_url:
             raise ValueError("repo_url is required to create a unique vector store.")
 
-        # --- 1. Initialize Text Splitters ---
+        # --- 1. Code: normally already indexed in the background ---
+        if prep_res["code_index_job"] is not None:
+            self.logger.info("Waiting for background code indexing to finish...")
+            prep_res["code_index_job"].result()  # Re-raises if the background job failed
+        elif not prep_res["code_index_built"]:
+            index_code_files(prep_res["files"], repo_url, prep_res["code_refresh"], self.logger, prep_res["ingest"])
+
+        # --- 2. Documentation: the generated chapters ---
         markdown_splitter = MarkdownTextSplitter(chunk_size=1500, chunk_overlap=150)
-        language_splitter_map = {
-            '.py': RecursiveCharacterTextSplitter.from_language(language=Language.PYTHON, chunk_size=2000, chunk_overlap=200),
-            '.js': RecursiveCharacterTextSplitter.from_language(language=Language.JS, chunk_size=2000, chunk_overlap=200),
-            '.ts': RecursiveCharacterTextSplitter.from_language(language=Language.TS, chunk_size=2000, chunk_overlap=200),
-            '.java': RecursiveCharacterTextSplitter.from_language(language=Language.JAVA, chunk_size=2000, chunk_overlap=200),
-            '.cs': RecursiveCharacterTextSplitter.from_language(language=Language.CSHARP, chunk_size=2000, chunk_overlap=200),
-            '.go': RecursiveCharacterTextSplitter.from_language(language=Language.GO, chunk_size=2000, chunk_overlap=200),
-            '.c': RecursiveCharacterTextSplitter.from_language(language=Language.C, chunk_size=2000, chunk_overlap=200),
-            '.cpp': RecursiveCharacterTextSplitter.from_language(language=Language.CPP, chunk_size=2000, chunk_overlap=200),
-        }
-        fallback_splitter = RecursiveCharacterTextSplitter(chunk_size=2000, chunk_overlap=200)
-
-        # --- 2. Prepare all documents ---
-        all_docs = []
-        
-        # Process Code Files
-        for path, content in files:
-            doc = Document(page_content=content, metadata={"source": path, "type": "code"})
-            all_docs.append(doc)
-        
-        # Process Documentation Files
+        doc_chunks = []
+        doc_sources = []
         if output_dir and os.path.exists(output_dir):
             for fname in os.listdir(output_dir):
                 if fname.endswith(".md"):
+                    if chapter_prefixes is not None and not fname.startswith(chapter_prefixes):
+                        continue
+                    doc_sources.append(fname)
                     file_path = os.path.join(output_dir, fname)
                     with open(file_path, encoding="utf-8") as f:
                         content = f.read()
                     # We create documents from markdown content and add metadata
-                    chunks = markdown_splitter.create_documents([content], metadatas=[{"source": fname, "type": "documentation"}])
-                    all_docs.extend(chunks)
-
-        if not all_docs:
-            self.logger.warning("No documents were found to be vectorized.")
-            return "No content to embed."
-
-        # Chunk all the documents based on their type
-        chunked_docs = []
-        for doc in all_docs:
-            if doc.metadata["type"] == "code":
-                ext = os.path.splitext(doc.metadata["source"])[1]
-                splitter = language_splitter_map.get(ext, fallback_splitter)
-                chunks = splitter.split_documents([doc])
-                chunked_docs.extend(chunks)
-            else:
-                # Markdown is already chunked, so just add it
-                chunked_docs.append(doc)
-                
-        self.logger.info(f"Created {len(chunked_docs)} chunks from code and documentation.")
-
-        # --- 3. Embed and Store ---
-        embedding_function = get_embedding_vector()
-
-        sanitized_repo_name = sanitize_filename(repo_url)
-        vector_db_path = os.path.join("./vector_stores", sanitized_repo_name)
-        
-        # ✨ **FIX**: Define a consistent collection name
-        collection_name = "code_and_docs_collection"
-
-        self.logger.info(f"Creating vector store at: {vector_db_path} in collection: '{collection_name}'")
-        
-        # ✨ **FIX**: Pass the collection_name to Chroma
-        Chroma.from_documents(
-            documents=chunked_docs,
-            embedding=embedding_function,
-            persist_directory=vector_db_path,
-            collection_name=collection_name  # Ensure it writes to our specific collection
+                    doc_chunks.extend(markdown_splitter.create_documents([content], metadatas=[{"source": fname, "type": "documentation"}]))
+
+        # Full run: the code and every chapter are now in the lexical index too
+        full_run = chapter_prefixes is None and prep_res["code_refresh"] is None
+        if not doc_chunks and chapter_prefixes is None:
+            self.logger.warning("No documentation was found to be vectorized.")
+            if full_run:
+                mark_lexical_index_complete(repo_url)
+            return "Embedding complete"
+
+        ids, embedded = store_chunks(split_documents(doc_chunks), repo_url, self.logger, "documentation", prep_res["ingest"])
+        # Chunks of chapters that changed or no longer exist (in refresh mode: of the rewritten chapters only)
+        removed = prune_chunks(
+            repo_url, "documentation", set(ids), doc_sources if chapter_prefixes is not None else None, self.logger
+        )
+
+        if full_run:
+            mark_lexical_index_complete(repo_url)
+
+        self.logger.info(
+            f"✅ Embedding and storage complete ({len(doc_chunks)} documentation chunks, {embedded} embedded, "
+            f"{removed} stale chunks removed)."
         )
-        
-        self.logger.info("✅ Embedding and storage complete.")
         return "Embedding complete"
 
     def post(self, shared, prep_res, exec_res):
+        shared["code_index_built"] = True
         shared["rag_db_built"] = True
-
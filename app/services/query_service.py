@@ -1,39 +1,41 @@
 # app/services/query_service.py
-from app.repositories.vector_store import ChromaVectorStore
+from app.repositories.vector_store import get_vector_store_registry
 from app.llm.embedder import get_embedding_vector
-from app.llm.call_llm import call_llm
+from app.llm.call_llm import acall_llm, astream_llm
+from typing import Any, AsyncGenerator, Dict, List
+import asyncio
+import json
 import logging
 
-def answer_query(user_query: str, repo_url: str):
+NO_DOCUMENTS_MESSAGE = "I'm sorry, I couldn't find any relevant information in the available documents to answer your question."
+
+
+def retrieve_documents(user_query: str, repo_url: str) -> List[Dict[str, Any]]:
     """
-    Orchestrates the RAG pipeline: embed query, search docs, and generate answer.
+    Embeds the query and searches the repository's vector store.
+    Raises FileNotFoundError if the repository has not been embedded yet.
     """
-    try:
-        # Step 1: Get the embedder instance
-        embedder_instance = get_embedding_vector() 
+    # Step 1: Get the embedder instance
+    embedder_instance = get_embedding_vector()
 
-        # Step 2: Initialize the vector store, passing the embedder
-        # This will now correctly connect to the 'code_and_docs_collection' by default
-        store = ChromaVectorStore(repo_url=repo_url, embedder=embedder_instance)
-        
+    # Step 2: Get the repository's vector store from the process-wide pool (opened on first use),
+    # which connects to the 'code_and_docs_collection' by default
+    with get_vector_store_registry().acquire(repo_url, embedder_instance) as store:
         # Step 3: Search the vector store with the user's query
-        docs = store.search(user_query)
-        
-        # Step 4: If no relevant documents are found, return a helpful message
-        if not docs:
-            logging.warning(f"No relevant documents found for query: '{user_query}' in repo: '{repo_url}'")
-            return "I'm sorry, I couldn't find any relevant information in the available documents to answer your question."
-
-        # Step 5: Build a context string from the retrieved documents
-        context = "\n\n---\n\n".join(
-            [
-                f"Source: {doc['metadata'].get('source', 'Unknown')}\n\nContent:\n{doc.get('document', '')}"
-                for doc in docs
-            ]
-        )
-
-        # Step 6: Create a RAG-style prompt
-        prompt = f"""
+        return store.search(user_query)
+
+
+def build_rag_prompt(user_query: str, docs: List[Dict[str, Any]]) -> str:
+    # Build a context string from the retrieved documents
+    context = "\n\n---\n\n".join(
+        [
+            f"Source: {doc['metadata'].get('source', 'Unknown')}\n\nContent:\n{doc.get('document', '')}"
+            for doc in docs
+        ]
+    )
+
+    # Create a RAG-style prompt
+    return f"""
 You are a helpful assistant that answers questions using only the provided context.
 
 Instructions:
@@ -48,12 +50,59 @@ Question: {user_query}
 
 Answer:
 """
-        # Step 7: Call the LLM to generate an answer
-        return call_llm(prompt)
-        
+
+
+async def answer_query(user_query: str, repo_url: str):
+    """
+    Orchestrates the RAG pipeline: embed query, search docs, and generate answer.
+    The search runs in a worker thread; the LLM call is awaited on the event loop, so a
+    request waiting for a scheduler slot or the model doesn't tie up a threadpool thread.
+    """
+    try:
+        docs = await asyncio.to_thread(retrieve_documents, user_query, repo_url)
+
+        # If no relevant documents are found, return a helpful message
+        if not docs:
+            logging.warning(f"No relevant documents found for query: '{user_query}' in repo: '{repo_url}'")
+            return NO_DOCUMENTS_MESSAGE
+
+        # Call the LLM to generate an answer
+        return await acall_llm(build_rag_prompt(user_query, docs))
+
     except FileNotFoundError as e:
         logging.error(f"FileNotFoundError in answer_query: {e}")
         return str(e)
     except Exception as e:
         logging.error(f"An unexpected error occurred in answer_query: {e}", exc_info=True)
-        return f"An unexpected error occurred: {e}"
\ No newline at end of file
+        return f"An unexpected error occurred: {e}"
+
+
+async def stream_answer(user_query: str, repo_url: str) -> AsyncGenerator[Dict[str, str], None]:
+    """
+    Same pipeline as answer_query, as Server-Sent Events:
+    a `retrieval` event with the sources as soon as the search returns,
+    then one `token` event per generated chunk, and finally `done` (or `error`).
+    """
+    try:
+        docs = await asyncio.to_thread(retrieve_documents, user_query, repo_url)
+        sources = [
+            {"source": doc["metadata"].get("source", "Unknown"), "distance": doc.get("distance")}
+            for doc in docs
+        ]
+        yield {"event": "retrieval", "data": json.dumps({"sources": sources})}
+
+        if not docs:
+            logging.warning(f"No relevant documents found for query: '{user_query}' in repo: '{repo_url}'")
+            yield {"event": "token", "data": json.dumps({"text": NO_DOCUMENTS_MESSAGE})}
+        else:
+            async for delta in astream_llm(build_rag_prompt(user_query, docs)):
+                yield {"event": "token", "data": json.dumps({"text": delta})}
+
+        yield {"event": "done", "data": ""}
+
+    except FileNotFoundError as e:
+        logging.error(f"FileNotFoundError in stream_answer: {e}")
+        yield {"event": "error", "data": json.dumps({"error": str(e)})}
+    except Exception as e:
+        logging.error(f"An unexpected error occurred in stream_answer: {e}", exc_info=True)
+        yield {"event": "error", "data": json.dumps({"error": f"An unexpected error occurred: {e}"})}
@@ -0,0 +1,166 @@
+# app/services/repo_mirror.py
+"""
+On-disk cache of bare mirrors of cloned repositories (the SSH / `.git` URL path of
+crawl_github_files), so retries and re-generations fetch only what changed instead of
+cloning the full history again.
+
+- One bare repository per URL under `root`, created with a shallow clone (`--depth 1`), and
+  updated with a shallow `fetch` on later runs.
+- Checkouts are detached worktrees of the mirror in a temporary directory, removed afterwards.
+- One lock per mirror: a thread lock within the process plus an flock on a lock file across
+  worker processes. It is held for the whole checkout, so a mirror is never fetched into or
+  evicted while in use.
+- After each checkout, the least recently used mirrors are evicted until the cache fits in
+  `max_bytes`.
+"""
+import os
+import time
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+import git
+
+from app import config
+
+try:
+    import fcntl
+except ImportError:  # Windows: the in-process lock only
+    fcntl = None
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class MirrorCache:
+    def __init__(self, root: str, max_bytes: int):
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def mirror_path(self, url: str) -> str:
+        name = hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.root, f"{name}.git")
+
+    # --- Locking ---
+    @contextmanager
+    def _lock(self, path: str, blocking: bool = True) -> Iterator[bool]:
+        """Yields whether the mirror's lock was taken (always True when blocking)"""
+        with self._locks_guard:
+            thread_lock = self._locks.setdefault(path, threading.Lock())
+        if not thread_lock.acquire(blocking):
+            yield False
+            return
+        try:
+            with open(path + ".lock", "a") as lock_file:
+                if fcntl is not None:
+                    try:
+                        fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+                    except BlockingIOError:
+                        yield False
+                        return
+                yield True  # The flock is released when the file is closed
+        finally:
+            thread_lock.release()
+
+    # --- Mirrors ---
+    def _update(self, url: str, path: str) -> git.Repo:
+        if os.path.isdir(path):
+            repo = git.Repo(path)
+            try:
+                # Branch tips only, shallow: objects already in the mirror are not fetched again
+                repo.git.fetch("origin", "+refs/heads/*:refs/heads/*", "--depth=1", "--prune", "--no-tags")
+                return repo
+            except git.GitCommandError as e:
+                logging.warning(f"Fetching into the mirror of {url} failed ({e}); cloning it again.")
+                shutil.rmtree(path, ignore_errors=True)
+        return git.Repo.clone_from(url, path, bare=True, depth=1, no_single_branch=True)
+
+    def _resolve(self, repo: git.Repo, ref: Optional[str]) -> str:
+        """Commit sha of `ref` (default: the remote's default branch), fetching it if the mirror lacks it"""
+        if not ref:
+            return repo.git.rev_parse("HEAD")
+        try:
+            return repo.git.rev_parse("--verify", f"{ref}^{{commit}}")
+        except git.GitCommandError:
+            # A commit or tag that is not a branch tip
+            repo.git.fetch("origin", ref, "--depth=1", "--no-tags")
+            return repo.git.rev_parse("FETCH_HEAD")
+
+    @contextmanager
+    def checkout(self, url: str, ref: Optional[str] = None) -> Iterator[str]:
+        """Yields a directory with `ref` of `url` checked out (valid inside the with block)"""
+        path = self.mirror_path(url)
+        with self._lock(path):
+            start = time.perf_counter()
+            existed = os.path.isdir(path)
+            repo = self._update(url, path)
+            commit = self._resolve(repo, ref)
+            logging.info(
+                f"{'Updated' if existed else 'Created'} the mirror of {url} in {time.perf_counter() - start:.2f}s "
+                f"(commit {commit[:12]})."
+            )
+            os.utime(path)  # Last use, for LRU eviction
+            worktree = tempfile.mkdtemp(prefix="checkout-", dir=self.root)
+            try:
+                repo.git.worktree("add", "--detach", "--force", worktree, commit)
+                yield worktree
+            finally:
+                try:
+                    repo.git.worktree("remove", "--force", worktree)
+                except git.GitCommandError:
+                    pass
+                shutil.rmtree(worktree, ignore_errors=True)
+                repo.git.worktree("prune")
+        self.evict(keep=path)
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """Removes least recently used mirrors until the cache fits in max_bytes (mirrors in use are skipped)"""
+        if self.max_bytes <= 0:
+            return
+        mirrors = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.endswith(".git") and os.path.isdir(path):
+                mirrors.append((os.path.getmtime(path), path, _dir_size(path)))
+        total = sum(size for _, _, size in mirrors)
+        for _, path, size in sorted(mirrors):  # Oldest first
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            with self._lock(path, blocking=False) as locked:
+                if not locked:
+                    continue
+                shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            logging.info(f"Evicted mirror {os.path.basename(path)} ({size / 1e6:.1f} MB) from the mirror cache.")
+
+
+_mirror_cache: Optional[MirrorCache] = None
+_mirror_cache_lock = threading.Lock()
+
+
+def get_mirror_cache() -> Optional[MirrorCache]:
+    """The shared mirror cache, or None when REPO_MIRROR_MAX_BYTES is 0 (clone into a temp dir every run)"""
+    global _mirror_cache
+    if config.REPO_MIRROR_MAX_BYTES <= 0:
+        return None
+    with _mirror_cache_lock:
+        if _mirror_cache is None:
+            _mirror_cache = MirrorCache(config.REPO_MIRROR_DIR, config.REPO_MIRROR_MAX_BYTES)
+        return _mirror_cache
@@ -0,0 +1,234 @@
+# app/services/run_registry.py
+import os
+import json
+import time
+import socket
+import asyncio
+import sqlite3
+import logging
+import threading
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
+
+from app import config
+
+OWNER = f"{socket.gethostname()}:{os.getpid()}"  # This worker process
+
+
+class RunRegistry:
+    """
+    Cross-worker coordination for long-running runs, in a SQLite file shared by all worker
+    processes of a host.
+
+    - Leases: one run per key (e.g. per repository) at a time. The owner renews its leases from
+      a heartbeat thread; a lease that is not renewed within `lease_ttl` (crashed worker) can be
+      taken over.
+    - Events: every run's events are appended to a per-run ring buffer (the last `ring_size`
+      events), so a request arriving at any worker can attach to a run and replay it.
+    """
+
+    def __init__(self, path: str, lease_ttl: float = 30.0, ring_size: int = 2000):
+        self.path = os.path.abspath(path)
+        self.lease_ttl = lease_ttl
+        self.ring_size = ring_size
+        self._local = threading.local()
+        self._held: Dict[str, str] = {}  # key -> run_id of the leases this process renews
+        self._held_lock = threading.Lock()
+        self._heartbeat: Optional[threading.Thread] = None
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = self._connect()
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS leases (
+                key TEXT PRIMARY KEY,
+                run_id TEXT NOT NULL,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id TEXT PRIMARY KEY,
+                key TEXT NOT NULL,
+                owner TEXT NOT NULL,
+                status TEXT NOT NULL,
+                error TEXT,
+                started_at REAL NOT NULL,
+                finished_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS events (
+                run_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                payload TEXT NOT NULL,
+                PRIMARY KEY (run_id, seq)
+            );
+            """
+        )
+        self.purge(config.RUN_HISTORY_SECONDS)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # --- Leases ---
+    def acquire(self, key: str, run_id: str) -> Optional[str]:
+        """
+        Takes the lease for `key` on behalf of `run_id` (owned by this process).
+        Returns None on success, or the run_id of the live run that holds it.
+        """
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")  # Serializes competing workers
+        try:
+            row = conn.execute("SELECT run_id, expires_at FROM leases WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[1] > now:
+                conn.execute("COMMIT")
+                return row[0]
+            if row is not None:
+                # The previous owner stopped renewing; its run can never finish properly
+                conn.execute(
+                    "UPDATE runs SET status = 'abandoned', finished_at = ? WHERE run_id = ? AND finished_at IS NULL",
+                    (now, row[0]),
+                )
+            conn.execute(
+                "INSERT OR REPLACE INTO leases (key, run_id, owner, expires_at) VALUES (?, ?, ?, ?)",
+                (key, run_id, OWNER, now + self.lease_ttl),
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO runs (run_id, key, owner, status, started_at) VALUES (?, ?, ?, 'running', ?)",
+                (run_id, key, OWNER, now),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        with self._held_lock:
+            self._held[key] = run_id
+        self._ensure_heartbeat()
+        return None
+
+    def release(self, key: str, run_id: str, status: str, error: Optional[str] = None) -> None:
+        """Records the run's final status and frees the lease (if this run still holds it)."""
+        with self._held_lock:
+            if self._held.get(key) == run_id:
+                del self._held[key]
+        conn = self._connect()
+        conn.execute(
+            "UPDATE runs SET status = ?, error = ?, finished_at = ? WHERE run_id = ?",
+            (status, error, time.time(), run_id),
+        )
+        conn.execute("DELETE FROM leases WHERE key = ? AND run_id = ?", (key, run_id))
+
+    def _ensure_heartbeat(self) -> None:
+        with self._held_lock:
+            if self._heartbeat is None:
+                self._heartbeat = threading.Thread(target=self._renew_loop, name="run-lease-heartbeat", daemon=True)
+                self._heartbeat.start()
+
+    def _renew_loop(self) -> None:
+        while True:
+            time.sleep(self.lease_ttl / 3)
+            with self._held_lock:
+                held = list(self._held.items())
+            for key, run_id in held:
+                try:
+                    self._connect().execute(
+                        "UPDATE leases SET expires_at = ? WHERE key = ? AND run_id = ?",
+                        (time.time() + self.lease_ttl, key, run_id),
+                    )
+                except sqlite3.Error as e:
+                    logging.warning(f"Could not renew the lease of {key}: {e}")
+
+    def holder(self, key: str) -> Optional[str]:
+        row = self._connect().execute(
+            "SELECT run_id FROM leases WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    # --- Runs and events ---
+    def append_event(self, run_id: str, seq: int, event: Any) -> None:
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO events (run_id, seq, payload) VALUES (?, ?, ?)",
+            (run_id, seq, json.dumps(event)),
+        )
+        if seq % 100 == 0:
+            conn.execute("DELETE FROM events WHERE run_id = ? AND seq <= ?", (run_id, seq - self.ring_size))
+
+    def read_events(self, run_id: str, after_seq: int = -1) -> List[Tuple[int, Any]]:
+        rows = self._connect().execute(
+            "SELECT seq, payload FROM events WHERE run_id = ? AND seq > ? ORDER BY seq", (run_id, after_seq)
+        ).fetchall()
+        return [(seq, json.loads(payload)) for seq, payload in rows]
+
+    def run_info(self, run_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute(
+            "SELECT run_id, key, owner, status, error, started_at, finished_at FROM runs WHERE run_id = ?", (run_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("job_id", "key", "owner", "status", "error", "started_at", "finished_at"), row))
+
+    def purge(self, older_than: float) -> None:
+        """Drops finished runs (and their events) that ended more than `older_than` seconds ago."""
+        conn = self._connect()
+        cutoff = time.time() - older_than
+        old = [r[0] for r in conn.execute("SELECT run_id FROM runs WHERE finished_at < ?", (cutoff,))]
+        for run_id in old:
+            conn.execute("DELETE FROM events WHERE run_id = ?", (run_id,))
+            conn.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+
+
+class RemoteRun:
+    """A run owned by another worker process, followed through the registry (read-only)."""
+
+    def __init__(self, registry: RunRegistry, run_id: str, poll_interval: float = 0.25):
+        self.registry = registry
+        self.id = run_id
+        self.poll_interval = poll_interval
+
+    @property
+    def status(self) -> str:
+        info = self.registry.run_info(self.id)
+        return info["status"] if info else "unknown"
+
+    async def subscribe(self) -> AsyncGenerator[Any, None]:
+        """Replays the run's buffered events, then polls for new ones until the run ends."""
+        last_seq = -1
+        while True:
+            events = await asyncio.to_thread(self.registry.read_events, self.id, last_seq)
+            for seq, event in events:
+                last_seq = seq
+                yield event
+            if events:
+                continue
+            info = await asyncio.to_thread(self.registry.run_info, self.id)
+            if info is None:
+                return
+            if info["finished_at"] is not None:
+                # Events written between the last read and the end of the run
+                for seq, event in await asyncio.to_thread(self.registry.read_events, self.id, last_seq):
+                    yield event
+                return
+            if await asyncio.to_thread(self.registry.holder, info["key"]) != self.id:
+                yield "The worker running this generation stopped responding; retry to resume it."
+                return
+            await asyncio.sleep(self.poll_interval)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return self.registry.run_info(self.id) or {"job_id": self.id, "status": "unknown"}
+
+
+_registry: Optional[RunRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_run_registry() -> RunRegistry:
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = RunRegistry(config.RUN_REGISTRY_PATH, config.RUN_LEASE_TTL_SECONDS, config.RUN_EVENTS_RING_SIZE)
+        return _registry
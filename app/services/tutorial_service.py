@@ -1,21 +1,25 @@
-import uuid
 import os
+import json
 import re
 import glob
-import asyncio
 import logging
 import shutil
-from typing import AsyncGenerator, Dict, DefaultDict
-from collections import defaultdict
+import uuid
+from typing import Any, AsyncGenerator, Dict, Union
 from app.services.flow import create_tutorial_flow
-from app.utils.logger_config import QueueHandler # Assuming you have this file
+from app.services.checkpoint import FlowCheckpoint
+from app.services.manifest import load_manifest, save_manifest
+from app.services.jobs import Job, QUEUED, get_job_manager
+from app.services.run_registry import RemoteRun, get_run_registry
+from app.services.repo_mirror import get_mirror_cache
+from app.utils.logger_config import JobLogHandler
+from app.llm.scheduler import llm_run_context
+from app.utils.profiling import RunProfiler
+from app import config
 
 # --- Globals and Constants ---
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
 
-# This dictionary is shared across all requests to hold a unique lock for each repo.
-REPO_GENERATION_LOCKS: DefaultDict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
-
 DEFAULT_INCLUDE_PATTERNS = {
     "*.py", "*.js", "*.jsx", "*.ts", "*.tsx", "*.go", "*.java", "*.pyi", "*.pyx",
     "*.c", "*.cc", "*.cpp", "*.h", "*.md", "*.rst", "*Dockerfile",
@@ -40,47 +44,71 @@ def get_repo_name_from_url(url: str) -> str:
     return repo_name
 
 # --- Main Service Functions ---
-async def run_pipeline_streaming(repo_url: str) -> AsyncGenerator[str, None]:
+def run_tutorial_job(job: Job) -> str:
     """
-    Generates a tutorial from a repository URL, ensuring concurrency safety
-    and proper state management for completed or failed runs.
+    Generates a tutorial from a repository URL (runs on a job worker thread), with proper state
+    management for completed or failed runs. With `refresh=True`, an already generated tutorial
+    is updated incrementally: only chapters (and vector store chunks) whose source files changed
+    are regenerated.
+
+    Log lines are published as plain messages; per-stage measurements as `profile` events and
+    the whole report as a `profile_summary` event (also saved to profile.json).
     """
+    repo_url = job.params["repo_url"]
+    refresh = job.params.get("refresh", False)
     repo_name = get_repo_name_from_url(repo_url)
     output_dir = os.path.join(PROJECT_ROOT, "tutorials", repo_name)
     completion_marker = os.path.join(output_dir, "_SUCCESS")
+    checkpoint_path = os.path.join(output_dir, "_checkpoint.json")
+    corpus_dir = os.path.join(output_dir, "_corpus")  # Crawled files, on disk (kept with the checkpoint)
+    manifest_path = os.path.join(output_dir, "_manifest.json")
+    profile_path = os.path.join(output_dir, "profile.json")
+    refresh_manifest = None
 
-    # Acquire a lock specific to this repository to prevent race conditions.
-    async with REPO_GENERATION_LOCKS[repo_name]:
-        # First, check if a complete tutorial already exists.
-        if os.path.exists(completion_marker):
+    # No other job for this repo runs at the same time (jobs are keyed by repo),
+    # so the setup below can't race with another generation.
+    # First, check if a complete tutorial already exists.
+    if os.path.exists(completion_marker):
+        refresh_manifest = load_manifest(manifest_path) if refresh else None
+        if refresh_manifest is None:
             message = f"Tutorial for '{repo_name}' has already been successfully generated."
-            yield f"data: {message}\n\n"
-            yield f"data: DONE\n\n"
-            return
-        
-        # If no success marker, check if an incomplete directory exists from a failed run.
-        if os.path.isdir(output_dir):
-            logging.warning(f"Found incomplete tutorial for '{repo_name}'. Cleaning up before retry.")
-            # Safely delete the old directory and all its contents.
-            shutil.rmtree(output_dir)
-
-        # We are now clear to create a new directory for this generation attempt.
-        os.makedirs(output_dir, exist_ok=True)
-    
-    # The lock is released. The initial setup is done. Now, start the heavy lifting.
-    
-    # --- Per-request setup for isolated logging ---
-    queue: asyncio.Queue = asyncio.Queue()
-    handler = QueueHandler(queue)
+            if refresh:
+                message += " It has no manifest to refresh from; delete it to regenerate from scratch."
+            job.publish(message)
+            return "exists"
+
+    # If no success marker, check if an incomplete directory exists from a failed run.
+    # With a checkpoint we resume from it (a refresh that failed after taking the marker down
+    # resumes as a refresh: its plan is in the checkpoint); without one there is nothing to reuse.
+    if refresh_manifest is None and os.path.isdir(output_dir) and not os.path.exists(checkpoint_path):
+        logging.warning(f"Found incomplete tutorial for '{repo_name}'. Cleaning up before retry.")
+        # Safely delete the old directory and all its contents.
+        shutil.rmtree(output_dir)
+
+    # We are now clear to create a new directory for this generation attempt.
+    os.makedirs(output_dir, exist_ok=True)
+
+    # --- Per-job setup for isolated logging ---
+    handler = JobLogHandler(job)
     handler.setFormatter(logging.Formatter('%(message)s'))
 
-    run_id = uuid.uuid4().hex[:6]
+    run_id = job.id[:6]
     logger = logging.getLogger(f"tutorial_logger_{run_id}")
     logger.setLevel(logging.INFO)
     logger.handlers.clear()
     logger.addHandler(handler)
     logger.propagate = False
 
+    stages_completed = []
+
+    def emit_profile(stage: Dict[str, Any]) -> None:
+        job.publish({"event": "profile", "data": json.dumps(stage)})
+        if stage["kind"] == "node":
+            stages_completed.append(stage["stage"])
+            job.update_progress(stages_completed=list(stages_completed))
+
+    profiler = RunProfiler(emit=emit_profile)
+
     is_git_url = '.git' in repo_url or 'github.com' in repo_url
     repo_url_val = repo_url if is_git_url else None
     local_dir_val = None if is_git_url else repo_url
@@ -92,47 +120,124 @@ async def run_pipeline_streaming(repo_url: str) -> AsyncGenerator[str, None]:
         "include_patterns": DEFAULT_INCLUDE_PATTERNS,
         "exclude_patterns": DEFAULT_EXCLUDE_PATTERNS,
         "max_file_size": 500000,
+        "github_api_url": config.GITHUB_API_URL,
+        "github_fetch_mode": config.GITHUB_FETCH_MODE,  # "tarball": tree listing + one archive download
+        "github_download_concurrency": config.GITHUB_DOWNLOAD_CONCURRENCY,
+        "local_crawl_workers": config.LOCAL_CRAWL_READ_WORKERS,
+        "embedding_batch_size": config.EMBEDDING_BATCH_SIZE,  # Chunks per embeddings request when indexing
+        "embedding_concurrency": config.EMBEDDING_CONCURRENCY,  # Embeddings requests in flight
+        "mirror_cache": get_mirror_cache(),  # SSH / .git URLs: fetch into a cached mirror instead of cloning
         "language": "english",
         "use_cache": True,
         "max_abstraction_num": 10,
+        "chapter_concurrency": config.TUTORIAL_CHAPTER_CONCURRENCY,  # > 1 enables parallel chapter writing
+        "previous_chapters_token_budget": config.TUTORIAL_PREVIOUS_CHAPTERS_TOKEN_BUDGET,
+        "identify_context_tokens": config.TUTORIAL_IDENTIFY_CONTEXT_TOKENS,  # Larger codebases are identified in shards
+        "identify_shard_concurrency": config.TUTORIAL_IDENTIFY_SHARD_CONCURRENCY,
+        "file_context": config.TUTORIAL_FILE_CONTEXT,  # "digest" uses cached file skeletons in the overview prompts
         "files": [],
         "abstractions": [],
         "relationships": {},
         "chapter_order": [],
         "chapters": [],
         "final_output_dir": None,
-        "logger": logger
+        "logger": logger,
+        "refresh_manifest": refresh_manifest,  # Previous run's manifest in refresh mode, else None
+        # Saved after every node/chapter so a retry resumes where the failed attempt stopped
+        "checkpoint": FlowCheckpoint.load(checkpoint_path),
+        "corpus_dir": corpus_dir,  # FetchRepo stores the crawled files here instead of in memory
+        "completion_marker": completion_marker,  # Removed by CombineTutorial before it writes any file
+        "profiler": profiler,
     }
 
-    async def run_flow():
-        """Wrapper to run the synchronous flow and handle completion status."""
+    try:
+        flow = create_tutorial_flow()
+        # Tag this run's LLM calls so the scheduler shares capacity fairly between concurrent runs
+        with llm_run_context(f"tutorial:{repo_name}:{run_id}"):
+            flow.run(shared)
+
+        # CRITICAL STEP: Create the marker file only after the flow completes successfully.
+        with open(completion_marker, "w") as f:
+            f.write("completed")
+        # Remember what this tutorial was built from, for later incremental refreshes
+        save_manifest(manifest_path, shared)
+        shared["checkpoint"].clear()
+        shutil.rmtree(corpus_dir, ignore_errors=True)  # Only needed to resume
+
+        logger.info("Tutorial generation successful. Completion marker created.")
+        return "completed"
+
+    except Exception as e:
+        logger.error(f"TUTORIAL GENERATION FAILED for {repo_name}: {e}", exc_info=True)
+        # The checkpoint stays in place so the next attempt resumes from the last completed step.
+        raise
+    finally:
+        # Saved for failed runs too; a retry overwrites it with the new attempt's profile
+        report = profiler.to_dict()
         try:
-            flow = create_tutorial_flow()
-            await asyncio.to_thread(flow.run, shared)
+            profiler.save(profile_path)
+        except OSError as e:
+            logger.warning(f"Could not save profile to {profile_path}: {e}")
+        job.publish({"event": "profile_summary", "data": json.dumps(report)})
 
-            # CRITICAL STEP: Create the marker file only after the flow completes successfully.
-            with open(completion_marker, "w") as f:
-                f.write("completed")
-            
-            logger.info("Tutorial generation successful. Completion marker created.")
 
-        except Exception as e:
-            logger.error(f"TUTORIAL GENERATION FAILED for {repo_name}: {e}", exc_info=True)
-            # The incomplete directory will be cleaned up by the next run attempt.
-        finally:
-            await queue.put("DONE")
+def submit_tutorial_job(repo_url: str, refresh: bool = False, priority: int = 0) -> Union[Job, RemoteRun]:
+    """
+    Queues a tutorial generation job. While a generation of the same repository is queued or
+    running, in this worker or in another worker process, that run is returned instead of
+    starting a second one.
+    """
+    repo_name = get_repo_name_from_url(repo_url)
+    key = f"tutorial:{repo_name}"
+    manager = get_job_manager()
+    job = manager.find_active(key)
+    if job is not None:
+        return job
+
+    # Cross-worker dedupe: whoever holds the repo's lease runs it; everyone else attaches
+    registry = get_run_registry()
+    job_id = uuid.uuid4().hex
+    holder = registry.acquire(key, job_id)
+    if holder is not None:
+        logging.info(f"Generation of {repo_name} is already running as {holder}; attaching.")
+        return manager.get(holder) or RemoteRun(registry, holder)
+
+    job, created = manager.submit(
+        "tutorial",
+        key=key,
+        target=run_tutorial_job,
+        priority=priority,
+        params={"repo_url": repo_url, "refresh": refresh},
+        job_id=job_id,
+        on_event=lambda seq, event: registry.append_event(job_id, seq, event),
+        on_finish=lambda job: registry.release(key, job.id, job.status, job.error),
+    )
+    if not created:
+        # Lost a race with a submission in this process after the lease was taken
+        registry.release(key, job_id, "duplicate")
+    return job
 
-    asyncio.create_task(run_flow())
 
-    while True:
-        message = await queue.get()
-        if message == "DONE":
-            break
+async def stream_job_events(job: Union[Job, RemoteRun]) -> AsyncGenerator[Union[str, Dict[str, Any]], None]:
+    """SSE stream of a job: log lines as `data:` messages, structured events as-is, then DONE."""
+    if job.status == QUEUED:
+        yield f"data: Queued as job {job.id}; waiting for a free worker...\n\n"
+    async for message in job.subscribe():
+        if isinstance(message, dict):  # Structured event (profiling)
+            yield message
+            continue
         yield f"data: {message.strip()}\n\n"
 
     yield f"data: DONE\n\n"
 
 
+async def run_pipeline_streaming(repo_url: str, refresh: bool = False, priority: int = 0) -> AsyncGenerator[Union[str, Dict[str, Any]], None]:
+    """Submits (or attaches to) the repository's generation job and streams its events."""
+    job = submit_tutorial_job(repo_url, refresh=refresh, priority=priority)
+    async for message in stream_job_events(job):
+        yield message
+
+
 def fetch_existing_tutorial(repo_url: str) -> Dict:
     """
     Safely fetches a pre-generated tutorial, ensuring it's complete
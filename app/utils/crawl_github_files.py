@@ -5,16 +5,110 @@ import tempfile
 import git
 import time
 import fnmatch
-from typing import Union, Set, List, Dict, Tuple, Any
+import tarfile
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from typing import Union, Set, List, Dict, Tuple, Any, Optional
 from urllib.parse import urlparse
 
+# One pooled session for every crawl: connections are reused across requests, download threads and jobs
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+_SESSION_POOL_SIZE = 32  # Upper bound on concurrent connections per host
+
+
+def _get_session() -> requests.Session:
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=_SESSION_POOL_SIZE)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+class _RateLimitGate:
+    """
+    Shared pause for all requests made with one token. When any request hits GitHub's rate
+    limit, every thread waits for the reset before its next request, instead of each call
+    sleeping and retrying on its own.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._resume_at = 0.0
+
+    def wait(self) -> None:
+        while True:
+            with self._lock:
+                delay = self._resume_at - time.time()
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+    def pause_until(self, resume_at: float) -> bool:
+        """Returns True if this call extended the pause (so only one thread reports it)"""
+        with self._lock:
+            if resume_at <= self._resume_at:
+                return False
+            self._resume_at = resume_at
+            return True
+
+
+_rate_limit_gates: Dict[Optional[str], _RateLimitGate] = {}  # GitHub's limits are per token
+_rate_limit_gates_lock = threading.Lock()
+
+
+def _rate_limit_resume_at(response) -> Optional[float]:
+    """When requests may resume, if `response` is a rate-limit rejection; else None"""
+    if response.status_code == 429 or (response.status_code == 403 and 'rate limit' in response.text.lower()):
+        retry_after = response.headers.get('Retry-After')  # Secondary rate limits
+        if retry_after:
+            return time.time() + float(retry_after)
+        return max(float(response.headers.get('X-RateLimit-Reset', 0)), time.time()) + 1
+    return None
+
+
+def _github_get(url, headers, token=None, **kwargs):
+    """GET through the pooled session; on a rate-limit rejection, pauses every request using `token` and retries"""
+    with _rate_limit_gates_lock:
+        gate = _rate_limit_gates.setdefault(token, _RateLimitGate())
+    session = _get_session()
+    while True:
+        gate.wait()
+        response = session.get(url, headers=headers, **kwargs)
+        resume_at = _rate_limit_resume_at(response)
+        if resume_at is None:
+            return response
+        response.close()
+        if gate.pause_until(resume_at):
+            print(f"Rate limit exceeded. Pausing all requests for {max(resume_at - time.time(), 0):.0f} seconds...")
+
+
+@contextlib.contextmanager
+def _temp_clone(repo_url):
+    """Full clone into a temp dir that is removed afterwards"""
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        print(f"Cloning SSH repo {repo_url} to temp dir {tmpdirname} ...")
+        git.Repo.clone_from(repo_url, tmpdirname)
+        yield tmpdirname
+
+
 def crawl_github_files(
     repo_url, 
     token=None, 
     max_file_size: int = 1 * 1024 * 1024,  # 1 MB
     use_relative_paths: bool = False,
     include_patterns: Union[str, Set[str]] = None,
-    exclude_patterns: Union[str, Set[str]] = None
+    exclude_patterns: Union[str, Set[str]] = None,
+    api_url: str = "https://api.github.com",
+    fetch_mode: str = "tarball",
+    max_workers: int = 8,
+    mirror_cache=None,
+    sink=None,
 ):
     """
     Crawl files from a specific path in a GitHub repository at a specific commit.
@@ -32,6 +126,16 @@ def crawl_github_files(
                                                        If None, all files are included.
         exclude_patterns (str or set of str, optional): Pattern or set of patterns specifying which files to exclude.
                                                        If None, no files are excluded.
+        api_url (str, optional): Base URL of the GitHub API (GitHub Enterprise, or a local stand-in for benchmarks)
+        fetch_mode (str, optional): "tarball" (default) lists the whole tree with one recursive git-trees call and
+                                    downloads the selected files from the repository tarball in one streamed request;
+                                    "contents" walks the contents API (one call per directory + one GET per file).
+                                    "tarball" falls back to "contents" if the tree is truncated or the download fails.
+        max_workers (int, optional): Concurrent file downloads in "contents" mode (default: 8)
+        mirror_cache (MirrorCache, optional): For SSH / .git URLs, check out from this cache of bare mirrors
+                                              (fetching only what changed) instead of cloning into a temp dir
+        sink (mapping, optional): Where to put the files (`sink[path] = content`, e.g. a FileCorpus that
+                                  stores them on disk); defaults to a new dict
 
     Returns:
         dict: Dictionary with files and statistics
@@ -63,11 +167,15 @@ def crawl_github_files(
     is_ssh_url = repo_url.startswith("git@") or repo_url.endswith(".git")
 
     if is_ssh_url:
-        # Clone repo via SSH to temp dir
-        with tempfile.TemporaryDirectory() as tmpdirname:
-            print(f"Cloning SSH repo {repo_url} to temp dir {tmpdirname} ...")
+        # Clone repo via SSH: from the mirror cache if there is one, else to a temp dir
+        if mirror_cache is not None:
+            print(f"Checking out {repo_url} from the mirror cache ...")
+            checkout, source = mirror_cache.checkout(repo_url), "mirror"
+        else:
+            checkout, source = _temp_clone(repo_url), "ssh_clone"
+        with contextlib.ExitStack() as stack:
             try:
-                repo = git.Repo.clone_from(repo_url, tmpdirname)
+                tmpdirname = stack.enter_context(checkout)
             except Exception as e:
                 print(f"Error cloning repo: {e}")
                 return {"files": {}, "stats": {"error": str(e)}}
@@ -78,7 +186,7 @@ def crawl_github_files(
             # Optionally, user can pass ref explicitly in future API
 
             # Walk directory
-            files = {}
+            files = sink if sink is not None else {}
             skipped_files = []
 
             for root, dirs, filenames in os.walk(tmpdirname):
@@ -120,7 +228,7 @@ def crawl_github_files(
                     "base_path": None,
                     "include_patterns": include_patterns,
                     "exclude_patterns": exclude_patterns,
-                    "source": "ssh_clone"
+                    "source": source
                 }
             }
 
@@ -140,11 +248,14 @@ def crawl_github_files(
     if token:
         headers["Authorization"] = f"token {token}"
 
+    def api_get(url, **kwargs):
+        return _github_get(url, headers, token, **kwargs)
+
     def fetch_branches(owner: str, repo: str):
         """Get brancshes of the repository"""
 
-        url = f"https://api.github.com/repos/{owner}/{repo}/branches"
-        response = requests.get(url, headers=headers)
+        url = f"{api_url}/repos/{owner}/{repo}/branches"
+        response = api_get(url)
 
         if response.status_code == 404:
             if not token:
@@ -164,8 +275,8 @@ def crawl_github_files(
     def check_tree(owner: str, repo: str, tree: str):
         """Check the repository has the given tree"""
 
-        url = f"https://api.github.com/repos/{owner}/{repo}/git/trees/{tree}"
-        response = requests.get(url, headers=headers)
+        url = f"{api_url}/repos/{owner}/{repo}/git/trees/{tree}"
+        response = api_get(url)
 
         return True if response.status_code == 200 else False 
 
@@ -208,22 +319,56 @@ def crawl_github_files(
         specific_path = ""
     
     # Dictionary to store path -> content mapping
-    files = {}
+    files = sink if sink is not None else {}
     skipped_files = []
     
+    pending_downloads = []  # (rel_path, future), in listing order
+    download_pool = None  # Set while fetch_contents runs
+
+    def download_file(item, rel_path):
+        """Content of one file from the contents API listing, or None if it is skipped"""
+        item_path = item["path"]
+        file_size = item.get("size", 0)
+        if "download_url" in item and item["download_url"]:
+            file_response = api_get(item["download_url"])
+
+            # Final size check in case content-length header is available but differs from metadata
+            content_length = int(file_response.headers.get('content-length', 0))
+            if content_length > max_file_size:
+                skipped_files.append((item_path, content_length))
+                print(f"Skipping {rel_path}: Content length ({content_length} bytes) exceeds limit ({max_file_size} bytes)")
+                return None
+
+            if file_response.status_code == 200:
+                print(f"Downloaded: {rel_path} ({file_size} bytes) ")
+                return file_response.text
+            print(f"Failed to download {rel_path}: {file_response.status_code}")
+            return None
+
+        # Alternative method if download_url is not available
+        content_response = api_get(item["url"])
+        if content_response.status_code != 200:
+            print(f"Failed to get content for {rel_path}: {content_response.status_code}")
+            return None
+        content_data = content_response.json()
+        if content_data.get("encoding") != "base64" or "content" not in content_data:
+            print(f"Unexpected content format for {rel_path}")
+            return None
+        # Check size of base64 content before decoding
+        if len(content_data["content"]) * 0.75 > max_file_size:  # Approximate size calculation
+            estimated_size = int(len(content_data["content"]) * 0.75)
+            skipped_files.append((item_path, estimated_size))
+            print(f"Skipping {rel_path}: Encoded content exceeds size limit")
+            return None
+        print(f"Downloaded: {rel_path} ({file_size} bytes)")
+        return base64.b64decode(content_data["content"]).decode('utf-8')
+
     def fetch_contents(path):
         """Fetch contents of the repository at a specific path and commit"""
-        url = f"https://api.github.com/repos/{owner}/{repo}/contents/{path}"
+        url = f"{api_url}/repos/{owner}/{repo}/contents/{path}"
         params = {"ref": ref} if ref != None else {}
         
-        response = requests.get(url, headers=headers, params=params)
-        
-        if response.status_code == 403 and 'rate limit exceeded' in response.text.lower():
-            reset_time = int(response.headers.get('X-RateLimit-Reset', 0))
-            wait_time = max(reset_time - time.time(), 0) + 1
-            print(f"Rate limit exceeded. Waiting for {wait_time:.0f} seconds...")
-            time.sleep(wait_time)
-            return fetch_contents(path)
+        response = api_get(url, params=params)
             
         if response.status_code == 404:
             if not token:
@@ -273,50 +418,111 @@ def crawl_github_files(
                     print(f"Skipping {rel_path}: File size ({file_size} bytes) exceeds limit ({max_file_size} bytes)")
                     continue
                 
-                # For files, get raw content
-                if "download_url" in item and item["download_url"]:
-                    file_url = item["download_url"]
-                    file_response = requests.get(file_url, headers=headers)
-                    
-                    # Final size check in case content-length header is available but differs from metadata
-                    content_length = int(file_response.headers.get('content-length', 0))
-                    if content_length > max_file_size:
-                        skipped_files.append((item_path, content_length))
-                        print(f"Skipping {rel_path}: Content length ({content_length} bytes) exceeds limit ({max_file_size} bytes)")
-                        continue
-                        
-                    if file_response.status_code == 200:
-                        files[rel_path] = file_response.text
-                        print(f"Downloaded: {rel_path} ({file_size} bytes) ")
-                    else:
-                        print(f"Failed to download {rel_path}: {file_response.status_code}")
-                else:
-                    # Alternative method if download_url is not available
-                    content_response = requests.get(item["url"], headers=headers)
-                    if content_response.status_code == 200:
-                        content_data = content_response.json()
-                        if content_data.get("encoding") == "base64" and "content" in content_data:
-                            # Check size of base64 content before decoding
-                            if len(content_data["content"]) * 0.75 > max_file_size:  # Approximate size calculation
-                                estimated_size = int(len(content_data["content"]) * 0.75)
-                                skipped_files.append((item_path, estimated_size))
-                                print(f"Skipping {rel_path}: Encoded content exceeds size limit")
-                                continue
-                                
-                            file_content = base64.b64decode(content_data["content"]).decode('utf-8')
-                            files[rel_path] = file_content
-                            print(f"Downloaded: {rel_path} ({file_size} bytes)")
-                        else:
-                            print(f"Unexpected content format for {rel_path}")
-                    else:
-                        print(f"Failed to get content for {rel_path}: {content_response.status_code}")
+                # Downloaded on the pool; the directory walk continues meanwhile
+                pending_downloads.append((rel_path, download_pool.submit(download_file, item, rel_path)))
             
             elif item["type"] == "dir":
                 # Recursively process subdirectories
                 fetch_contents(item_path)
     
+    def to_rel_path(item_path):
+        if use_relative_paths and specific_path and item_path.startswith(specific_path):
+            return item_path[len(specific_path):].lstrip('/')
+        return item_path
+
+    def fetch_tree_and_tarball():
+        """
+        Fast path: one recursive git-trees call lists every file with its size, the
+        include/exclude/size filters run locally, and the selected files are read from the
+        repository tarball, streamed and extracted in memory. Two requests instead of one per
+        directory + one per file. Returns False if the caller should walk the contents API instead.
+        """
+        response = api_get(f"{api_url}/repos/{owner}/{repo}/git/trees/{ref or 'HEAD'}", params={"recursive": "1"})
+        if response.status_code != 200:
+            print(f"Could not list the tree of {owner}/{repo} ({response.status_code}); using the contents API.")
+            return False
+        tree = response.json()
+        if tree.get("truncated"):
+            # Trees over GitHub's listing limit come back incomplete
+            print(f"The tree of {owner}/{repo} is too large for one listing; using the contents API.")
+            return False
+
+        prefix = specific_path.rstrip('/') + '/' if specific_path else ""
+        wanted = {}  # path in the repo -> path in the result, in tree order
+        for item in tree.get("tree", []):
+            item_path = item["path"]
+            # Blobs only: skips directories, submodules ("commit") and symlinks (mode 120000)
+            if item["type"] != "blob" or item.get("mode") == "120000":
+                continue
+            if prefix and not item_path.startswith(prefix) and item_path != specific_path:
+                continue
+            rel_path = to_rel_path(item_path)
+            if not should_include_file(rel_path, item_path.rsplit('/', 1)[-1]):
+                print(f"Skipping {rel_path}: Does not match include/exclude patterns")
+                continue
+            file_size = item.get("size", 0)
+            if file_size > max_file_size:
+                skipped_files.append((item_path, file_size))
+                print(f"Skipping {rel_path}: File size ({file_size} bytes) exceeds limit ({max_file_size} bytes)")
+                continue
+            wanted[item_path] = rel_path
+        if not wanted:
+            return True
+
+        tarball_url = f"{api_url}/repos/{owner}/{repo}/tarball" + (f"/{ref}" if ref else "")
+        downloaded = set()
+        try:
+            with api_get(tarball_url, stream=True) as response:
+                if response.status_code != 200:
+                    print(f"Could not download the tarball of {owner}/{repo} ({response.status_code}); using the contents API.")
+                    return False
+                response.raw.decode_content = True
+                # "r|gz": sequential stream, members are read as they arrive (no temp file for the archive)
+                with tarfile.open(fileobj=response.raw, mode="r|gz") as archive:
+                    for member in archive:
+                        if not member.isfile():
+                            continue
+                        # Members are "<owner>-<repo>-<sha>/<path>"
+                        item_path = member.name.split('/', 1)[-1]
+                        if item_path not in wanted:
+                            continue
+                        if member.size > max_file_size:
+                            skipped_files.append((item_path, member.size))
+                            continue
+                        content = archive.extractfile(member).read().decode('utf-8', errors='replace')
+                        files[wanted[item_path]] = content
+                        downloaded.add(item_path)
+                        print(f"Downloaded: {wanted[item_path]} ({len(content)} bytes)")
+        except (requests.RequestException, tarfile.TarError, EOFError, OSError) as e:
+            print(f"Failed to read the tarball of {owner}/{repo}: {e}; using the contents API.")
+            return False
+
+        for item_path, rel_path in wanted.items():
+            if item_path not in downloaded:
+                print(f"Failed to download {rel_path}: not in the tarball")
+        # Keep the listing's order
+        order = [rel_path for item_path, rel_path in wanted.items() if item_path in downloaded]
+        if hasattr(files, "reorder"):
+            files.reorder(order)
+        else:
+            ordered = {rel_path: files[rel_path] for rel_path in order}
+            files.clear()
+            files.update(ordered)
+        return True
+
     # Start crawling from the specified path
-    fetch_contents(specific_path)
+    source = "contents"
+    if fetch_mode == "tarball" and fetch_tree_and_tarball():
+        source = "tarball"
+    else:
+        files.clear()
+        skipped_files.clear()
+        with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="github-download") as download_pool:
+            fetch_contents(specific_path)
+            for rel_path, future in pending_downloads:  # Keep the listing's order
+                content = future.result()
+                if content is not None:
+                    files[rel_path] = content
     
     return {
         "files": files,
@@ -326,7 +532,8 @@ def crawl_github_files(
             "skipped_files": skipped_files,
             "base_path": specific_path if use_relative_paths else None,
             "include_patterns": include_patterns,
-            "exclude_patterns": exclude_patterns
+            "exclude_patterns": exclude_patterns,
+            "source": source
         }
     }
 
@@ -1,6 +1,21 @@
 import os
+import re
 import fnmatch
 import pathspec
+from concurrent.futures import ThreadPoolExecutor
+
+
+def compile_patterns(patterns):
+    """
+    One regex for a set of fnmatch patterns (same semantics as fnmatch.fnmatch on POSIX),
+    so a path is checked with a single match instead of a loop over the patterns.
+    Returns None for no patterns.
+    """
+    if not patterns:
+        return None
+    if isinstance(patterns, str):
+        patterns = {patterns}
+    return re.compile("|".join(f"(?:{fnmatch.translate(p)})" for p in sorted(patterns)))
 
 
 def crawl_local_files(
@@ -9,6 +24,8 @@ def crawl_local_files(
     exclude_patterns=None,
     max_file_size=None,
     use_relative_paths=True,
+    max_workers=1,
+    sink=None,
 ):
     """
     Crawl files in a local directory with similar interface as crawl_github_files.
@@ -18,6 +35,9 @@ def crawl_local_files(
         exclude_patterns (set): File patterns to exclude (e.g. {"tests/*"})
         max_file_size (int): Maximum file size in bytes
         use_relative_paths (bool): Whether to use paths relative to directory
+        max_workers (int): Threads that stat and read the selected files (1: serial)
+        sink (mapping, optional): Where to put the files (`sink[path] = content`, e.g. a FileCorpus
+                                  that stores them on disk); defaults to a new dict
 
     Returns:
         dict: {"files": {filepath: content}}
@@ -25,8 +45,6 @@ def crawl_local_files(
     if not os.path.isdir(directory):
         raise ValueError(f"Directory does not exist: {directory}")
 
-    files_dict = {}
-
     # --- Load .gitignore ---
     gitignore_path = os.path.join(directory, ".gitignore")
     gitignore_spec = None
@@ -39,93 +57,78 @@ def crawl_local_files(
         except Exception as e:
             print(f"Warning: Could not read or parse .gitignore file {gitignore_path}: {e}")
 
-    all_files = []
+    # Patterns are compiled once; every path is then a single regex match
+    include_re = compile_patterns(include_patterns)
+    exclude_re = compile_patterns(exclude_patterns)
+    # Exclude patterns ending in "*" that match "<dir>/" match every path under <dir>, so the
+    # directory is pruned before descent (e.g. ".git/*", "*tests/*", "*test*")
+    prune_re = compile_patterns({p for p in (exclude_patterns or ()) if p.endswith("*")})
+
+    selected = []  # (filepath, relpath) of the included files, in walk order
+    excluded_count = 0
     for root, dirs, files in os.walk(directory):
-        # Filter directories using .gitignore and exclude_patterns early
-        excluded_dirs = set()
+        # Filter directories using .gitignore and exclude_patterns before descending
+        kept_dirs = []
         for d in dirs:
-            dirpath_rel = os.path.relpath(os.path.join(root, d), directory)
-
-            if gitignore_spec and gitignore_spec.match_file(dirpath_rel):
-                excluded_dirs.add(d)
+            dirpath = os.path.join(root, d)
+            dirpath_rel = os.path.relpath(dirpath, directory)
+            if gitignore_spec and (gitignore_spec.match_file(dirpath_rel) or gitignore_spec.match_file(dirpath_rel + "/")):
                 continue
-
-            if exclude_patterns:
-                for pattern in exclude_patterns:
-                    if fnmatch.fnmatch(dirpath_rel, pattern) or fnmatch.fnmatch(d, pattern):
-                        excluded_dirs.add(d)
-                        break
-
-        for d in dirs.copy():
-            if d in excluded_dirs:
-                dirs.remove(d)
+            if exclude_re and (exclude_re.match(dirpath_rel) or exclude_re.match(d)):
+                continue
+            if prune_re and prune_re.match((dirpath_rel if use_relative_paths else dirpath) + "/"):
+                continue
+            kept_dirs.append(d)
+        dirs[:] = kept_dirs
 
         for filename in files:
             filepath = os.path.join(root, filename)
-            all_files.append(filepath)
-
-    total_files = len(all_files)
-    processed_files = 0
-
-    for filepath in all_files:
-        relpath = os.path.relpath(filepath, directory) if use_relative_paths else filepath
-
-        # --- Exclusion check ---
-        excluded = False
-        if gitignore_spec and gitignore_spec.match_file(relpath):
-            excluded = True
-
-        if not excluded and exclude_patterns:
-            for pattern in exclude_patterns:
-                if fnmatch.fnmatch(relpath, pattern):
-                    excluded = True
-                    break
-
-        included = False
-        if include_patterns:
-            for pattern in include_patterns:
-                if fnmatch.fnmatch(relpath, pattern):
-                    included = True
-                    break
-        else:
-            included = True
-
-        processed_files += 1 # Increment processed count regardless of inclusion/exclusion
-
-        status = "processed"
-        if not included or excluded:
-            status = "skipped (excluded)"
-            # Print progress for skipped files due to exclusion
-            if total_files > 0:
-                percentage = (processed_files / total_files) * 100
-                rounded_percentage = int(percentage)
-                print(f"\033[92mProgress: {processed_files}/{total_files} ({rounded_percentage}%) {relpath} [{status}]\033[0m")
-            continue # Skip to next file if not included or excluded
-
-        if max_file_size and os.path.getsize(filepath) > max_file_size:
-            status = "skipped (size limit)"
-            # Print progress for skipped files due to size limit
-            if total_files > 0:
-                percentage = (processed_files / total_files) * 100
-                rounded_percentage = int(percentage)
-                print(f"\033[92mProgress: {processed_files}/{total_files} ({rounded_percentage}%) {relpath} [{status}]\033[0m")
-            continue # Skip large files
+            relpath = os.path.relpath(filepath, directory) if use_relative_paths else filepath
+            if (
+                (gitignore_spec and gitignore_spec.match_file(relpath))
+                or (exclude_re and exclude_re.match(relpath))
+                or (include_re and not include_re.match(relpath))
+            ):
+                excluded_count += 1
+                continue
+            selected.append((filepath, relpath))
 
-        # --- File is being processed ---        
+    def read(entry):
+        filepath, relpath = entry
         try:
+            if max_file_size and os.path.getsize(filepath) > max_file_size:
+                return relpath, None, "size"
             with open(filepath, "r", encoding="utf-8-sig") as f:
-                content = f.read()
-            files_dict[relpath] = content
+                return relpath, f.read(), None
         except Exception as e:
             print(f"Warning: Could not read file {filepath}: {e}")
-            status = "skipped (read error)"
-
-        # --- Print progress for processed or error files ---
-        if total_files > 0:
-            percentage = (processed_files / total_files) * 100
-            rounded_percentage = int(percentage)
-            print(f"\033[92mProgress: {processed_files}/{total_files} ({rounded_percentage}%) {relpath} [{status}]\033[0m")
+            return relpath, None, "error"
+
+    def read_all():
+        # Contents are handed over as they are read, so with a sink only a batch is in memory at a time
+        if max_workers and max_workers > 1 and len(selected) > 1:
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                for start in range(0, len(selected), 256):
+                    yield from pool.map(read, selected[start:start + 256])  # map keeps the walk order
+        else:
+            for entry in selected:
+                yield read(entry)
+
+    files_dict = sink if sink is not None else {}
+    too_large = unreadable = 0
+    for relpath, content, skipped in read_all():
+        if skipped == "size":
+            too_large += 1
+        elif skipped == "error":
+            unreadable += 1
+        else:
+            files_dict[relpath] = content
 
+    # One summary line instead of a progress line per file
+    print(
+        f"Crawled {directory}: {len(files_dict)} files read, {excluded_count} excluded by patterns, "
+        f"{too_large} over the size limit, {unreadable} unreadable."
+    )
     return {"files": files_dict}
 
 
@@ -1,19 +1,3 @@
 # app/llm/embedder.py
-from openai import OpenAI
-from langchain_openai import OpenAIEmbeddings
-import os
-
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-def get_embedding(text: str, model="text-embedding-3-small"):
-    response = client.embeddings.create(
-        input=[text],
-        model=model
-    )
-    return response.data[0].embedding
-
-def get_embedding_vector():
-    return OpenAIEmbeddings(
-        model="text-embedding-3-small",
-        openai_api_key=os.getenv("OPENAI_API_KEY")
-    )
\ No newline at end of file
+# Kept for backwards compatibility; the shared clients live in app/llm.
+from app.llm.embedder import get_embedding, get_embedding_vector
@@ -10,3 +10,13 @@ class QueueHandler(logging.Handler):
     def emit(self, record):
         msg = self.format(record)
         self.queue.put_nowait(msg)
+
+
+class JobLogHandler(logging.Handler):
+    """Publishes log records to a background job's event stream (safe to use from worker threads)."""
+    def __init__(self, job):
+        super().__init__()
+        self.job = job
+
+    def emit(self, record):
+        self.job.publish(self.format(record))
@@ -0,0 +1,220 @@
+# app/utils/profiling.py
+"""
+Per-stage profiling for tutorial runs.
+
+`RunProfiler.stage(name)` times a block and makes it the "current stage" (a contextvar,
+so it follows the work into asyncio.to_thread and copy_context() worker threads).
+Anything that runs inside it - LLM calls via `record_llm_call`, crawlers/embedders via
+`add_bytes` - is attributed to that stage and to its enclosing stages.
+
+Memory: while stages are open, a sampler thread reads the process RSS every
+RSS_SAMPLE_SECONDS; each stage reports its RSS at start, the peak sampled while it ran and
+the growth (peak - start). RSS is per process, so stages running at the same time (other jobs
+in thread mode, background indexing) see each other's allocations.
+"""
+import os
+import sys
+import json
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import resource  # Not available on Windows
+except ImportError:
+    resource = None
+
+_current_stage: contextvars.ContextVar[Optional["StageStats"]] = contextvars.ContextVar("profile_stage", default=None)
+_lock = threading.Lock()
+
+RSS_SAMPLE_SECONDS = 0.05
+try:
+    _PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = 4096
+
+
+def current_rss_mb() -> Optional[float]:
+    """Resident set size of this process right now, in MB (None without /proc, e.g. macOS/Windows)."""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * _PAGE_SIZE / (1024 * 1024)
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process so far (lifetime high-water mark), in MB (None where unsupported)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+class StageStats:
+    def __init__(self, name: str, kind: str, parent: Optional["StageStats"] = None):
+        self.name = name
+        self.kind = kind
+        self.parent = parent
+        self.wall_seconds = 0.0
+        self.llm_calls = 0
+        self.llm_cache_hits = 0
+        self.llm_seconds = 0.0
+        self.prompt_tokens = 0
+        self.response_tokens = 0
+        self.bytes_processed = 0
+        self.rss_start_mb: Optional[float] = None
+        self.peak_rss_mb: Optional[float] = None  # Highest RSS sampled while the stage ran
+        self.skipped = False
+
+    @property
+    def rss_growth_mb(self) -> Optional[float]:
+        if self.rss_start_mb is None or self.peak_rss_mb is None:
+            return None
+        return self.peak_rss_mb - self.rss_start_mb
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "stage": self.name,
+            "kind": self.kind,
+            "wall_seconds": round(self.wall_seconds, 3),
+            "llm_calls": self.llm_calls,
+            "llm_cache_hits": self.llm_cache_hits,
+            "llm_seconds": round(self.llm_seconds, 3),
+            "prompt_tokens": self.prompt_tokens,
+            "response_tokens": self.response_tokens,
+            "bytes_processed": self.bytes_processed,
+            "rss_start_mb": _round_mb(self.rss_start_mb),
+            "peak_rss_mb": _round_mb(self.peak_rss_mb),
+            "rss_growth_mb": _round_mb(self.rss_growth_mb),
+            "skipped": self.skipped,
+        }
+
+
+def _round_mb(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value, 1)
+
+
+class _RssSampler:
+    """Samples the RSS into the peaks of the open stages; the thread runs only while some are open."""
+
+    def __init__(self):
+        self._stages: List[StageStats] = []
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, stats: StageStats) -> None:
+        stats.rss_start_mb = stats.peak_rss_mb = current_rss_mb()
+        if stats.rss_start_mb is None:
+            return
+        with self._cond:
+            self._stages.append(stats)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="rss-sampler", daemon=True)
+                self._thread.start()
+
+    def stop(self, stats: StageStats) -> None:
+        with self._cond:
+            if stats in self._stages:
+                self._stages.remove(stats)
+                self._sample([stats])  # Last reading, so short stages get at least two
+
+    def _sample(self, stages: List[StageStats]) -> None:
+        rss = current_rss_mb()
+        if rss is not None:
+            for stats in stages:
+                stats.peak_rss_mb = max(stats.peak_rss_mb or 0.0, rss)
+
+    def _loop(self) -> None:
+        with self._cond:
+            while self._stages:
+                self._sample(self._stages)
+                self._cond.wait(timeout=RSS_SAMPLE_SECONDS)
+            self._thread = None
+
+
+_rss_sampler = _RssSampler()
+
+
+class RunProfiler:
+    def __init__(self, emit: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.stages: List[StageStats] = []
+        self.started_at = time.time()
+        self._emit = emit
+
+    @contextmanager
+    def stage(self, name: str, kind: str = "node"):
+        stats = StageStats(name, kind, parent=_current_stage.get())
+        token = _current_stage.set(stats)
+        _rss_sampler.start(stats)
+        start = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            stats.wall_seconds = time.perf_counter() - start
+            _rss_sampler.stop(stats)
+            _current_stage.reset(token)
+            with _lock:
+                self.stages.append(stats)
+            if self._emit is not None:
+                self._emit(stats.to_dict())
+
+    def skipped(self, name: str, kind: str = "node") -> None:
+        """Records a stage that was not executed (e.g. restored from a checkpoint)."""
+        with self.stage(name, kind) as stats:
+            stats.skipped = True
+
+    def to_dict(self) -> Dict[str, Any]:
+        with _lock:
+            stages = [s.to_dict() for s in self.stages]
+            top_level = [s for s in self.stages if s.parent is None]
+        return {
+            "started_at": self.started_at,
+            "stages": stages,
+            "totals": {
+                # Background stages overlap the flow's own stages, so they don't add to its wall time
+                "wall_seconds": round(sum(s.wall_seconds for s in top_level if s.kind != "background"), 3),
+                "llm_calls": sum(s.llm_calls for s in top_level),
+                "llm_seconds": round(sum(s.llm_seconds for s in top_level), 3),
+                "prompt_tokens": sum(s.prompt_tokens for s in top_level),
+                "response_tokens": sum(s.response_tokens for s in top_level),
+                "bytes_processed": sum(s.bytes_processed for s in top_level),
+                # Lifetime high-water mark of the process (every run it served so far), not this run's
+                "process_peak_rss_mb": peak_rss_mb(),
+            },
+        }
+
+    def save(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+def _stage_chain():
+    stats = _current_stage.get()
+    while stats is not None:
+        yield stats
+        stats = stats.parent
+
+
+def record_llm_call(latency: float, prompt_tokens: int, response_tokens: int,
+                    bytes_processed: int = 0, cached: bool = False) -> None:
+    """Attributes one LLM call to the current stage and its enclosing stages (no-op outside a stage)."""
+    with _lock:
+        for stats in _stage_chain():
+            stats.llm_calls += 1
+            stats.llm_cache_hits += int(cached)
+            stats.llm_seconds += latency
+            stats.prompt_tokens += prompt_tokens
+            stats.response_tokens += response_tokens
+            stats.bytes_processed += bytes_processed
+
+
+def add_bytes(count: int) -> None:
+    """Attributes processed input bytes (crawled files, embedded chunks, ...) to the current stage."""
+    with _lock:
+        for stats in _stage_chain():
+            stats.bytes_processed += count
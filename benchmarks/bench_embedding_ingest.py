@@ -0,0 +1,95 @@
+# benchmarks/bench_embedding_ingest.py
+"""
+Indexing a generated repository's code through the real OpenAIEmbeddings client against a local
+stand-in embeddings API whose requests take a fixed latency plus a per-input cost:
+- "previous": every chunk handed to the vector store in one add_documents call (OpenAIEmbeddings
+  sends 1,000-chunk requests one after another, nothing is stored until all are embedded)
+- the ChunkIngestor at several batch sizes / concurrency levels (chunks streamed file by file,
+  batches embedded concurrently and written as they complete)
+
+Shows wall time, chunks/sec, requests, the most requests in flight, and when the first chunks
+became searchable. The chunk embedding cache is disabled so every run embeds everything.
+
+Run from the repository root:
+    python -m benchmarks.bench_embedding_ingest
+    python -m benchmarks.bench_embedding_ingest --files 2000 --latency 0.5 --settings 256x1 256x4 128x8
+"""
+import os
+import time
+import logging
+import argparse
+import tempfile
+import threading
+
+from benchmarks.bench_embedding_reuse import generate_repo
+from benchmarks.mock_openai import MockOpenAIServer
+
+
+def first_stored_after(collection, start, stop):
+    """Seconds from `start` until the collection holds a chunk (polled), or None"""
+    while not stop.is_set():
+        if collection.count():
+            return time.perf_counter() - start
+        time.sleep(0.02)
+    return None
+
+
+def run(nodes, files, repo_url, ingest):
+    logger = logging.getLogger("bench")
+    collection = nodes.open_collection(repo_url)._collection
+    result, stop = {}, threading.Event()
+    start = time.perf_counter()
+    poller = threading.Thread(target=lambda: result.setdefault("first", first_stored_after(collection, start, stop)))
+    poller.start()
+    try:
+        if ingest is None:
+            chunks = nodes.split_documents(
+                [nodes.Document(page_content=content, metadata={"source": path, "type": "code"}) for path, content in files]
+            )
+            nodes.open_collection(repo_url).add_documents(chunks, ids=nodes.chunk_ids(chunks, repo_url))
+        else:
+            nodes.index_code_files(files, repo_url, None, logger, ingest)
+        elapsed = time.perf_counter() - start
+    finally:
+        stop.set()
+        poller.join()
+    return elapsed, collection.count(), result.get("first") or elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds per embeddings request")
+    parser.add_argument("--per-input", type=float, default=0.002, help="extra seconds per embedded chunk")
+    parser.add_argument("--settings", nargs="+", default=["256x1", "256x4", "128x8"], help="BATCHxCONCURRENCY")
+    args = parser.parse_args()
+
+    files = generate_repo(args.files, seed=0)
+    with tempfile.TemporaryDirectory() as tmp, MockOpenAIServer(
+        embedding_latency=args.latency, embedding_latency_per_input=args.per_input, embedding_dim=256,
+    ) as server:
+        os.chdir(tmp)  # Stores live under ./vector_stores
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+        os.environ["DOCUMENT_EMBEDDING_CACHE_ENABLED"] = "false"
+        os.environ["QUERY_EMBEDDING_CACHE_PATH"] = os.path.join(tmp, "query_embeddings.sqlite3")
+        from app.llm.clients import get_embeddings_client
+        from app.services import nodes
+
+        get_embeddings_client().check_embedding_ctx_length = False  # Plain text inputs; no tiktoken download
+
+        print(f"{args.files} files; {args.latency * 1000:.0f} ms + {args.per_input * 1000:.1f} ms/chunk per request")
+        print(f"{'mode':<22} {'chunks':>7} {'requests':>9} {'peak in flight':>15} {'first stored':>13} {'wall':>8} {'chunks/s':>9}")
+        runs = [("previous", None)] + [
+            (f"batch {b}, {c} concurrent", {"batch_size": int(b), "concurrency": int(c)})
+            for b, c in (setting.split("x") for setting in args.settings)
+        ]
+        for n, (label, ingest) in enumerate(runs):
+            server.requests = server.embedding_peak_in_flight = 0
+            elapsed, count, first = run(nodes, files, f"https://github.com/example/benchmark-{n}", ingest)
+            print(f"{label:<22} {count:>7} {server.requests:>9} {server.embedding_peak_in_flight:>15} "
+                  f"{first:>12.2f}s {elapsed:>7.2f}s {count / elapsed:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# benchmarks/bench_embedding_reuse.py
+"""
+Embedding work of indexing a generated repository's code again, with a counting stand-in for the
+embeddings API (no API key):
+- "previous": chunks added under random ids, as store_chunks used to - every run embeds every
+  chunk again and appends duplicates to the collection
+- "current": deterministic chunk ids (chunks already stored are skipped), the persistent chunk
+  embedding cache, and pruning of chunks that are no longer current
+
+Runs per mode: first index, re-run of the unchanged repository, re-run after 10% of the files
+changed, and (current only) indexing a fork with the same files into a new vector store, which is
+served from the embedding cache.
+
+Run from the repository root:
+    python -m benchmarks.bench_embedding_reuse
+    python -m benchmarks.bench_embedding_reuse --files 2000
+"""
+import os
+import sys
+import time
+import random
+import hashlib
+import logging
+import argparse
+import tempfile
+
+DIMENSIONS = 256
+REPO_URL = "https://github.com/example/benchmark"
+
+
+class CountingEmbeddings:
+    """Deterministic vectors; counts the requests and texts that would have gone to the API"""
+
+    batch_size = 1000  # OpenAIEmbeddings' default chunk_size: texts per request
+
+    def __init__(self):
+        self.requests = self.texts = 0
+
+    def _vector(self, text):
+        rng = random.Random(hashlib.sha1(text.encode()).hexdigest())
+        return [rng.uniform(-1, 1) for _ in range(DIMENSIONS)]
+
+    def embed_documents(self, texts):
+        self.requests += -(-len(texts) // self.batch_size)
+        self.texts += len(texts)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        self.requests += 1
+        self.texts += 1
+        return self._vector(text)
+
+
+class PreviousStore:
+    """In place of the chunk ingestor: every chunk is embedded and added under a random id"""
+
+    def __init__(self, repo_url, logger, label, ingest=None):
+        from app.services import nodes
+
+        self.collection = nodes.open_collection(repo_url)
+        self.ids, self.chunks, self.embedded, self.docs = [], 0, 0, []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.collection.add_documents(self.docs)
+        self.chunks = self.embedded = len(self.docs)
+
+    def add(self, ids, docs):
+        self.docs += docs
+
+
+def generate_repo(count, seed, changed_share=0.0):
+    rng = random.Random(seed)
+    files = []
+    for n in range(count):
+        version = 1 if rng.random() < changed_share else 0
+        body = "".join(
+            f"def handler_{n}_{k}(request):\n    return {{'id': request.get('id'), 'n': {n}, 'v': {version}}}\n\n"
+            for k in range(60)
+        )
+        files.append((f"src/pkg_{n // 50}/module_{n}.py", body))
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)  # Stores live under ./vector_stores
+        os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+        os.environ["DOCUMENT_EMBEDDING_CACHE_PATH"] = os.path.join(tmp, "document_embeddings.sqlite3")
+        os.environ["QUERY_EMBEDDING_CACHE_PATH"] = os.path.join(tmp, "query_embeddings.sqlite3")
+        from app.llm import embedder
+        from app.services import nodes
+
+        counter = CountingEmbeddings()
+        embedder.get_embeddings_client = lambda: counter
+        logger = logging.getLogger("bench")
+
+        current = (nodes.chunk_ingestor, nodes.prune_chunks)
+        unchanged = generate_repo(args.files, seed=0)
+        changed = generate_repo(args.files, seed=0, changed_share=0.1)
+        chunks = nodes.split_documents(
+            [nodes.Document(page_content=content, metadata={"source": path, "type": "code"}) for path, content in unchanged]
+        )
+        print(f"{args.files} files, {len(chunks)} chunks")
+        print(f"{'mode':<9} {'run':<26} {'requests':>9} {'chunks embedded':>16} {'collection size':>16} {'wall':>8}")
+        for mode in ("previous", "current"):
+            repo_url = f"{REPO_URL}-{mode}"
+            if mode == "previous":
+                nodes.chunk_ingestor, nodes.prune_chunks = PreviousStore, lambda *a: 0
+                embedder.config.DOCUMENT_EMBEDDING_CACHE_ENABLED = False
+            else:
+                nodes.chunk_ingestor, nodes.prune_chunks = current
+                embedder.config.DOCUMENT_EMBEDDING_CACHE_ENABLED = True
+            embedder._cached_embeddings = None
+            runs = [(repo_url, "first index", unchanged), (repo_url, "re-run, unchanged", unchanged),
+                    (repo_url, "re-run, 10% files changed", changed)]
+            if mode == "current":
+                runs.append((f"{repo_url}-fork", "fork, new vector store", changed))
+            for url, label, files in runs:
+                counter.requests = counter.texts = 0
+                start = time.perf_counter()
+                nodes.index_code_files(files, url, None, logger)
+                elapsed = time.perf_counter() - start
+                size = nodes.open_collection(url)._collection.count()
+                print(f"{mode:<9} {label:<26} {counter.requests:>9} {counter.texts:>16} {size:>16} {elapsed:>7.1f}s")
+            sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# benchmarks/bench_file_corpus.py
+"""
+Peak memory of the file-handling part of a run on a generated repository (160 MB of sources
+by default): FetchRepo keeping every file's content in `shared["files"]` ("memory") versus
+streaming them into an on-disk FileCorpus ("corpus"), followed by the steps that read all
+files - DigestFiles, IdentifyAbstractions (the real node, with a stub LLM: sizing, sharding and
+the map-reduce over shard prompts) and the code-chunking pass of IndexCode (embedding stubbed out).
+
+Both TUTORIAL_FILE_CONTEXT settings are measured: with "full", IdentifyAbstractions reads the
+whole sources (from the corpus); with "digest" only their digests.
+Each run is a fresh process, so peak RSS is measured cleanly. No API key is needed.
+
+Run from the repository root:
+    python -m benchmarks.bench_file_corpus
+    python -m benchmarks.bench_file_corpus --files 40000 --file-kb 8
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import subprocess
+
+WORDS = ["request", "handler", "config", "result", "value", "index", "buffer", "session", "token", "node"]
+
+
+def generate_repo(root, count, file_kb):
+    rng = random.Random(0)
+    for n in range(count):
+        directory = os.path.join(root, f"pkg_{n // 100}")
+        if n % 100 == 0:
+            os.makedirs(directory, exist_ok=True)
+        lines, size = [f'"""Module {n}."""\n'], 0
+        while size < file_kb * 1024:
+            a, b = rng.choice(WORDS), rng.choice(WORDS)
+            line = f"def {a}_{b}_{rng.randrange(10**6)}({a}, {b}=None):\n    return {{'{a}': {a}, '{b}': {b}}}\n\n"
+            lines.append(line)
+            size += len(line)
+        with open(os.path.join(directory, f"module_{n}.py"), "w") as f:
+            f.write("".join(lines))
+
+
+class DroppedChunks:
+    """Stands in for the chunk ingestor: chunks are produced and dropped"""
+
+    def __init__(self):
+        self.ids, self.chunks, self.embedded = [], 0, 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def add(self, ids, docs):
+        self.chunks += len(docs)
+
+
+def stub_llm(prompt, use_cache=True):
+    """Answers IdentifyAbstractions' shard (map) and merge (reduce) prompts with one abstraction"""
+    key = "candidates" if "Candidate abstractions" in prompt else "file_indices"
+    return f"```yaml\n- name: |\n    Core\n  description: |\n    The core.\n  {key}:\n    - 0 # core\n```"
+
+
+def child(mode, file_context, repo, work_dir):
+    """One run of the file-handling steps; prints a JSON result line"""
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    os.environ["FILE_DIGEST_CACHE_PATH"] = os.path.join(work_dir, "digests.sqlite3")
+    from app.services import nodes
+    from app.services.file_digest import context_tokens
+    from app.utils.profiling import peak_rss_mb
+
+    nodes.chunk_ingestor = lambda repo_url, logger, label, ingest=None: DroppedChunks()  # No vector store
+    nodes.prune_chunks = lambda repo_url, doc_type, keep_ids, sources, logger: 0
+    nodes.call_llm = stub_llm
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    shared = {
+        "local_dir": repo, "project_name": "generated", "include_patterns": {"*.py"}, "exclude_patterns": set(),
+        "max_file_size": 500000, "file_context": file_context,
+        "corpus_dir": os.path.join(work_dir, "corpus") if mode == "corpus" else None,
+        "use_cache": False, "identify_context_tokens": 100_000, "identify_shard_concurrency": 4,
+    }
+    nodes.FetchRepo().run(shared)
+    nodes.DigestFiles().run(shared)
+    files = shared["files"]
+    context_files = nodes.get_context_files(shared)
+    tokens = context_tokens(context_files)
+    shards = nodes.shard_files(context_files, 100_000)
+    nodes.IdentifyAbstractions().run(shared)
+    nodes.index_code_files(files, "https://example.com/generated", None, nodes.logger)
+    print(json.dumps({
+        "files": len(files), "tokens": tokens, "shards": len(shards) if tokens > 100_000 else 0,
+        "seconds": time.perf_counter() - start, "baseline_mb": baseline, "peak_mb": peak_rss_mb(),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=20000)
+    parser.add_argument("--file-kb", type=int, default=8)
+    parser.add_argument("--child", nargs=4, metavar=("MODE", "FILE_CONTEXT", "REPO", "WORK_DIR"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(*args.child)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        repo = os.path.join(tmp, "repo")
+        generate_repo(repo, args.files, args.file_kb)
+        print(f"Generated {args.files} files, {args.files * args.file_kb / 1024:.0f} MB")
+        print(f"{'mode':<8} {'context':<8} {'files':>6} {'shards':>7} {'wall':>8} {'peak RSS':>10} {'above start':>12}")
+        for file_context in ("full", "digest"):
+            for mode in ("memory", "corpus"):
+                work_dir = tempfile.mkdtemp(dir=tmp)
+                out = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.bench_file_corpus", "--child", mode, file_context, repo, work_dir],
+                    capture_output=True, text=True, check=True,
+                ).stdout
+                r = json.loads(out.strip().splitlines()[-1])
+                print(f"{mode:<8} {file_context:<8} {r['files']:>6} {r['shards']:>7} {r['seconds']:>7.1f}s "
+                      f"{r['peak_mb']:>8.0f}MB {r['peak_mb'] - r['baseline_mb']:>10.0f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# benchmarks/bench_file_digests.py
+"""
+Prompt tokens of one tutorial run with full file sources ("full") versus per-file digests
+("digest") in the overview prompts, on a fixed sample repository (by default this repository's
+own app/ package). The LLM is replaced by a stub that returns valid answers, so only the prompts
+the real nodes build are measured; no API key is needed.
+
+Run from the repository root:
+    python -m benchmarks.bench_file_digests
+    python -m benchmarks.bench_file_digests --repo /path/to/checkout
+"""
+import os
+import re
+import argparse
+import tempfile
+from collections import defaultdict
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def stub_llm(stage, prompt, shared):
+    """Valid (if boring) answers for each stage, derived from the prompt and the flow state."""
+    if stage == "IdentifyAbstractions":
+        listing = re.findall(r"^- (\d+) # (.+)$", prompt, flags=re.MULTILINE)
+        groups = defaultdict(list)
+        for idx, path in listing:
+            groups[os.path.dirname(path) or "root"].append(f"{idx} # {path}")
+        out = "```yaml\n"
+        for name, entries in list(groups.items())[:8]:
+            out += f"- name: |\n    {name}\n  description: |\n    The {name} package.\n  file_indices:\n"
+            out += "".join(f"    - {entry}\n" for entry in entries)
+        return out + "```"
+    if stage == "AnalyzeRelationships":
+        count = len(shared["abstractions"])
+        out = "```yaml\nsummary: |\n  A project.\nrelationships:\n"
+        for i in range(max(count - 1, 1)):
+            out += f"  - from_abstraction: {i}\n    to_abstraction: {min(i + 1, count - 1)}\n    label: Uses\n"
+        return out + "```"
+    if stage == "OrderChapters":
+        count = len(shared["abstractions"])
+        return "```yaml\n" + "".join(f"- {i}\n" for i in range(count)) + "```"
+    num = re.search(r"This is Chapter (\d+)", prompt).group(1)
+    return f"# Chapter {num}: x\n\nText.\n"
+
+
+def run(mode, files):
+    from app.llm.tokens import estimate_tokens
+    from app.services import nodes
+
+    tokens = defaultdict(int)
+
+    def recording_llm(prompt, use_cache=True):
+        tokens[recording_llm.stage] += estimate_tokens(prompt)
+        return stub_llm(recording_llm.stage, prompt, shared)
+
+    nodes.call_llm = recording_llm
+    shared = {
+        "files": files,
+        "file_hashes": {path: nodes.hash_content(content) for path, content in files},
+        "project_name": "sample",
+        "language": "english",
+        "use_cache": False,
+        "max_abstraction_num": 8,
+        "file_context": mode,
+    }
+    for node in (nodes.DigestFiles(), nodes.IdentifyAbstractions(), nodes.AnalyzeRelationships(),
+                 nodes.OrderChapters(), nodes.WriteChapters()):
+        recording_llm.stage = type(node).__name__
+        node.run(shared)
+    return tokens
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repo", default=os.path.join(ROOT, "app"), help="directory to use as the sample repository")
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    os.environ["FILE_DIGEST_CACHE_PATH"] = os.path.join(tempfile.mkdtemp(), "digests.sqlite3")
+
+    from app.utils.crawl_local_files import crawl_local_files
+    from app.services.tutorial_service import DEFAULT_INCLUDE_PATTERNS, DEFAULT_EXCLUDE_PATTERNS
+
+    crawled = crawl_local_files(
+        args.repo, include_patterns=DEFAULT_INCLUDE_PATTERNS, exclude_patterns=DEFAULT_EXCLUDE_PATTERNS,
+        max_file_size=500000, use_relative_paths=True,
+    )
+    files = sorted(crawled["files"].items())
+    print(f"Sample repository: {args.repo} ({len(files)} files, {sum(len(c) for _, c in files)} bytes)")
+
+    results = {mode: run(mode, files) for mode in ("full", "digest")}
+    stages = ["IdentifyAbstractions", "AnalyzeRelationships", "OrderChapters", "WriteChapters"]
+    print(f"{'stage':<22}{'full':>10}{'digest':>10}")
+    for stage in stages:
+        print(f"{stage:<22}{results['full'][stage]:>10}{results['digest'][stage]:>10}")
+    full_total = sum(results["full"].values())
+    digest_total = sum(results["digest"].values())
+    print(f"{'total prompt tokens':<22}{full_total:>10}{digest_total:>10}  ({1 - digest_total / full_total:.0%} fewer)")
+
+
+if __name__ == "__main__":
+    main()
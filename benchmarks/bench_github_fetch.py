@@ -0,0 +1,95 @@
+# benchmarks/bench_github_fetch.py
+"""
+crawl_github_files against a local GitHub stand-in, walking the contents API ("contents":
+one call per directory + one GET per file, downloaded serially or on a pool of threads) versus
+one recursive tree listing + one streamed tarball ("tarball").
+
+The fixture is a snapshot of a local directory (by default this repository) served in the
+GitHub API's response formats, plus optional synthetic files to reach a few thousand; each
+request pays a fixed round-trip latency. With --rate-limit, the stand-in rejects requests over
+that many per second like GitHub does, which shows the shared pause: rejected requests stay
+around one per download thread per window instead of piling up. No network access or token is needed.
+
+Run from the repository root:
+    python -m benchmarks.bench_github_fetch
+    python -m benchmarks.bench_github_fetch --repo /path/to/checkout --latency 0.05 --extra-files 2000
+    python -m benchmarks.bench_github_fetch --workers 1 4 16 --rate-limit 300
+"""
+import os
+import time
+import argparse
+import contextlib
+
+from benchmarks.mock_github import MockGitHubServer
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SKIP_DIRS = {".git", "__pycache__", ".cache", "output", "logs", "node_modules", ".venv", "venv"}
+
+SYNTHETIC_FILE = '''"""Module {n}."""
+
+
+def handler_{n}(request):
+    return {{"id": request.get("id"), "n": {n}}}
+'''
+
+
+def snapshot(directory, extra_files):
+    """path -> bytes of every file under `directory`, plus `extra_files` synthetic modules"""
+    files = {}
+    for root, dirs, names in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if d not in SKIP_DIRS)
+        for name in names:
+            path = os.path.join(root, name)
+            with open(path, "rb") as f:
+                files[os.path.relpath(path, directory).replace(os.sep, "/")] = f.read()
+    for n in range(extra_files):
+        files[f"generated/pkg_{n // 50}/module_{n}.py"] = SYNTHETIC_FILE.format(n=n).encode()
+    return files
+
+
+def run(server, mode, workers):
+    from app.utils.crawl_github_files import crawl_github_files
+    from app.services.tutorial_service import DEFAULT_INCLUDE_PATTERNS, DEFAULT_EXCLUDE_PATTERNS
+
+    server.reset_counters()
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):  # Per-file progress prints
+        result = crawl_github_files(
+            server.repo_url, include_patterns=DEFAULT_INCLUDE_PATTERNS, exclude_patterns=DEFAULT_EXCLUDE_PATTERNS,
+            max_file_size=500000, use_relative_paths=True, api_url=server.api_url, fetch_mode=mode,
+            max_workers=workers,
+        )
+    elapsed = time.perf_counter() - start
+    return result, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repo", default=ROOT, help="directory to serve as the repository")
+    parser.add_argument("--extra-files", type=int, default=1000, help="synthetic modules added to the fixture")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per request (round-trip to GitHub)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 8], help="download threads in contents mode")
+    parser.add_argument("--rate-limit", type=int, default=0, help="requests per second the stand-in serves (0: no limit)")
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    files = snapshot(args.repo, args.extra_files)
+    print(f"Fixture: {len(files)} files, {sum(len(c) for c in files.values())} bytes, {args.latency * 1000:.0f} ms per request")
+
+    runs = [("contents", workers) for workers in args.workers] + [("tarball", 1)]
+    with MockGitHubServer(files, latency=args.latency, rate_limit=args.rate_limit) as server:
+        results = {}
+        print(f"{'mode':<9} {'workers':>7} {'files':>6} {'requests':>9} {'limited':>8} {'MB sent':>8} {'wall':>9} {'files/s':>8}")
+        for mode, workers in runs:
+            result, elapsed = run(server, mode, workers)
+            results[mode, workers] = list(result["files"].items())
+            count = len(result["files"])
+            print(f"{mode:<9} {workers if mode == 'contents' else '-':>7} {count:>6} {server.requests:>9} "
+                  f"{server.rate_limited:>8} {server.bytes_sent / 1e6:>8.2f} {elapsed:>8.2f}s {count / elapsed:>8.0f}"
+                  f"  (source: {result['stats']['source']})")
+    first = next(iter(results.values()))
+    print(f"Same files, contents and order in every run: {all(r == first for r in results.values())}")
+
+
+if __name__ == "__main__":
+    main()
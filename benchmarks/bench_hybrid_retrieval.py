@@ -0,0 +1,161 @@
+# benchmarks/bench_hybrid_retrieval.py
+"""
+Retrieval quality and latency of ChromaVectorStore.search in "vector", "lexical" (BM25) and
+"hybrid" (both, reciprocal rank fusion) modes, on a synthetic code corpus with known answers.
+
+The corpus: modules of functions named from a small domain vocabulary (so names share words,
+as in real code), classes and config modules with UPPER_CASE keys; functions call each other, so
+an identifier also appears in its callers. Each query has one answer, the module defining it:
+- identifier lookups: "what does `reconcile_invoice_totals` do", "where is RetryPolicyCache
+  defined", "what is UPLOAD_BATCH_LIMIT set to"
+- descriptive questions built from a function's docstring words
+
+No API key: the dense model is stood in for by a hashed bag of word pieces (identifiers split
+into words, no IDF weighting). Like real embeddings, it sees `invoice_totals` and
+`totals_invoice` as near-identical, which is the failure mode on exact lookups; it says nothing
+about semantic quality, so compare the identifier rows, not absolute numbers.
+The index is built through index_code_files (ChunkIngestor), so both stores come from the real path.
+
+Run from the repository root:
+    python -m benchmarks.bench_hybrid_retrieval
+    python -m benchmarks.bench_hybrid_retrieval --modules 3000 --queries 300
+"""
+import os
+import re
+import math
+import time
+import random
+import hashlib
+import logging
+import argparse
+import tempfile
+import statistics
+
+WORDS = [
+    "invoice", "total", "retry", "policy", "cache", "upload", "batch", "limit", "session", "token", "user",
+    "account", "order", "payment", "refund", "ledger", "report", "export", "import", "schema", "record",
+    "queue", "worker", "job", "lease", "lock", "event", "stream", "buffer", "chunk", "index", "search",
+    "query", "result", "filter", "sort", "page", "cursor", "config", "setting", "secret", "key", "hash",
+    "digest", "manifest", "repo", "branch", "commit", "file", "path", "mirror", "tree", "node", "graph",
+]
+VERBS = ["load", "save", "build", "parse", "merge", "split", "validate", "resolve", "refresh", "reconcile"]
+DIMENSIONS = 384
+
+
+class WordPieceEmbeddings:
+    """Hashed bag of word pieces, L2-normalized; a stand-in for the dense model"""
+
+    def _vector(self, text):
+        vector = [0.0] * DIMENSIONS
+        counts = {}
+        for piece in re.findall(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])", text):
+            counts[piece.lower()] = counts.get(piece.lower(), 0) + 1
+        for piece, count in counts.items():
+            vector[int(hashlib.md5(piece.encode()).hexdigest(), 16) % DIMENSIONS] += 1 + math.log(count)
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts):
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+def generate_corpus(modules, rng):
+    """(files, identifier queries, descriptive queries); a query is (question, answer path)"""
+    names, files, identifier_queries, descriptive_queries = set(), [], [], []
+
+    def new_name(parts):
+        while True:
+            words = [rng.choice(VERBS)] + rng.sample(WORDS, parts)
+            if "_".join(words) not in names:
+                names.add("_".join(words))
+                return words
+
+    functions = []
+    for n in range(modules):
+        path = f"src/pkg_{n // 40}/module_{n}.py"
+        kind = n % 10
+        lines = [f'"""Module {n}."""\n']
+        if kind == 0:  # Config module
+            for _ in range(6):
+                key = "_".join(w.upper() for w in new_name(2)[1:])
+                lines.append(f"{key} = {rng.randrange(1, 10_000)}\n")
+                identifier_queries.append((f"what is {key} set to", path))
+        else:
+            if kind == 1:
+                words = new_name(2)[1:]
+                cls = "".join(w.capitalize() for w in words) + rng.choice(["Cache", "Store", "Client", "Manager"])
+                lines.append(f"\n\nclass {cls}:\n    \"\"\"Keeps the {' '.join(words)} state.\"\"\"\n")
+                identifier_queries.append((f"where is {cls} defined", path))
+            for _ in range(4):
+                words = new_name(2)
+                name = "_".join(words)
+                callees = rng.sample(functions, min(2, len(functions)))
+                calls = "".join(f"    value = {callee}(value)\n" for callee, _ in callees)
+                lines.append(
+                    f"\n\ndef {name}(value, options=None):\n"
+                    f"    \"\"\"{words[0].capitalize()} the {words[1]} {words[2]} of a request.\"\"\"\n"
+                    f"{calls}    return value\n"
+                )
+                functions.append((name, path))
+                identifier_queries.append((f"what does `{name}` do", path))
+                descriptive_queries.append((f"how do we {words[0]} the {words[1]} {words[2]}", path))
+        files.append((path, "".join(lines)))
+    return files, identifier_queries, descriptive_queries
+
+
+def evaluate(store, queries, mode, ks):
+    hits = {k: 0 for k in ks}
+    latencies = []
+    for question, answer in queries:
+        start = time.perf_counter()
+        results = store.search(question, top_k=max(ks), mode=mode)
+        latencies.append((time.perf_counter() - start) * 1000)
+        sources = [result["metadata"].get("source") for result in results]
+        for k in ks:
+            hits[k] += answer in sources[:k]
+    latencies.sort()
+    return {k: hits[k] / len(queries) for k in ks}, statistics.median(latencies), latencies[int(0.95 * (len(latencies) - 1))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modules", type=int, default=1500)
+    parser.add_argument("--queries", type=int, default=200, help="per query type")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    files, identifier_queries, descriptive_queries = generate_corpus(args.modules, rng)
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)  # Stores live under ./vector_stores
+        os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+        os.environ["DOCUMENT_EMBEDDING_CACHE_ENABLED"] = "false"
+        os.environ["QUERY_EMBEDDING_CACHE_ENABLED"] = "false"
+        from app.llm import embedder
+        from app.services import nodes
+        from app.repositories.vector_store import ChromaVectorStore
+
+        stand_in = WordPieceEmbeddings()
+        embedder.get_embeddings_client = lambda: stand_in
+        repo_url = "https://github.com/example/benchmark"
+        start = time.perf_counter()
+        nodes.index_code_files(files, repo_url, None, logging.getLogger("bench"))
+        nodes.mark_lexical_index_complete(repo_url)  # A full index (no chapters here), as EmbedAndStore does
+        store = ChromaVectorStore(repo_url, stand_in)
+        print(f"Indexed {len(files)} modules ({store.collection.count()} chunks, {store.lexical.count()} in the "
+              f"lexical index) in {time.perf_counter() - start:.1f}s")
+
+        ks = (1, 5, 10)
+        print(f"{'queries':<12} {'mode':<8} " + " ".join(f"{f'recall@{k}':>9}" for k in ks) + f" {'p50':>8} {'p95':>8}")
+        for label, queries in (("identifier", identifier_queries), ("descriptive", descriptive_queries)):
+            sample = rng.sample(queries, min(args.queries, len(queries)))
+            for mode in ("vector", "lexical", "hybrid"):
+                recall, p50, p95 = evaluate(store, sample, mode, ks)
+                print(f"{label:<12} {mode:<8} " + " ".join(f"{recall[k]:>9.2f}" for k in ks) + f" {p50:>6.2f}ms {p95:>6.2f}ms")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+# benchmarks/bench_identify_sharding.py
+"""
+IdentifyAbstractions on synthetic repositories of 100, 1,000 and 10,000 files, with everything
+in one prompt ("single") versus map-reduce over shards of files ("sharded").
+
+The LLM is a stub with a fixed context window (it fails like the API does when the prompt is
+too long) and a latency that grows with the prompt size, so the numbers show which repo sizes
+fit at all and how sharding + parallel shard calls affect wall time. No API key is needed.
+
+Run from the repository root:
+    python -m benchmarks.bench_identify_sharding
+    python -m benchmarks.bench_identify_sharding --sizes 100 1000 --context-window 128000
+"""
+import os
+import re
+import time
+import argparse
+import tempfile
+import threading
+from collections import defaultdict
+
+FILE_TEMPLATE = '''"""Module {n} of package {pkg}."""
+import os
+from {pkg} import helpers
+
+
+class Handler{n}:
+    """Handles requests of kind {n}."""
+
+    def __init__(self, config):
+        self.config = config
+        self.cache = {{}}
+
+    def handle(self, request):
+        key = (request.get("id"), request.get("kind"))
+        if key in self.cache:
+            return self.cache[key]
+        result = helpers.process(request, self.config)
+        self.cache[key] = result
+        return result
+
+
+def build_handler_{n}(config=None):
+    return Handler{n}(config or {{"path": os.getcwd()}})
+'''
+
+
+def make_files(count, files_per_dir=20):
+    return [
+        (f"pkg_{i // files_per_dir}/module_{i}.py", FILE_TEMPLATE.format(n=i, pkg=f"pkg_{i // files_per_dir}"))
+        for i in range(count)
+    ]
+
+
+class StubLLM:
+    def __init__(self, context_window, base_latency, seconds_per_1k_tokens, max_abstractions):
+        self.context_window = context_window
+        self.base_latency = base_latency
+        self.seconds_per_1k_tokens = seconds_per_1k_tokens
+        self.max_abstractions = max_abstractions
+        self.calls = 0
+        self.max_prompt_tokens = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, prompt, use_cache=True):
+        from app.llm.tokens import estimate_tokens
+
+        tokens = estimate_tokens(prompt)
+        with self._lock:
+            self.calls += 1
+            self.max_prompt_tokens = max(self.max_prompt_tokens, tokens)
+        if tokens > self.context_window:
+            raise ValueError(f"context_length_exceeded: {tokens} > {self.context_window} tokens")
+        time.sleep(self.base_latency + self.seconds_per_1k_tokens * tokens / 1000)
+
+        if "Candidate abstractions (index # name" in prompt:
+            # Reduce: merge candidates with the same name
+            by_name = defaultdict(list)
+            for idx, name in re.findall(r"^- (\d+) # (\S+) \(file indices", prompt, flags=re.MULTILINE):
+                by_name[name].append(idx)
+            out = "```yaml\n"
+            for name, indices in list(by_name.items())[: self.max_abstractions]:
+                out += f"- name: |\n    {name}\n  description: |\n    The {name} package.\n  candidates:\n"
+                out += "".join(f"    - {idx} # {name}\n" for idx in indices)
+            return out + "```"
+
+        # Identify (whole codebase or one shard): one abstraction per package in the listing
+        groups = defaultdict(list)
+        for idx, path in re.findall(r"^- (\d+) # (\S+)$", prompt, flags=re.MULTILINE):
+            groups[os.path.dirname(path)].append(idx)
+        out = "```yaml\n"
+        for name, indices in list(groups.items())[: self.max_abstractions]:
+            out += f"- name: |\n    {name}\n  description: |\n    The {name} package.\n  file_indices:\n"
+            out += "".join(f"    - {idx} # {name}\n" for idx in indices)
+        return out + "```"
+
+
+def run(files, mode, args):
+    from app.services import nodes
+
+    stub = StubLLM(args.context_window, args.base_latency, args.seconds_per_1k_tokens, args.max_abstractions)
+    nodes.call_llm = stub
+    shared = {
+        "files": files,
+        "project_name": "synthetic",
+        "use_cache": False,
+        "max_abstraction_num": args.max_abstractions,
+        # "single" never shards, like the original node
+        "identify_context_tokens": args.shard_tokens if mode == "sharded" else float("inf"),
+        "identify_shard_concurrency": args.concurrency,
+    }
+    node = nodes.IdentifyAbstractions(max_retries=1)
+    start = time.perf_counter()
+    try:
+        node.run(shared)
+        abstractions = shared["abstractions"]
+        valid = all(0 <= idx < len(files) for a in abstractions for idx in a["files"])
+        covered = len({idx for a in abstractions for idx in a["files"]})
+        result = f"ok: {len(abstractions)} abstractions, {covered} files, indices {'valid' if valid else 'INVALID'}"
+    except ValueError as e:
+        result = f"failed: {str(e)[:40]}"
+    elapsed = time.perf_counter() - start
+    return f"{len(files):>7} {mode:<8} {stub.calls:>6} {stub.max_prompt_tokens:>12} {elapsed:>9.2f}s  {result}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--context-window", type=int, default=128_000)
+    parser.add_argument("--shard-tokens", type=int, default=100_000)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--max-abstractions", type=int, default=10)
+    parser.add_argument("--base-latency", type=float, default=0.2)
+    parser.add_argument("--seconds-per-1k-tokens", type=float, default=0.01)
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    os.environ["LLM_CACHE_PATH"] = os.path.join(tempfile.mkdtemp(), "cache.sqlite3")
+
+    print(f"{'files':>7} {'mode':<8} {'calls':>6} {'max prompt':>12} {'wall':>10}  result")
+    for size in args.sizes:
+        files = make_files(size)
+        for mode in ("single", "sharded"):
+            print(run(files, mode, args))
+
+
+if __name__ == "__main__":
+    main()
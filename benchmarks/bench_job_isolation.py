@@ -0,0 +1,88 @@
+# benchmarks/bench_job_isolation.py
+"""
+Latency of a small API-style handler while CPU-heavy generation jobs run, with the jobs on
+worker threads of the same process (JOB_EXECUTION_MODE=thread) versus in worker processes
+(JOB_EXECUTION_MODE=process).
+
+Each job chunks a synthetic codebase with LangChain's RecursiveCharacterTextSplitter (what
+EmbedAndStore does for every file). Meanwhile the event loop serves "requests": a short
+`asyncio.to_thread` call, like the /query handlers make, timed end to end.
+
+Run from the repository root:
+    python -m benchmarks.bench_job_isolation --jobs 2 --files 20000
+"""
+import time
+import asyncio
+import argparse
+import statistics
+
+FILE_TEMPLATE = '''class Handler{n}:
+    """Handles requests of kind {n}."""
+
+    def handle(self, request):
+        key = (request.get("id"), request.get("kind"))
+        result = [item * {n} for item in range(100) if item % 3]
+        return {{"key": key, "result": result}}
+
+'''
+
+
+def chunk_codebase(job):
+    """A CPU-bound stand-in for EmbedAndStore's chunking step."""
+    from langchain.text_splitter import RecursiveCharacterTextSplitter, Language
+
+    splitter = RecursiveCharacterTextSplitter.from_language(language=Language.PYTHON, chunk_size=2000, chunk_overlap=200)
+    chunks = 0
+    for n in range(job.params["files"]):
+        chunks += len(splitter.split_text(FILE_TEMPLATE.format(n=n) * 20))
+    job.publish(f"{chunks} chunks")
+    return chunks
+
+
+async def measure(manager, args):
+    from app.services.jobs import SUCCEEDED, FAILED
+
+    jobs = [
+        manager.submit("bench", f"bench-{i}", chunk_codebase, params={"files": args.files})[0]
+        for i in range(args.jobs)
+    ]
+    latencies = []
+    start = time.perf_counter()
+    while any(job.status not in (SUCCEEDED, FAILED) for job in jobs):
+        t0 = time.perf_counter()
+        await asyncio.to_thread(sum, range(1000))
+        latencies.append((time.perf_counter() - t0) * 1000)
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    failed = [job.error for job in jobs if job.status == FAILED]
+    return latencies, elapsed, failed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=2)
+    parser.add_argument("--files", type=int, default=20000)
+    args = parser.parse_args()
+
+    from app.services.jobs import JobManager
+
+    print(f"{'mode':<8} {'jobs wall':>10} {'requests':>9} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for mode in ("thread", "process"):
+        manager = JobManager(max_workers=args.jobs, mode=mode)
+        if mode == "process":
+            # Start the worker processes before timing, as a long-running API process would have
+            manager.submit("bench", "warmup", chunk_codebase, params={"files": 1})
+            while manager.stats()["running"] or manager.stats()["queued"]:
+                time.sleep(0.1)
+        latencies, elapsed, failed = asyncio.run(measure(manager, args))
+        manager.shutdown()
+        latencies.sort()
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        print(
+            f"{mode:<8} {elapsed:>9.2f}s {len(latencies):>9} {statistics.median(latencies):>8.2f} "
+            f"{p99:>8.2f} {latencies[-1]:>8.2f}" + (f"  failed: {failed}" if failed else "")
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# benchmarks/bench_openai_clients.py
+"""
+Per-call overhead of a fresh `OpenAI(...)` client per call (the old behaviour)
+versus the shared, pooled client from app.llm.clients.
+
+Run from the repository root:
+    python -m benchmarks.bench_openai_clients --calls 200
+"""
+import os
+import time
+import argparse
+import statistics
+
+from benchmarks.mock_openai import MockOpenAIServer
+
+
+def _summary(label: str, samples: list, connections: int) -> str:
+    samples_ms = sorted(s * 1000 for s in samples)
+    p95 = samples_ms[int(len(samples_ms) * 0.95) - 1]
+    return (
+        f"{label:<16} mean={statistics.mean(samples_ms):7.2f} ms  "
+        f"p50={statistics.median(samples_ms):7.2f} ms  p95={p95:7.2f} ms  "
+        f"tcp_connections={connections}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+
+    with MockOpenAIServer() as server:
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+        from openai import OpenAI
+        from app.llm.clients import get_openai_client
+
+        def one_call(client):
+            start = time.perf_counter()
+            client.chat.completions.create(model="mock", messages=[{"role": "user", "content": "hi"}])
+            return time.perf_counter() - start
+
+        # Before: a brand-new client (and connection pool) per call
+        before_conn = server.connections
+        fresh = [one_call(OpenAI(base_url=server.base_url)) for _ in range(args.calls)]
+        fresh_conn = server.connections - before_conn
+
+        # After: the shared registry client
+        shared_client = get_openai_client()
+        one_call(shared_client)  # warm-up: opens the pooled connection
+        before_conn = server.connections
+        pooled = [one_call(shared_client) for _ in range(args.calls)]
+        pooled_conn = server.connections - before_conn
+
+    print(f"{args.calls} chat completion calls against {server.base_url}")
+    print(_summary("fresh client", fresh, fresh_conn))
+    print(_summary("pooled client", pooled, pooled_conn))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# benchmarks/bench_query_stream.py
+"""
+Time-to-first-byte of the blocking answer path (acall_llm, as used by /query/getanswer)
+versus the streaming path (astream_llm, as used by /query/stream), against a local
+stand-in LLM server that generates tokens with a fixed per-token delay (sent as they are
+generated when streaming, all at once otherwise).
+
+Run from the repository root:
+    python -m benchmarks.bench_query_stream --tokens 200 --token-delay 0.01
+"""
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+
+from benchmarks.mock_openai import MockOpenAIServer
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, default=200)
+    parser.add_argument("--token-delay", type=float, default=0.01)
+    parser.add_argument("--latency", type=float, default=0.2, help="delay before the first token")
+    args = parser.parse_args()
+
+    answer = " ".join(f"tok{i}" for i in range(args.tokens))
+    with MockOpenAIServer(latency=args.latency, response_text=answer, token_delay=args.token_delay) as server:
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+        os.environ["LLM_CACHE_ENABLED"] = "false"
+        os.environ["LLM_CACHE_PATH"] = os.path.join(tempfile.mkdtemp(), "cache.sqlite3")
+
+        from app.llm.call_llm import astream_llm, acall_llm
+
+        # The stand-in takes as long to generate a plain reply as to stream it, so the
+        # blocking path's first byte is its whole answer.
+        async def blocking():
+            start = time.perf_counter()
+            text = await acall_llm("question", use_cache=False)
+            total = time.perf_counter() - start
+            return total, total, len(text)
+
+        async def streaming():
+            start = time.perf_counter()
+            first = None
+            count = 0
+            async for _ in astream_llm("question", use_cache=False):
+                if first is None:
+                    first = time.perf_counter() - start
+                count += 1
+            return first, time.perf_counter() - start, count
+
+        async def run():
+            await acall_llm("warm-up", use_cache=False)
+            return await blocking(), await streaming()
+
+        (b_ttfb, b_total, _), (s_ttfb, s_total, chunks) = asyncio.run(run())
+
+    print(f"{args.tokens} tokens, {args.latency * 1000:.0f} ms to first token, {args.token_delay * 1000:.0f} ms/token")
+    print(f"/query/getanswer (blocking): TTFB={b_ttfb * 1000:8.1f} ms  total={b_total * 1000:8.1f} ms")
+    print(f"/query/stream    (SSE)     : TTFB={s_ttfb * 1000:8.1f} ms  total={s_total * 1000:8.1f} ms  chunks={chunks}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# benchmarks/bench_vector_store_pool.py
+"""
+Latency of repeated queries against a local persisted collection (10,000 chunks by default):
+- "previous": a new ChromaVectorStore per query, never closed, as retrieve_documents did (Chroma
+  keeps one in-memory system per path, so the index stays loaded but every query still builds a
+  client and looks the collection up - and one process never sees writes made through another
+  client again)
+- "reopen": a new store per query, closed afterwards, so every query loads the index from disk
+- "pooled": the store from VectorStoreRegistry, opened once
+
+Queries use a deterministic stand-in embedder (no API key). Afterwards a chunk is added through a
+separate client, like store_chunks does, and the pooled store is checked to return it after
+invalidate().
+
+Run from the repository root:
+    python -m benchmarks.bench_vector_store_pool
+    python -m benchmarks.bench_vector_store_pool --chunks 50000 --queries 500
+"""
+import os
+import time
+import random
+import hashlib
+import argparse
+import tempfile
+import statistics
+
+DIMENSIONS = 1536  # text-embedding-3-small
+
+
+class StubEmbedder:
+    def embed_query(self, text):
+        rng = random.Random(hashlib.sha1(text.encode()).hexdigest())
+        return [rng.uniform(-1, 1) for _ in range(DIMENSIONS)]
+
+
+def build_collection(path, count):
+    import chromadb
+    from app.services.nodes import COLLECTION_NAME
+
+    embedder = StubEmbedder()
+    collection = chromadb.PersistentClient(path=path).get_or_create_collection(COLLECTION_NAME)
+    for start in range(0, count, 1000):
+        ids = [f"chunk-{n}" for n in range(start, min(start + 1000, count))]
+        collection.add(
+            ids=ids, embeddings=[embedder.embed_query(i) for i in ids], documents=[f"def {i}(): pass" for i in ids],
+            metadatas=[{"source": f"src/module_{n // 10}.py", "type": "code"} for n in range(start, start + len(ids))],
+        )
+    return collection
+
+
+def timed_queries(search, queries):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        search(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=10_000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    from app.repositories.vector_store import ChromaVectorStore, VectorStoreRegistry, store_directory
+
+    repo_url = "https://github.com/example/benchmark"
+    embedder = StubEmbedder()
+    queries = [f"how does handler {n} work" for n in range(args.queries)]
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)  # Stores live under ./vector_stores
+        start = time.perf_counter()
+        writer = build_collection(os.path.join("./vector_stores", os.path.basename(store_directory(repo_url))), args.chunks)
+        print(f"Built a collection of {args.chunks} chunks in {time.perf_counter() - start:.1f}s; {args.queries} queries per mode")
+
+        leaked = []
+
+        def previous(query):
+            store = ChromaVectorStore(repo_url=repo_url, embedder=embedder)
+            store.search(query)
+            leaked.append(store)  # Closed after the run, so the next modes start from a clean state
+
+        def reopen(query):
+            store = ChromaVectorStore(repo_url=repo_url, embedder=embedder)
+            try:
+                store.search(query)
+            finally:
+                store.close()
+
+        registry = VectorStoreRegistry(max_open=4, idle_seconds=600)
+
+        def pooled(query):
+            with registry.acquire(repo_url, embedder) as store:
+                store.search(query)
+
+        print(f"{'mode':<9} {'mean':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+        for name, search in (("reopen", reopen), ("previous", previous), ("pooled", pooled)):
+            latencies = sorted(timed_queries(search, queries))
+            for store in leaked:
+                store.close()
+            leaked.clear()
+            pct = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+            print(f"{name:<9} {statistics.mean(latencies):>6.2f}ms {pct(0.50):>6.2f}ms {pct(0.95):>6.2f}ms {pct(0.99):>6.2f}ms")
+
+        probe = "a chunk added after the store was opened"
+        writer.add(ids=["added"], embeddings=[embedder.embed_query(probe)], documents=["added"],
+                   metadatas=[{"source": "added.py", "type": "code"}])
+        with registry.acquire(repo_url, embedder) as store:
+            before = store.search(probe, top_k=1)[0]["id"]
+        registry.invalidate(repo_url)
+        with registry.acquire(repo_url, embedder) as store:
+            after = store.search(probe, top_k=1)[0]["id"]
+        print(f"New chunk returned by the pooled store: before invalidate {before == 'added'}, after {after == 'added'}")
+        registry.close_all()
+
+
+if __name__ == "__main__":
+    main()
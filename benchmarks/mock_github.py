@@ -0,0 +1,216 @@
+# benchmarks/mock_github.py
+"""
+Local stand-in for the parts of the GitHub API that crawl_github_files uses, serving one
+repository fixture (path -> bytes) in GitHub's response formats:
+
+    GET /repos/{owner}/{repo}/branches
+    GET /repos/{owner}/{repo}/git/trees/{ref}?recursive=1
+    GET /repos/{owner}/{repo}/contents/{path}?ref=...
+    GET /repos/{owner}/{repo}/tarball[/{ref}]   (302 to /codeload/..., like api.github.com)
+    GET /raw/{owner}/{repo}/{ref}/{path}        (the contents API's download_url)
+
+Every request sleeps `latency` seconds (the round-trip to GitHub) and is counted. With
+`rate_limit` set, only that many requests are served per `rate_limit_window` seconds; the rest
+get GitHub's 403 "rate limit exceeded" with an X-RateLimit-Reset header.
+"""
+import io
+import json
+import time
+import tarfile
+import hashlib
+import threading
+from typing import Dict
+from urllib.parse import urlparse, parse_qs, quote, unquote
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockGitHubServer:
+    def __init__(self, files: Dict[str, bytes], owner: str = "octo", repo: str = "sample",
+                 branch: str = "main", latency: float = 0.0, rate_limit: int = 0, rate_limit_window: float = 1.0):
+        self.files = dict(sorted(files.items()))
+        self.owner = owner
+        self.repo = repo
+        self.branch = branch
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.rate_limit_window = rate_limit_window
+        self.rate_limited = 0
+        self._window_start = 0.0
+        self._window_requests = 0
+        self.sha = hashlib.sha1(json.dumps(sorted(self.files)).encode()).hexdigest()
+        self.requests = 0
+        self.requests_by_kind: Dict[str, int] = {}
+        self.bytes_sent = 0
+        self._tarball = None
+        self._lock = threading.Lock()
+        self._server = None
+
+    # --- Lifecycle ---
+    @property
+    def api_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def repo_url(self) -> str:
+        return f"https://github.com/{self.owner}/{self.repo}"
+
+    def start(self) -> "MockGitHubServer":
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def reset_counters(self) -> None:
+        with self._lock:
+            self.requests = 0
+            self.requests_by_kind = {}
+            self.bytes_sent = 0
+            self.rate_limited = 0
+
+    def _over_limit(self):
+        """The window's reset time if this request exceeds the rate limit, else None"""
+        if not self.rate_limit:
+            return None
+        with self._lock:
+            now = time.time()
+            if now - self._window_start >= self.rate_limit_window:
+                self._window_start, self._window_requests = now, 0
+            self._window_requests += 1
+            if self._window_requests <= self.rate_limit:
+                return None
+            self.rate_limited += 1
+            return self._window_start + self.rate_limit_window
+
+    # --- Fixture views ---
+    def _dirs(self):
+        dirs = set()
+        for path in self.files:
+            parts = path.split("/")[:-1]
+            for i in range(1, len(parts) + 1):
+                dirs.add("/".join(parts[:i]))
+        return dirs
+
+    def tree(self) -> dict:
+        entries = [{"path": d, "mode": "040000", "type": "tree", "sha": "0" * 40} for d in self._dirs()]
+        entries += [
+            {"path": path, "mode": "100644", "type": "blob", "size": len(content),
+             "sha": hashlib.sha1(content).hexdigest()}
+            for path, content in self.files.items()
+        ]
+        entries.sort(key=lambda e: e["path"])
+        return {"sha": self.sha, "tree": entries, "truncated": False}
+
+    def contents(self, path: str) -> list:
+        prefix = f"{path}/" if path else ""
+        children = {}
+        for file_path, content in self.files.items():
+            if not file_path.startswith(prefix):
+                continue
+            name = file_path[len(prefix):].split("/")[0]
+            child = prefix + name
+            if child == file_path:
+                children[name] = {
+                    "name": name, "path": child, "type": "file", "size": len(content),
+                    "url": f"{self.api_url}/repos/{self.owner}/{self.repo}/contents/{quote(child)}",
+                    "download_url": f"{self.api_url}/raw/{self.owner}/{self.repo}/{self.branch}/{quote(child)}",
+                }
+            else:
+                children.setdefault(name, {"name": name, "path": child, "type": "dir", "size": 0,
+                                           "url": f"{self.api_url}/repos/{self.owner}/{self.repo}/contents/{quote(child)}",
+                                           "download_url": None})
+        return [children[name] for name in sorted(children)]
+
+    def tarball(self) -> bytes:
+        if self._tarball is None:
+            buffer = io.BytesIO()
+            root = f"{self.owner}-{self.repo}-{self.sha[:7]}"
+            with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+                for path, content in self.files.items():
+                    info = tarfile.TarInfo(f"{root}/{path}")
+                    info.size = len(content)
+                    archive.addfile(info, io.BytesIO(content))
+            self._tarball = buffer.getvalue()
+        return self._tarball
+
+    # --- HTTP ---
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, body: bytes, content_type: str, status: int = 200, headers=None):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+                with server._lock:
+                    server.bytes_sent += len(body)
+
+            def _json(self, payload):
+                self._send(json.dumps(payload).encode("utf-8"), "application/json")
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                parts = [unquote(p) for p in url.path.strip("/").split("/")]
+                kind = parts[3] if parts[0] == "repos" and len(parts) > 3 else parts[0]
+                with server._lock:
+                    server.requests += 1
+                    server.requests_by_kind[kind] = server.requests_by_kind.get(kind, 0) + 1
+                time.sleep(server.latency)
+                reset = server._over_limit()
+                if reset is not None:
+                    body = b'{"message": "API rate limit exceeded for 127.0.0.1."}'
+                    return self._send(body, "application/json", status=403,
+                                      headers={"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": f"{reset:.3f}"})
+
+                if parts[0] == "raw":  # raw/{owner}/{repo}/{ref}/{path...}
+                    content = server.files.get("/".join(parts[4:]))
+                    if content is None:
+                        return self.send_error(404)
+                    return self._send(content, "text/plain; charset=utf-8")
+                if parts[0] == "codeload":
+                    return self._send(server.tarball(), "application/x-gzip")
+                if parts[:3] != ["repos", server.owner, server.repo] or len(parts) < 4:
+                    return self.send_error(404)
+
+                if kind == "branches":
+                    return self._json([{"name": server.branch, "commit": {"sha": server.sha}}])
+                if kind == "git" and len(parts) > 5 and parts[4] == "trees":
+                    if "recursive" not in parse_qs(url.query):
+                        return self._json({"sha": server.sha, "tree": [], "truncated": False})
+                    return self._json(server.tree())
+                if kind == "contents":
+                    path = "/".join(parts[4:])
+                    if path in server.files:
+                        parent = path.rsplit("/", 1)[0] if "/" in path else ""
+                        return self._json(next(i for i in server.contents(parent) if i["path"] == path))
+                    listing = server.contents(path)
+                    if not listing:
+                        return self.send_error(404)
+                    return self._json(listing)
+                if kind == "tarball":
+                    location = f"{server.api_url}/codeload/{server.owner}/{server.repo}/tar.gz/{server.sha}"
+                    return self._send(b"", "text/plain", status=302, headers={"Location": location})
+                self.send_error(404)
+
+        return Handler
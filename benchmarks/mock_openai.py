@@ -0,0 +1,172 @@
+# benchmarks/mock_openai.py
+"""
+Local stand-in for the OpenAI HTTP API, used by the benchmarks.
+
+Serves `/v1/chat/completions` (plain and streaming) and `/v1/embeddings` with
+configurable injected latency, and counts requests and TCP connections so the
+benchmarks can show connection reuse.
+"""
+import json
+import time
+import array
+import base64
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockOpenAIServer:
+    def __init__(
+        self,
+        latency: float = 0.0,
+        response_text: str = "Hello from the mock model.",
+        token_delay: float = 0.0,
+        embedding_latency: float = 0.0,
+        embedding_dim: int = 64,
+        embedding_latency_per_input: float = 0.0,
+    ):
+        self.latency = latency
+        self.response_text = response_text
+        self.token_delay = token_delay  # Per generated token: between stream chunks, or before a plain reply
+        self.embedding_latency = embedding_latency
+        self.embedding_dim = embedding_dim
+        self.embedding_latency_per_input = embedding_latency_per_input  # Larger batches take longer
+        self.requests = 0
+        self.connections = 0
+        self.embedded_inputs = 0
+        self.embedding_in_flight = 0
+        self.embedding_peak_in_flight = 0  # Most embeddings requests served at once
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    # --- Lifecycle ---
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "MockOpenAIServer":
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # --- Fake payloads ---
+    def fake_embedding(self, value) -> list:
+        """Deterministic pseudo-embedding derived from the input text (or token ids)."""
+        digest = hashlib.sha256(json.dumps(value).encode("utf-8")).digest()
+        raw = (digest * (self.embedding_dim // len(digest) + 1))[: self.embedding_dim]
+        return [(b - 128) / 128.0 for b in raw]
+
+    def encode_embedding(self, value, body: dict):
+        """As the API does: a float list, or packed float32 in base64 when asked (the openai client's default)"""
+        embedding = self.fake_embedding(value)
+        if body.get("encoding_format") == "base64":
+            return base64.b64encode(array.array("f", embedding).tobytes()).decode("ascii")
+        return embedding
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, payload: dict):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                with server._lock:
+                    server.requests += 1
+
+                if self.path.endswith("/chat/completions"):
+                    time.sleep(server.latency)
+                    if body.get("stream"):
+                        self._stream_chat(body)
+                    else:
+                        # The whole answer is generated before anything is sent
+                        time.sleep(server.token_delay * len(server.response_text.split(" ")))
+                        self._send_json({
+                            "id": "chatcmpl-mock",
+                            "object": "chat.completion",
+                            "created": int(time.time()),
+                            "model": body.get("model", "mock"),
+                            "choices": [{
+                                "index": 0,
+                                "message": {"role": "assistant", "content": server.response_text},
+                                "finish_reason": "stop",
+                            }],
+                            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+                        })
+                elif self.path.endswith("/embeddings"):
+                    inputs = body.get("input", [])
+                    if not isinstance(inputs, list) or (inputs and isinstance(inputs[0], int)):
+                        inputs = [inputs]
+                    with server._lock:
+                        server.embedded_inputs += len(inputs)
+                        server.embedding_in_flight += 1
+                        server.embedding_peak_in_flight = max(server.embedding_peak_in_flight, server.embedding_in_flight)
+                    time.sleep(server.embedding_latency + server.embedding_latency_per_input * len(inputs))
+                    with server._lock:
+                        server.embedding_in_flight -= 1
+                    self._send_json({
+                        "object": "list",
+                        "model": body.get("model", "mock"),
+                        "data": [
+                            {"object": "embedding", "index": i, "embedding": server.encode_embedding(value, body)}
+                            for i, value in enumerate(inputs)
+                        ],
+                        "usage": {"prompt_tokens": 1, "total_tokens": 1},
+                    })
+                else:
+                    self.send_error(404)
+
+            def _stream_chat(self, body: dict):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                for token in server.response_text.split(" "):
+                    chunk = {
+                        "id": "chatcmpl-mock",
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": body.get("model", "mock"),
+                        "choices": [{"index": 0, "delta": {"content": token + " "}, "finish_reason": None}],
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                    time.sleep(server.token_delay)
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+
+        return Handler
@@ -0,0 +1,176 @@
+# tests/test_repo_mirror.py
+"""
+MirrorCache against local bare repositories as remotes (file:// URLs, so clones and fetches
+go through the same transport as a real remote and honour --depth).
+
+Run from the repository root:
+    python -m pytest tests/test_repo_mirror.py
+"""
+import os
+import time
+import threading
+import subprocess
+
+import git
+import pytest
+
+from app.services.repo_mirror import MirrorCache
+
+
+def run_git(cwd, *args):
+    return subprocess.run(
+        ["git", "-c", "user.email=test@example.com", "-c", "user.name=test", *args],
+        cwd=cwd, check=True, capture_output=True, text=True,
+    ).stdout.strip()
+
+
+class Remote:
+    """A bare repository (the remote) and a working clone that pushes commits to it"""
+
+    def __init__(self, root, name="project"):
+        self.bare = os.path.join(root, f"{name}.git")
+        self.work = os.path.join(root, f"{name}_work")
+        os.makedirs(self.work)
+        run_git(root, "init", "-q", "--bare", "-b", "main", self.bare)
+        run_git(self.bare, "config", "uploadpack.allowAnySHA1InWant", "true")  # As GitHub does
+        run_git(self.work, "init", "-q", "-b", "main")
+        run_git(self.work, "remote", "add", "origin", self.bare)
+        self.url = f"file://{self.bare}"
+
+    def push(self, content, path="app.py", size=0):
+        with open(os.path.join(self.work, path), "w") as f:
+            f.write(content)
+        if size:  # Incompressible padding, to give the mirror a known size
+            with open(os.path.join(self.work, "blob.bin"), "wb") as f:
+                f.write(os.urandom(size))
+        run_git(self.work, "add", "-A")
+        run_git(self.work, "commit", "-q", "-m", content[:40])
+        run_git(self.work, "push", "-q", "origin", "main")
+        return run_git(self.work, "rev-parse", "HEAD")
+
+
+def read(directory, path="app.py"):
+    with open(os.path.join(directory, path)) as f:
+        return f.read()
+
+
+def leftover_checkouts(cache):
+    return [name for name in os.listdir(cache.root) if name.startswith("checkout-")]
+
+
+@pytest.fixture
+def remote(tmp_path):
+    return Remote(str(tmp_path / "remotes"))
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return MirrorCache(str(tmp_path / "mirrors"), max_bytes=1 << 30)
+
+
+def test_checkout_sees_pushed_commits(remote, cache):
+    remote.push("v1")
+    with cache.checkout(remote.url) as directory:
+        assert read(directory) == "v1"
+    mirror = cache.mirror_path(remote.url)
+    inode = os.stat(mirror).st_ino
+
+    head = remote.push("v2")
+    with cache.checkout(remote.url) as directory:
+        assert read(directory) == "v2"
+        assert git.Repo(directory).head.commit.hexsha == head
+    assert os.stat(mirror).st_ino == inode  # Fetched into, not cloned again
+
+
+def test_mirror_stays_shallow_after_updates(remote, cache):
+    for n in range(5):
+        remote.push(f"v{n}")
+        with cache.checkout(remote.url):
+            pass
+    mirror = cache.mirror_path(remote.url)
+    assert run_git(mirror, "rev-parse", "--is-shallow-repository") == "true"
+    assert run_git(mirror, "rev-list", "--count", "main") == "1"
+
+
+def test_checkout_of_refs_that_are_not_branch_tips(remote, cache):
+    first = remote.push("v1")
+    run_git(remote.work, "tag", "release-1")
+    run_git(remote.work, "push", "-q", "origin", "release-1")
+    remote.push("v2")
+
+    with cache.checkout(remote.url, "release-1") as directory:
+        assert read(directory) == "v1"
+    with cache.checkout(remote.url, first) as directory:  # A commit sha
+        assert read(directory) == "v1"
+    with cache.checkout(remote.url, "main") as directory:
+        assert read(directory) == "v2"
+
+
+def test_concurrent_checkouts_of_a_mirror_are_serialized(remote, cache):
+    remote.push("v1")
+    inside, overlaps, errors = [0], [], []
+    guard = threading.Lock()
+
+    def use_checkout():
+        try:
+            with cache.checkout(remote.url) as directory:
+                with guard:
+                    inside[0] += 1
+                    overlaps.append(inside[0] > 1)
+                time.sleep(0.2)
+                assert read(directory) == "v1"
+                with guard:
+                    inside[0] -= 1
+        except Exception as e:  # Surfaced in the main thread
+            errors.append(e)
+
+    threads = [threading.Thread(target=use_checkout) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert len(overlaps) == 4 and not any(overlaps)
+
+
+def test_least_recently_used_mirrors_are_evicted(tmp_path):
+    remotes = [Remote(str(tmp_path / "remotes"), f"project{n}") for n in range(3)]
+    for n, remote in enumerate(remotes):
+        remote.push(f"v{n}", size=200_000)
+    # Room for two mirrors of ~200 KB, not three
+    cache = MirrorCache(str(tmp_path / "mirrors"), max_bytes=500_000)
+
+    for remote in remotes:
+        with cache.checkout(remote.url):
+            pass
+        time.sleep(0.01)  # Distinct last-use times
+    assert not os.path.exists(cache.mirror_path(remotes[0].url))
+    assert os.path.isdir(cache.mirror_path(remotes[1].url))
+    assert os.path.isdir(cache.mirror_path(remotes[2].url))
+
+    # The mirror just checked out is never evicted, even on its own over the quota
+    tiny = MirrorCache(str(tmp_path / "tiny"), max_bytes=1)
+    with tiny.checkout(remotes[0].url):
+        pass
+    assert os.path.isdir(tiny.mirror_path(remotes[0].url))
+
+
+def test_mirror_in_use_is_not_evicted(remote, tmp_path):
+    remote.push("v1", size=200_000)
+    cache = MirrorCache(str(tmp_path / "mirrors"), max_bytes=1)
+    with cache.checkout(remote.url):
+        cache.evict()  # From the same process, e.g. another job's checkout ending
+        assert os.path.isdir(cache.mirror_path(remote.url))
+
+
+def test_no_worktrees_are_left_behind(remote, cache):
+    remote.push("v1")
+    with cache.checkout(remote.url) as directory:
+        assert os.path.isdir(directory)
+    with pytest.raises(RuntimeError):
+        with cache.checkout(remote.url):
+            raise RuntimeError("crawl failed")
+
+    assert leftover_checkouts(cache) == []
+    worktrees = run_git(cache.mirror_path(remote.url), "worktree", "list", "--porcelain")
+    assert worktrees.count("worktree ") == 1  # The bare mirror itself
@@ -0,0 +1,89 @@
+# tests/test_scheduler.py
+"""
+LLMScheduler admission control.
+
+Run from the repository root:
+    python -m pytest tests/test_scheduler.py
+"""
+import queue
+import asyncio
+import threading
+
+from app.llm.scheduler import LLMScheduler, RemoteScheduler, SchedulerHost, _Ticket
+
+
+def acquire_in_thread(scheduler, timeout=2.0):
+    """Acquires (and releases) a slot from another thread; False if it never got one"""
+    granted = threading.Event()
+
+    def run():
+        with scheduler.slot(1):
+            granted.set()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    if not granted.wait(timeout):
+        return False
+    thread.join()
+    return True
+
+
+def test_slots_are_granted_up_to_max_concurrency():
+    scheduler = LLMScheduler(requests_per_minute=6000, tokens_per_minute=1_000_000, max_concurrency=2)
+    first, second = scheduler.acquire(1), scheduler.acquire(1)
+    assert scheduler.stats()["in_flight"] == 2
+    assert not acquire_in_thread(scheduler, timeout=0.2)  # Queued behind the two in flight
+    scheduler.release(first)
+    scheduler.release(second)
+    assert acquire_in_thread(scheduler)
+
+
+def test_closed_event_loop_does_not_stop_dispatching():
+    scheduler = LLMScheduler(requests_per_minute=6000, tokens_per_minute=1_000_000, max_concurrency=1)
+    held = scheduler.acquire(1)
+
+    # An async waiter queued behind it whose loop is closed before the slot is granted
+    loop = asyncio.new_event_loop()
+    ticket = _Ticket("closed", 1)
+    ticket.loop = loop
+    ticket.future = loop.create_future()
+    scheduler._enqueue(ticket)
+    loop.close()
+
+    scheduler.release(held)  # Grants the slot to the closed loop's ticket
+    assert acquire_in_thread(scheduler)
+    assert scheduler._dispatcher.is_alive()
+    assert scheduler.stats()["in_flight"] == 0
+
+
+def connect_workers(scheduler, count, generation=1):
+    """RemoteSchedulers wired to a SchedulerHost through in-process queues, as jobs.py does across processes"""
+    host = SchedulerHost(scheduler)
+    replies = [queue.SimpleQueue() for _ in range(count)]
+    host.open(generation, replies)
+    workers = [
+        RemoteScheduler(lambda kind, payload, index=index: host.handle((generation, index), kind, payload), replies[index])
+        for index in range(count)
+    ]
+    return host, workers
+
+
+def test_worker_processes_share_the_parent_limits():
+    scheduler = LLMScheduler(requests_per_minute=6000, tokens_per_minute=1_000_000, max_concurrency=1)
+    host, (first, second) = connect_workers(scheduler, 2)
+    ticket = first.acquire(1)
+    assert scheduler.stats()["in_flight"] == 1
+    assert not acquire_in_thread(second, timeout=0.2)  # The one slot is held by the other worker
+    assert host.stats()["worker_requests_waiting"] == 1
+    first.release(ticket)
+    assert acquire_in_thread(second)
+    assert scheduler.stats()["in_flight"] == 0
+
+
+def test_closing_a_worker_generation_frees_its_slots():
+    scheduler = LLMScheduler(requests_per_minute=6000, tokens_per_minute=1_000_000, max_concurrency=1)
+    host, (worker,) = connect_workers(scheduler, 1)
+    worker.acquire(1)  # Never released: the worker process died
+    host.close(1)
+    assert scheduler.stats()["in_flight"] == 0
+    assert host.stats() == {"worker_slots_held": 0, "worker_requests_waiting": 0}